@@ -5,16 +5,15 @@ WEB INTERFACE FOR AUTO UPLOAD
 Web interface để điều khiển auto_upload_simple.py từ trình duyệt
 """
 
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, render_template, jsonify, request
 from flask_cors import CORS
+import atexit
 import threading
 import subprocess
 import sys
 from pathlib import Path
 import json
 from datetime import datetime
-import io
-import contextlib
 
 # Project structure helpers
 BASE_DIR = Path(__file__).resolve().parent
@@ -27,15 +26,18 @@ if str(BASE_DIR) not in sys.path:
 from automation.process_invoices import (
     process_sale_by_payment_method,
     load_menus,
-    combine_files,
-    parse_invoices_from_html,
-    _process_and_save_invoices,
+    process_data_folder,
     create_grab_invoice,
     SERVICE_FEE_ENABLED,
     SERVICE_FEE_PERCENTAGE,
     SERVICE_FEE_NAME,
     SERVICE_FEE_UNIT,
 )
+from automation.invoice_manifest import manifest_summary, remove_manifest
+from automation.folder_watcher import DataFolderDaemon
+from automation.jobs import JobQueue
+from automation.event_stream import EventBroker, format_sse
+from automation.browser_pool import BrowserPool, BrowserPoolServer
 
 app = Flask(__name__, static_folder='static', template_folder='templates')
 CORS(app)
@@ -59,6 +61,74 @@ fetch_status = {
     "exit_code": None,
 }
 
+# Sự kiện cho /api/stream (log script upload / fetch, trạng thái, job)
+event_broker = EventBroker()
+
+def _now():
+    return datetime.now().strftime('%H:%M:%S')
+
+def _append_script_log(message):
+    """Thêm 1 dòng log của script upload (list log cho API polling + sự kiện 'log')"""
+    entry = f"[{_now()}] {message}"
+    def apply():
+        script_status["logs"].append(entry)
+        # Giới hạn log để tránh quá nhiều
+        if len(script_status["logs"]) > 1000:
+            script_status["logs"] = script_status["logs"][-500:]
+    event_broker.publish('log', {"source": "upload", "line": entry}, apply=apply)
+
+def _append_fetch_log(message):
+    """Thêm 1 dòng log của fetch script"""
+    entry = f"[{_now()}] {message}"
+    def apply():
+        fetch_status["logs"].append(entry)
+        if len(fetch_status["logs"]) > 500:
+            fetch_status["logs"] = fetch_status["logs"][-250:]
+    event_broker.publish('log', {"source": "fetch", "line": entry}, apply=apply)
+
+def _fetch_payload(include_logs=True):
+    payload = {
+        "running": fetch_status["running"],
+        "pid": fetch_status["pid"],
+        "start_time": fetch_status["start_time"],
+        "exit_code": fetch_status["exit_code"],
+    }
+    if include_logs:
+        payload["logs"] = fetch_status["logs"][-200:]
+    return payload
+
+def _publish_status():
+    event_broker.publish('status', _status_payload(include_logs=False))
+
+def _publish_fetch_status():
+    event_broker.publish('fetch', _fetch_payload(include_logs=False))
+
+def _publish_job_update(job, update, data):
+    """listener của job_queue: đẩy log / tiến độ / trạng thái job qua /api/stream"""
+    if update == 'log':
+        event_broker.publish('job-log', {"job_id": job.id, **data})
+        return
+    event_broker.publish('job', job.to_dict(include_logs=False))
+    if update == 'state' and job.finished:
+        # tax_files đã thay đổi → số file / manifest mới
+        _publish_status()
+
+# Xử lý data/ (nút 'process' và watcher) chạy lần lượt trên 1 worker, không chồng lên nhau
+job_queue = JobQueue('process', listener=_publish_job_update)
+
+# Tự xử lý file export mới ngay khi tải xong vào data/ (chờ fetch script chạy xong)
+WATCH_DATA_DIR = True
+WATCH_DEBOUNCE_SECONDS = 5.0
+data_watcher = None
+
+# Giữ sẵn Chrome (profile riêng, còn phiên đăng nhập) cho script fetch / upload mượn
+BROWSER_POOL_ENABLED = True
+browser_pool_server = None
+
+# Fetch từ web panel chạy Chrome headless nếu request không nói khác - pool mở sẵn Chrome 'fabi'
+# cùng chế độ này (mượn khác chế độ thì Chrome phải mở lại). Upload luôn mở Chrome có cửa sổ.
+FETCH_HEADLESS_DEFAULT = True
+
 SCRIPT_PATH = AUTOMATION_DIR / "auto_upload_simple.py"
 FETCH_SCRIPT_PATH = AUTOMATION_DIR / "auto_fetch_fabi.py"
 DATA_DIR = BASE_DIR / "data"
@@ -92,26 +162,26 @@ def start_script():
         script_status["running"] = True
         script_status["pid"] = script_process.pid
         script_status["start_time"] = datetime.now().isoformat()
-        script_status["logs"].append(f"[{datetime.now().strftime('%H:%M:%S')}] Script đã được khởi động")
+        _append_script_log("Script đã được khởi động")
+        _publish_status()
         
-        # Thread để đọc output
+        # Thread để đọc output (mỗi dòng được đẩy ngay qua /api/stream)
         def read_output():
+            global script_process
             for line in iter(script_process.stdout.readline, ''):
                 if line:
-                    log_entry = f"[{datetime.now().strftime('%H:%M:%S')}] {line.strip()}"
-                    script_status["logs"].append(log_entry)
+                    _append_script_log(line.strip())
                     low = line.strip().lower()
                     if ("uploading:" in low) or ("processing..." in low) or ("thành công" in low) or ("thất bại" in low):
                         script_status["current"] = line.strip()
-                    # Giới hạn log để tránh quá nhiều
-                    if len(script_status["logs"]) > 1000:
-                        script_status["logs"] = script_status["logs"][-500:]
+                        _publish_status()
             
             # Script đã kết thúc
             script_process.wait()
             script_status["running"] = False
             script_status["current"] = None
-            script_status["logs"].append(f"[{datetime.now().strftime('%H:%M:%S')}] Script đã kết thúc (exit code: {script_process.returncode})")
+            _append_script_log(f"Script đã kết thúc (exit code: {script_process.returncode})")
+            _publish_status()
             script_process = None
         
         thread = threading.Thread(target=read_output, daemon=True)
@@ -134,7 +204,7 @@ def stop_script():
     try:
         if script_process:
             script_process.terminate()
-            script_status["logs"].append(f"[{datetime.now().strftime('%H:%M:%S')}] Đang dừng script...")
+            _append_script_log("Đang dừng script...")
             return jsonify({"success": True})
         else:
             script_status["running"] = False
@@ -183,6 +253,8 @@ def reset_software():
         
         script_process = None
         fetch_process = None
+        _publish_status()
+        _publish_fetch_status()
         
         return jsonify({
             "success": True,
@@ -204,6 +276,7 @@ def get_logs():
 def clear_logs():
     """Xóa logs"""
     script_status["logs"] = []
+    event_broker.publish('clear-logs', {"source": "upload"})
     return jsonify({"success": True})
 
 @app.route('/api/clear-files', methods=['POST'])
@@ -220,6 +293,8 @@ def clear_files():
                 files_deleted.append(file_path.name)
             except Exception as e:
                 return jsonify({"success": False, "error": f"Lỗi khi xóa {file_path.name}: {str(e)}"}), 500
+        remove_manifest(TAX_DIR)
+        _publish_status()
         
         return jsonify({
             "success": True,
@@ -244,6 +319,7 @@ def clear_data_files():
                     files_deleted.append(file_path.name)
                 except Exception as e:
                     return jsonify({"success": False, "error": f"Lỗi khi xóa {file_path.name}: {str(e)}"}), 500
+        _publish_status()
         
         return jsonify({
             "success": True,
@@ -267,7 +343,7 @@ def fetch_data():
     payload = request.get_json(silent=True) or {}
 
     args = [sys.executable, str(FETCH_SCRIPT_PATH)]
-    if payload.get("headless", True):
+    if payload.get("headless", FETCH_HEADLESS_DEFAULT):
         args.append("--headless")
     if payload.get("no_click_transfer", False):
         args.append("--no-click-transfer")
@@ -291,26 +367,23 @@ def fetch_data():
         "running": True,
         "pid": fetch_process.pid,
         "start_time": datetime.now().isoformat(),
-        "logs": [f"[{datetime.now().strftime('%H:%M:%S')}] Fetch script started"],
+        "logs": [],
         "exit_code": None,
     })
+    _append_fetch_log("Fetch script started")
+    _publish_fetch_status()
 
     def read_output():
         global fetch_process, fetch_status
         for line in iter(fetch_process.stdout.readline, ''):
             if line:
-                entry = f"[{datetime.now().strftime('%H:%M:%S')}] {line.strip()}"
-                fetch_status["logs"].append(entry)
-                if len(fetch_status["logs"]) > 500:
-                    fetch_status["logs"] = fetch_status["logs"][-250:]
+                _append_fetch_log(line.strip())
         fetch_process.wait()
         fetch_status["running"] = False
         fetch_status["exit_code"] = fetch_process.returncode
-        fetch_status["logs"].append(
-            f"[{datetime.now().strftime('%H:%M:%S')}] Fetch script finished (exit code: {fetch_process.returncode})"
-        )
-        if len(fetch_status["logs"]) > 500:
-            fetch_status["logs"] = fetch_status["logs"][-250:]
+        _append_fetch_log(f"Fetch script finished (exit code: {fetch_process.returncode})")
+        _publish_fetch_status()
+        _publish_status()
         fetch_process = None
 
     threading.Thread(target=read_output, daemon=True).start()
@@ -320,76 +393,74 @@ def fetch_data():
 @app.route('/api/fetch-status')
 def get_fetch_status():
     """Trả về trạng thái hiện tại của fetch script."""
-    return jsonify({
-        "running": fetch_status["running"],
-        "pid": fetch_status["pid"],
-        "start_time": fetch_status["start_time"],
-        "logs": fetch_status["logs"][-200:],
-        "exit_code": fetch_status["exit_code"],
-    })
+    return jsonify(_fetch_payload())
 
-@app.route('/api/process-default', methods=['POST'])
-def process_default():
-    """Process invoices from data/ if present; otherwise fallback to defaults."""
+def _process_data_job():
+    """Job xử lý data/ (hoặc file mặc định ở thư mục gốc) - chạy trên worker của job_queue"""
     TAX_DIR.mkdir(exist_ok=True)
     before = set(p.name for p in TAX_DIR.glob('*.xlsx'))
-    buf = io.StringIO()
-    try:
-        with contextlib.redirect_stdout(buf):
-            # Prefer processing from data/ folder
-            if DATA_DIR.exists():
-                file_combined_1 = DATA_DIR / 'sale_by_payment_method.xls'
-                file_combined_2 = DATA_DIR / 'sale_by_payment_method (1).xls'
-                data_files = sorted([p for p in DATA_DIR.glob('*') if p.is_file()])
-
-                if file_combined_1.exists() and file_combined_2.exists():
-                    # Combined processing path
-                    print(f"\n📂 Using data/: {file_combined_1.name} + {file_combined_2.name}")
-                    content, _ = combine_files(str(file_combined_1), str(file_combined_2))
-                    all_menu_items, name_mapping, price_to_items = load_menus()
-                    invoices, alcohol_items_found = parse_invoices_from_html(content, all_menu_items, name_mapping, price_to_items, True)
-                    _process_and_save_invoices(invoices, 'combined', alcohol_items_found)
-                else:
-                    # Single file path: pick the first .xls/.html-like file
-                    preferred_exts = ['.xls', '.xlsx', '.html', '.htm']
-                    candidates = [p for p in data_files if p.suffix.lower() in preferred_exts]
-                    if not candidates and data_files:
-                        candidates = data_files[:1]
-                    if not candidates:
-                        print("❌ No input files found in data/ folder")
-                    else:
-                        input_path = candidates[0]
-                        print(f"\n📂 Using data/: {input_path.name}")
-                        with open(input_path, 'r', encoding='utf-8', errors='ignore') as f:
-                            content = f.read()
-                        all_menu_items, name_mapping, price_to_items = load_menus()
-                        is_combined = 'sale_by_payment_method' in input_path.name.lower()
-                        invoices, alcohol_items_found = parse_invoices_from_html(content, all_menu_items, name_mapping, price_to_items, is_combined)
-                        # Detect source type from filename
-                        name_lower = input_path.name.lower()
-                        if 'atm' in name_lower:
-                            source_type = 'atm'
-                        elif 'transfer' in name_lower:
-                            source_type = 'transfer'
-                        else:
-                            source_type = input_path.stem
-                        _process_and_save_invoices(invoices, source_type, alcohol_items_found)
-            else:
-                # Fallback to original default behavior (root files)
-                print("ℹ️ data/ not found, using default files in project root")
-                process_sale_by_payment_method()
+    # Prefer processing from data/ folder
+    if DATA_DIR.exists():
+        summary = process_data_folder(DATA_DIR)
+    else:
+        # Fallback to original default behavior (root files)
+        print("ℹ️ data/ not found, using default files in project root")
+        summary = process_sale_by_payment_method()
+    after = set(p.name for p in TAX_DIR.glob('*.xlsx'))
+    new_files = sorted(list(after - before))
+    return {
+        "created": len(new_files),
+        "files": new_files,
+        "summary": summary,
+    }
 
-        logs = buf.getvalue().splitlines()[-400:]
-        after = set(p.name for p in TAX_DIR.glob('*.xlsx'))
-        new_files = sorted(list(after - before))
-        return jsonify({
-            "success": True,
-            "created": len(new_files),
-            "files": new_files,
-            "logs": logs,
-        })
-    except Exception as e:
-        return jsonify({"success": False, "error": str(e), "logs": buf.getvalue().splitlines()[-400:]}), 500
+@app.route('/api/process-default', methods=['POST'])
+def process_default():
+    """Xếp job xử lý data/ vào hàng đợi; theo dõi tiến độ qua /api/jobs/<id>."""
+    job, reused = job_queue.submit('process-default', _process_data_job)
+    return jsonify({
+        "success": True,
+        "job_id": job.id,
+        "state": job.state,
+        # Đã có job đang chờ → dùng lại job đó (nó chạy sau nên thấy file mới nhất)
+        "reused": reused,
+    }), 202
+
+@app.route('/api/jobs')
+def list_jobs():
+    """Các job gần đây (không kèm log)"""
+    return jsonify({"jobs": [job.to_dict(include_logs=False) for job in job_queue.recent()]})
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    """Trạng thái + tiến độ của 1 job; ?since=<seq> chỉ trả các dòng log mới hơn"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Không tìm thấy job"}), 404
+    since = request.args.get('since', default=0, type=int)
+    return jsonify(job.to_dict(since=since))
+
+def _process_new_downloads(files):
+    """Watcher data/: có file export mới tải xong → xếp job như nút 'process' và chờ xong"""
+    job, _ = job_queue.submit('process-default', _process_data_job)
+    job.wait()
+    result = {"job_id": job.id, "state": job.state, "error": job.error}
+    result.update(job.result or {})
+    return result
+
+@app.route('/api/watch-status')
+def get_watch_status():
+    """Trạng thái watcher thư mục data/"""
+    if data_watcher is None:
+        return jsonify({"enabled": False})
+    return jsonify(data_watcher.snapshot_status())
+
+@app.route('/api/browser-pool')
+def get_browser_pool_status():
+    """Trạng thái các Chrome chạy sẵn trong browser pool"""
+    if browser_pool_server is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **browser_pool_server.pool.status()})
 
 @app.route('/api/service-fee-status')
 def get_service_fee_status():
@@ -419,7 +490,7 @@ def api_grab_invoice():
         except Exception:
             return jsonify({"success": False, "error": "total_with_tax must be a number"}), 400
 
-        all_menu_items, _, _ = load_menus()
+        all_menu_items = load_menus()['all_items']
         simple_menu_items = []
         taco_menu_items = []
         for item in all_menu_items:
@@ -441,6 +512,7 @@ def api_grab_invoice():
 
         if not out_file:
             return jsonify({"success": False, "error": "Failed to create Grab invoice"}), 500
+        _publish_status()
 
         return jsonify({
             "success": True,
@@ -476,20 +548,54 @@ def get_check_results():
     except Exception as e:
         return jsonify({'error': f'Lỗi: {str(e)}'}), 500
 
-@app.route('/api/status')
-def get_status():
-    """Lấy trạng thái script và file counts"""
+def _status_payload(include_logs=True):
+    """Trạng thái script + số file (dùng cho /api/status và sự kiện 'status')"""
     data_files_count = len(list(DATA_DIR.glob("*"))) if DATA_DIR.exists() else 0
     tax_files_count = len(list(TAX_DIR.glob("*.xlsx"))) if TAX_DIR.exists() else 0
     
-    return jsonify({
+    payload = {
         "running": script_status["running"],
         "pid": script_status["pid"],
         "start_time": script_status["start_time"],
         "current": script_status.get("current"),
-        "logs": script_status["logs"][-50:],  # Chỉ lấy 50 log cuối
         "data_files": data_files_count,
         "tax_files": tax_files_count,
+        # Tổng hợp từ tax_files/manifest.jsonl (None nếu chưa có manifest)
+        "manifest": manifest_summary(TAX_DIR) if TAX_DIR.exists() else None,
+    }
+    if include_logs:
+        payload["logs"] = script_status["logs"][-50:]  # Chỉ lấy 50 log cuối
+    return payload
+
+@app.route('/api/status')
+def get_status():
+    """Lấy trạng thái script và file counts"""
+    return jsonify(_status_payload())
+
+@app.route('/api/stream')
+def stream():
+    """
+    Server-Sent Events: sự kiện 'snapshot' (trạng thái đầy đủ) khi mới kết nối, sau đó
+    'log' / 'status' / 'fetch' / 'job' / 'job-log' / 'clear-logs' theo seq tăng dần.
+    EventSource kết nối lại với Last-Event-ID → chỉ nhận phần còn thiếu.
+    """
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+
+    def generate():
+        since = last_event_id
+        if since is None:
+            since, snapshot = event_broker.snapshot(lambda: {
+                "status": _status_payload(include_logs=False),
+                "logs": script_status["logs"][-200:],
+                "fetch": _fetch_payload(),
+                "jobs": [job.to_dict(include_logs=False) for job in job_queue.active()],
+            })
+            yield format_sse(since, 'snapshot', snapshot)
+        yield from event_broker.stream(since)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
     })
 
 if __name__ == '__main__':
@@ -512,5 +618,30 @@ if __name__ == '__main__':
         except Exception:
             pass
     threading.Thread(target=_open, daemon=True).start()
+
+    if WATCH_DATA_DIR:
+        data_watcher = DataFolderDaemon(
+            DATA_DIR,
+            _process_new_downloads,
+            debounce=WATCH_DEBOUNCE_SECONDS,
+            busy=lambda: fetch_status["running"],
+        )
+        data_watcher.start()
+        print(f"👀 Đang theo dõi {DATA_DIR.name}/ - file export mới sẽ được xử lý tự động")
+
+    if BROWSER_POOL_ENABLED:
+        pool = BrowserPool(headless={"fabi": FETCH_HEADLESS_DEFAULT, "upload": False})
+        if pool.chrome_binary is None:
+            print("ℹ️ Không tìm thấy Chrome - browser pool tắt (script tự mở Chrome)")
+        else:
+            try:
+                browser_pool_server = BrowserPoolServer(pool).start()
+            except OSError as e:
+                # Cổng đã dùng: thường là browser_pool.py đang chạy riêng - script vẫn mượn được
+                print(f"ℹ️ Không bật browser pool: {e}")
+            else:
+                atexit.register(browser_pool_server.stop)
+                threading.Thread(target=pool.warm, name="browser-pool-warm", daemon=True).start()
+                print("🔥 Browser pool: đang mở sẵn Chrome cho fetch / upload")
     
     app.run(host='0.0.0.0', port=5001, debug=False, use_reloader=False)
\ No newline at end of file
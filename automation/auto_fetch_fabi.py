@@ -9,7 +9,10 @@ This helper uses Selenium to:
 3. Open the Báo cáo section
 4. Expand the "Báo cáo phân tích - B" accordion
 5. Open report B07 - Phương thức thanh toán
-6. (Optional) Click the "Transfer" filter if it exists on the page
+6. Export each requested payment method (TRANSFER and ATM by default, any
+   B07 row such as GRAB_ONLINE via --methods), --workers sessions in parallel.
+   Each export lands in downloads/<date>/<METHOD>/ and is then copied into
+   data/ (TRANSFER → sale_by_payment_method.xls, ATM → "... (1).xls")
 
 Usage:
     python3 auto_fetch_fabi.py --username <email> --password <password>
@@ -21,17 +24,22 @@ Environment variables (fallbacks):
 Flags:
     --headless          Run Chrome in headless mode (disabled by default because
                         Fabi blocks standard headless fingerprints).
-    --no-click-transfer Skip the attempt to click the transfer filter.
+    --no-click-transfer Only open B07, skip the exports.
+    --methods           Payment methods to export. Default: TRANSFER ATM.
+    --workers           Parallel browser sessions. Default: 2.
 
 Note:
     - webdriver-manager caches the ChromeDriver binary inside ./.wdm/
     - If the site changes CSS selectors, update the XPaths below.
+    - Other dates / date ranges: use fabi_http.py (the browser flow exports
+      the range B07 shows, i.e. today).
 """
 
 import argparse
 import os
 import sys
 import time
+from datetime import date
 from pathlib import Path
 
 from selenium import webdriver
@@ -41,17 +49,43 @@ from selenium.common.exceptions import (
     TimeoutException,
 )
 from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
-from webdriver_manager.chrome import ChromeDriverManager
 
 # Ensure webdriver cache lives inside the project folder
 PACKAGE_DIR = Path(__file__).resolve().parent
 PROJECT_ROOT = PACKAGE_DIR.parent
 DOWNLOAD_DIR = PROJECT_ROOT / "data"
 
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+from automation.browser_pool import attach_driver, lease_browser, start_chrome
+from automation.folder_watcher import DownloadWatcher, completed_downloads
+from automation.fetch_planner import (
+    DEFAULT_METHODS,
+    DEFAULT_WORKERS,
+    job_dir,
+    job_label,
+    plan_jobs,
+    print_summary,
+    publish_reports,
+    run_plan,
+)
+from automation.fabi_waits import (
+    POLL_FREQUENCY,
+    DownloadTracker,
+    NetworkIdle,
+    element_ready,
+    enable_performance_log,
+    modal_closed,
+    modal_has_content,
+    no_spinners,
+    open_modal_text,
+    report_table_ready,
+    wait_for,
+)
+
 DOWNLOAD_DIR.mkdir(exist_ok=True)
 os.environ.setdefault("WDM_LOCAL", "1")
 os.environ.setdefault("WDM_LOG_LEVEL", "0")
@@ -100,36 +134,10 @@ B07_LINK = (
     By.XPATH,
     "//a[contains(., 'B07 - Phương thức thanh toán')]",
 )
-TRANSFER_FILTER = (
-    By.XPATH,
-    "//tr[.//td[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'transfer')]]",
-)
-TRANSFER_TD = (
-    By.XPATH,
-    "//td[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'transfer')]",
-)
-# More specific selector based on HTML structure: row with TRANSFER text in second td
-TRANSFER_ROW_SPECIFIC = (
-    By.XPATH,
-    "//tr[td[@scope='row']/span[text()='2']][td[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'transfer')]]",
-)
-TRANSFER_FILTER_FALLBACK = (
-    By.XPATH,
-    "//*[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'transfer') "
-    "or contains(., 'Chuyển khoản')]",
-)
-ATM_FILTER = (
-    By.XPATH,
-    "//tr[.//td[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'atm')]]",
-)
-ATM_TD = (
-    By.XPATH,
-    "//td[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'atm')]",
-)
-ATM_FILTER_FALLBACK = (
-    By.XPATH,
-    "//*[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'atm')]",
-)
+# B07 rows whose PTTT cell isn't the plain method code
+PAYMENT_METHOD_ALIASES = {
+    "TRANSFER": ("Chuyển khoản",),
+}
 EXPORT_BUTTON = (
     By.XPATH,
     "//div[contains(@class,'modal-footer')]//button[contains(@class,'btn-outline-blue') and contains(., 'Xuất hoá đơn')]",
@@ -159,14 +167,10 @@ MODAL_CLOSE_X_BUTTON = (
     "button.close[data-dismiss='modal'], button.close.close__btn, .modal.show button.close",
 )
 OVERLAY_ELEMENTS = (By.CSS_SELECTOR, ".modal-backdrop, .fixed-background")
-SPINNER_ELEMENTS = (
-    By.CSS_SELECTOR,
-    ".spinner-border, .skeleton-loader, [role='status'].spinner-border",
-)
 
 
-def configure_driver(headless: bool) -> webdriver.Chrome:
-    """Create and return a configured Chrome WebDriver instance."""
+def chrome_options_for(headless: bool, download_dir: Path = DOWNLOAD_DIR) -> Options:
+    """Options for a Chrome started by this script (when no browser pool is running)."""
     chrome_options = Options()
     chrome_options.add_argument("--disable-gpu")
     chrome_options.add_argument("--no-sandbox")
@@ -179,7 +183,7 @@ def configure_driver(headless: bool) -> webdriver.Chrome:
         {
             "download.prompt_for_download": False,
             "download.directory_upgrade": True,
-            "download.default_directory": str(DOWNLOAD_DIR.resolve()),
+            "download.default_directory": str(download_dir.resolve()),
             "safebrowsing.enabled": False,  # Disable safebrowsing to allow downloads
             "safebrowsing.disable_download_protection": True,  # Allow potentially unsafe downloads
             "profile.default_content_setting_values.automatic_downloads": 1,  # Allow automatic downloads
@@ -201,8 +205,26 @@ def configure_driver(headless: bool) -> webdriver.Chrome:
         # automation tweaks improves the odds but visible mode is still more reliable.
         chrome_options.add_argument("--headless=new")
 
-    service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=chrome_options)
+    # DevTools network events let the fetch wait for "network idle" instead of sleeping
+    enable_performance_log(chrome_options)
+    return chrome_options
+
+
+def configure_driver(headless: bool, download_dir: Path = DOWNLOAD_DIR) -> webdriver.Chrome:
+    """Create and return a configured Chrome WebDriver instance.
+
+    Borrows a warm Chrome (persistent profile, usually still logged in) from the
+    browser pool (automation/browser_pool.py) when it is running; otherwise starts
+    a new one with the chromedriver path cached under .wdm/.
+    """
+    lease = lease_browser("fabi", headless=headless)
+    if lease is not None:
+        attach_options = Options()
+        enable_performance_log(attach_options)
+        driver = attach_driver(lease, attach_options)
+        print(f"♻️ Using warm Chrome '{lease.name}' from the browser pool")
+    else:
+        driver = start_chrome(chrome_options_for(headless, download_dir))
 
     # Hide webdriver flag as early as possible
     driver.execute_cdp_cmd(
@@ -212,20 +234,35 @@ def configure_driver(headless: bool) -> webdriver.Chrome:
     
     # Enable automatic downloads using Chrome DevTools Protocol
     # This helps bypass browser security restrictions on downloads
+    if set_download_dir(driver, download_dir):
+        print(f"✅ Download behavior set to allow automatic downloads to: {download_dir}")
+    else:
+        print(f"   Using preferences instead. Download directory: {download_dir}")
+    
+    return driver
+
+
+def set_download_dir(driver: webdriver.Chrome, download_dir: Path) -> bool:
+    """Send the next downloads of this browser to download_dir (CDP; takes effect immediately).
+
+    Browser.setDownloadBehavior with eventsEnabled also makes Chrome report every
+    download (downloadWillBegin / downloadProgress), which export_report waits on.
+    Older Chrome only has Page.setDownloadBehavior (no events - the folder is watched).
+    """
+    behavior = {"behavior": "allow", "downloadPath": str(download_dir.resolve())}
+    try:
+        driver.execute_cdp_cmd("Browser.setDownloadBehavior", {**behavior, "eventsEnabled": True})
+        return True
+    except Exception:
+        pass
     try:
-        # Set download behavior to allow automatic downloads
-        driver.execute_cdp_cmd("Page.setDownloadBehavior", {
-            "behavior": "allow",
-            "downloadPath": str(DOWNLOAD_DIR.resolve())
-        })
-        print(f"✅ Download behavior set to allow automatic downloads to: {DOWNLOAD_DIR}")
+        driver.execute_cdp_cmd("Page.setDownloadBehavior", behavior)
+        return True
     except Exception as e:
         # CDP command might not be available in all Chrome versions
         # The preferences should still work
         print(f"⚠️  Could not set download behavior via CDP (may not be supported): {e}")
-        print(f"   Using preferences instead. Download directory: {DOWNLOAD_DIR}")
-    
-    return driver
+        return False
 
 
 def wait_and_click(driver: webdriver.Chrome, locator, timeout: int = 30):
@@ -292,7 +329,7 @@ def close_modal(driver: webdriver.Chrome, wait: WebDriverWait) -> bool:
                 # Click on the backdrop (outside the modal) to close it
                 driver.execute_script("arguments[0].click();", backdrop)
                 print("✅ Closed modal by clicking outside (on backdrop)")
-                time.sleep(1)
+                wait_for(driver, modal_closed, 3, soft=True)
                 
                 # Verify modal is closed
                 try:
@@ -328,12 +365,11 @@ def close_modal(driver: webdriver.Chrome, wait: WebDriverWait) -> bool:
         
         # Click the close button ONCE
         driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", close_button)
-        time.sleep(0.2)
         driver.execute_script("arguments[0].click();", close_button)
         print("✅ Closed modal by clicking X button (1 lần)")
         
         # Wait for modal to close and verify it's closed
-        time.sleep(1)
+        wait_for(driver, modal_closed, 3, soft=True)
         try:
             modal = driver.find_element(By.CSS_SELECTOR, ".modal.show, .modal[style*='display: block']")
             if modal.is_displayed():
@@ -363,16 +399,15 @@ def clear_overlays(driver: webdriver.Chrome):
 
 
 def wait_for_loading(driver: webdriver.Chrome, timeout: int = 40):
-    """Wait until loading indicators disappear."""
-    end_time = time.time() + timeout
-    while time.time() < end_time:
-        spinners = driver.find_elements(*SPINNER_ELEMENTS)
-        visible = [s for s in spinners if s.is_displayed()]
-        if not visible:
-            return
-        time.sleep(0.5)
+    """Wait until loading indicators disappear (checked in one JS call per poll)."""
     # soft timeout, log but don't raise
-    print("⚠️  Loading indicators still visible after timeout.")
+    wait_for(driver, no_spinners, timeout, "⚠️  Loading indicators still visible after timeout.", soft=True)
+
+
+def accordion_expanded(driver: webdriver.Chrome) -> bool:
+    """The 'Báo cáo phân tích - B' accordion has finished opening."""
+    collapse = driver.find_elements(By.ID, "collapse-menu-1")
+    return bool(collapse) and "show" in (collapse[0].get_attribute("class") or "").split()
 
 
 def navigate_to_b07(driver: webdriver.Chrome, wait: WebDriverWait):
@@ -396,7 +431,7 @@ def navigate_to_b07(driver: webdriver.Chrome, wait: WebDriverWait):
         raise TimeoutException("Could not find or click the 'Báo cáo' button after login")
 
     wait.until(lambda d: "/report/" in d.current_url)
-    time.sleep(1)  # Give page time to fully load
+    wait_for_loading(driver, timeout=10)
     dismiss_popups(driver)
 
     # Wait for the collapse element to exist first
@@ -419,13 +454,11 @@ def navigate_to_b07(driver: webdriver.Chrome, wait: WebDriverWait):
             element = WebDriverWait(driver, 5).until(
                 EC.presence_of_element_located(selector)
             )
-            # Scroll into view
-            driver.execute_script("arguments[0].scrollIntoView({block: 'center', behavior: 'smooth'});", element)
-            time.sleep(0.5)
+            # Scroll into view (instant scroll - nothing to wait for)
+            driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", element)
             
             # Clear any overlays
             clear_overlays(driver)
-            time.sleep(0.3)
             
             # Try clicking
             try:
@@ -435,7 +468,7 @@ def navigate_to_b07(driver: webdriver.Chrome, wait: WebDriverWait):
             
             accordion_clicked = True
             print(f"✅ Clicked 'Báo cáo phân tích - B' accordion")
-            time.sleep(1)  # Wait for accordion animation
+            wait_for(driver, accordion_expanded, 3, soft=True)  # Wait for accordion animation
             break
         except (TimeoutException, NoSuchElementException, ElementClickInterceptedException) as e:
             print(f"⚠️ Selector failed: {type(e).__name__}")
@@ -448,14 +481,13 @@ def navigate_to_b07(driver: webdriver.Chrome, wait: WebDriverWait):
     collapse = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "collapse-menu-1")))
     if "show" not in collapse.get_attribute("class"):
         print("⚠️ Accordion not expanded after click, trying again...")
-        time.sleep(1)
         # Try clicking one more time
         for selector in [ANALYSIS_ACCORDION_BY_SPAN, ANALYSIS_ACCORDION]:
             try:
                 element = driver.find_element(*selector)
                 driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", element)
                 driver.execute_script("arguments[0].click();", element)
-                time.sleep(1)
+                wait_for(driver, accordion_expanded, 3, soft=True)
                 break
             except Exception:
                 continue
@@ -468,198 +500,157 @@ def navigate_to_b07(driver: webdriver.Chrome, wait: WebDriverWait):
     wait_for_loading(driver)
 
 
-def click_transfer_filter(driver: webdriver.Chrome, wait: WebDriverWait) -> bool:
-    """Attempt to click the 'Transfer' row/button on the B07 report page - ONLY ONCE."""
-    # Check if modal is already open (don't click again if modal is open)
-    try:
-        modal = driver.find_element(By.CSS_SELECTOR, ".modal.show, .modal[style*='display: block']")
-        if modal.is_displayed():
-            print("ℹ️ Modal is already open, skipping TRANSFER row click")
-            return True
-    except Exception:
-        pass
-    
-    # Wait for the B07 report table to load
-    time.sleep(2)  # Give table time to render
+def payment_row_selectors(method: str) -> list:
+    """XPaths for the B07 row of one payment method: exact PTTT cell first, then looser matches."""
+    name = method.strip().lower()
+    cell_text = "translate(normalize-space(.), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')"
+    selectors = [
+        (By.XPATH, f"//div[contains(@class,'report-table')]//tbody/tr[td[{cell_text}='{name}']]"),
+        (By.XPATH, f"//table//tbody/tr[td[{cell_text}='{name}']]"),
+        (By.XPATH, f"//table//tbody/tr[td[contains({cell_text}, '{name}')]]"),
+    ]
+    for alias in PAYMENT_METHOD_ALIASES.get(method.upper(), ()):
+        selectors.append((By.XPATH, f"//table//tbody/tr[td[contains(normalize-space(.), '{alias}')]]"))
+    return selectors
+
+
+def click_payment_method(driver: webdriver.Chrome, method: str) -> bool:
+    """Click the B07 row of one payment method (TRANSFER, ATM, GRAB_ONLINE, ...) ONCE and wait for its modal."""
+    # Wait for the B07 report table to render its rows
+    wait_for(driver, report_table_ready, 10, "⚠️ Report table rows not rendered yet", soft=True)
     
     # Scroll down to find the report table as per instructions
     # The instructions say "From now on this part will be scrol down Find"
     try:
-        # First, try to find the report table container
         report_table = driver.find_element(By.CSS_SELECTOR, ".report-table, table.table")
-        driver.execute_script("arguments[0].scrollIntoView({block: 'start', behavior: 'smooth'});", report_table)
-        time.sleep(1)  # Wait for scroll to complete
-        print("✅ Scrolled to report table")
-    except Exception:
-        # If table not found, scroll down the page to reveal content
+        driver.execute_script("arguments[0].scrollIntoView({block: 'start'});", report_table)
+    except NoSuchElementException:
         driver.execute_script("window.scrollTo(0, document.body.scrollHeight / 2);")
-        time.sleep(1)
-        print("ℹ️ Scrolled down page to find table")
-    
-    # Try multiple selectors to find the TRANSFER row - but only click ONCE
-    # Order: specific structure > general row > td > fallback
-    selectors_to_try = [TRANSFER_ROW_SPECIFIC, TRANSFER_FILTER, TRANSFER_TD, TRANSFER_FILTER_FALLBACK]
-    element = None
     
-    for selector in selectors_to_try:
-        try:
-            # Wait for element to be present
-            element = WebDriverWait(driver, 5).until(
-                EC.presence_of_element_located(selector)
-            )
-            break  # Found element, stop trying other selectors
-        except TimeoutException:
-            continue
+    row = None
+    for selector in payment_row_selectors(method):
+        rows = driver.find_elements(*selector)
+        if rows:
+            row = rows[0]
+            break
     
-    if not element:
-        print("⚠️ Could not find TRANSFER row")
+    if row is None:
+        print(f"⚠️ Could not find {method} row")
         return False
     
-    # Scroll into view
-    driver.execute_script("arguments[0].scrollIntoView({block: 'center', behavior: 'smooth'});", element)
-    time.sleep(0.5)
-    
-    # Clear any overlays
+    driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", row)
     clear_overlays(driver)
-    time.sleep(0.3)
     
-    # Click ONCE - prefer clicking the row (tr) if available
-    try:
-        # If we found a td element, try to click the parent tr instead
-        if element.tag_name.lower() == 'td':
-            try:
-                tr_element = element.find_element(By.XPATH, "./ancestor::tr")
-                driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", tr_element)
-                driver.execute_script("arguments[0].click();", tr_element)
-            except Exception:
-                # If can't find tr, click the td itself
-                driver.execute_script("arguments[0].click();", element)
-        elif element.tag_name.lower() == 'tr':
-            # Already a row, click it directly ONCE
-            driver.execute_script("arguments[0].click();", element)
-        else:
-            # Other element types, use JavaScript click
-            driver.execute_script("arguments[0].click();", element)
-    except Exception:
-        # Fallback to JavaScript click
-        driver.execute_script("arguments[0].click();", element)
+    network_idle = NetworkIdle()
+    
+    # Click ONCE - JavaScript click on the row (tr)
+    driver.execute_script("arguments[0].click();", row)
     
-    print(f"✅ Clicked TRANSFER row (1 lần)")
+    print(f"✅ Clicked {method} row (1 lần)")
     wait_for_loading(driver)
-    # Wait for modal to appear and load data
-    time.sleep(3)  # Increased wait time for modal to load data
+    # Wait for the modal's data request to finish and its body to fill in
+    wait_for(driver, network_idle, 10, soft=True)
+    wait_for(driver, modal_has_content(), 10, f"⚠️ Modal has no data yet after clicking {method}", soft=True)
     return True
 
 
-
-def click_atm_filter(driver: webdriver.Chrome, wait: WebDriverWait, keep_modal_open: bool = False) -> bool:
-    """Attempt to click the 'ATM' row/button on the B07 report page.
-    
-    Args:
-        keep_modal_open: If True, ensure modal stays open when clicking row
+def pin_modal_open(driver: webdriver.Chrome):
+    """Stop the open modal from closing on its own while the export runs."""
+    try:
+        driver.execute_script("""
+            // Disable auto-close on backdrop click
+            var modals = document.querySelectorAll('.modal');
+            modals.forEach(function(modal) {
+                if (modal.style.display !== 'none' && modal.classList.contains('show')) {
+                    // Remove backdrop click handler
+                    modal.setAttribute('data-backdrop', 'static');
+                    modal.setAttribute('data-keyboard', 'false');
+                    
+                    // Prevent ESC key from closing
+                    var originalRemove = modal.remove;
+                    modal.remove = function() {};
+                    
+                    // Disable all close button handlers temporarily
+                    var closeBtns = modal.querySelectorAll('[data-dismiss="modal"], .close, button.close');
+                    closeBtns.forEach(function(btn) {
+                        btn.onclick = null;
+                        btn.addEventListener('click', function(e) {
+                            e.stopPropagation();
+                        }, true);
+                    });
+                }
+            });
+        """)
+        print("ℹ️ Disabled auto-close handlers on modal")
+    except Exception as e:
+        print(f"⚠️ Could not disable auto-close: {e}")
+
+
+def downloaded_path(download: dict, download_dir: Path) -> Path:
+    """Where a finished download was saved: the path Chrome reports, else its file name in download_dir."""
+    if download.get("path"):
+        return Path(download["path"])
+    return download_dir / download["filename"]
+
+
+def wait_for_download(
+    new_files_before,
+    timeout: int = 60,
+    download_dir: Path = DOWNLOAD_DIR,
+    driver: webdriver.Chrome = None,
+    tracker: DownloadTracker = None,
+) -> list[Path]:
+    """Wait for the export to finish downloading and return the downloaded file(s).
+
+    With a DownloadTracker the browser's own download events decide: the exact
+    saved path is returned as soon as the download state is "completed", and
+    other files in the folder are ignored. While Chrome has not reported any
+    download (no events in this browser) a new finished file (not .crdownload)
+    in download_dir is taken instead. The folder is watched with inotify on
+    Linux, so both cases wake up as soon as the browser renames the file.
     """
-    # Check if modal is already open
-    modal_open = False
-    if keep_modal_open:
-        try:
-            modal = driver.find_element(By.CSS_SELECTOR, ".modal.show, .modal[style*='display: block']")
-            if modal.is_displayed():
-                modal_open = True
-                print("ℹ️ Modal is already open, will update content instead of opening new one")
-        except Exception:
-            pass
-    
-    # Wait for the B07 report table to load
-    time.sleep(2)  # Give table time to render
-    
-    # Try multiple selectors to find and click the ATM row
-    selectors_to_try = [ATM_FILTER, ATM_TD, ATM_FILTER_FALLBACK]
-    
-    for selector in selectors_to_try:
-        try:
-            # Wait for element to be present
-            element = WebDriverWait(driver, 5).until(
-                EC.presence_of_element_located(selector)
-            )
-            
-            # Scroll into view
-            driver.execute_script("arguments[0].scrollIntoView({block: 'center', behavior: 'smooth'});", element)
-            time.sleep(0.5)
-            
-            # Don't clear overlays if modal should stay open
-            if not keep_modal_open:
-                clear_overlays(driver)
-            time.sleep(0.3)
-            
-            # Try clicking - prefer clicking the row (tr) if available
-            try:
-                # If we found a td element, try to click the parent tr instead
-                if element.tag_name.lower() == 'td':
-                    try:
-                        tr_element = element.find_element(By.XPATH, "./ancestor::tr")
-                        driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", tr_element)
-                        # Use JavaScript click to avoid closing modal
-                        driver.execute_script("arguments[0].click();", tr_element)
-                    except Exception:
-                        # If can't find tr, click the td itself
-                        driver.execute_script("arguments[0].click();", element)
-                elif element.tag_name.lower() == 'tr':
-                    # Already a row, use JavaScript click to keep modal open
-                    driver.execute_script("arguments[0].click();", element)
-                else:
-                    # Other element types, use JavaScript click
-                    driver.execute_script("arguments[0].click();", element)
-            except Exception:
-                # Fallback to JavaScript click
-                driver.execute_script("arguments[0].click();", element)
-            
-            print(f"✅ Clicked ATM row using selector")
-            wait_for_loading(driver)
-            # Wait for modal content to update (not open new modal)
-            time.sleep(2)
-            return True
-            
-        except (TimeoutException, NoSuchElementException, ElementClickInterceptedException) as e:
-            print(f"⚠️ Selector failed: {type(e).__name__}")
-            continue
-    
-    return False
-
-
-def wait_for_download(new_files_before, timeout: int = 60):
-    """Poll the download directory until a new file (not .crdownload) appears."""
-    deadline = time.time() + timeout
+    deadline = time.monotonic() + timeout
     previous = set(new_files_before)
-
-    while time.time() < deadline:
-        current_files = set(DOWNLOAD_DIR.glob("*"))
-        added = [f for f in current_files - previous if not f.name.endswith(".crdownload")]
-        if added:
-            # Wait for any temporary .crdownload to disappear for these files
-            complete = []
-            for file_path in added:
-                # if companion .crdownload exists, continue waiting
-                cr_file = file_path.with_suffix(file_path.suffix + ".crdownload")
-                if cr_file.exists():
-                    break
-                complete.append(file_path)
-            if complete:
-                return complete
-        time.sleep(1)
-    return []
-
-
-def export_report(driver: webdriver.Chrome, wait: WebDriverWait, timeout: int = 60, keep_modal_open: bool = False) -> list[Path]:
+    with DownloadWatcher(download_dir) as watcher:
+        if tracker is None:
+            # No DevTools log for this browser -> only the folder can tell
+            return watcher.wait_for_new_files(previous, timeout)
+        while True:
+            finished = tracker(driver)
+            if finished:
+                paths = [downloaded_path(d, download_dir) for d in finished if d["state"] == "completed"]
+                if not paths:
+                    print("⚠️  Chrome đã huỷ file tải xuống.")
+                    return []
+                if all(path.is_file() for path in paths):
+                    return paths
+            if not tracker.started or finished:
+                # No download events (or the reported name is not on disk) -> look at the folder
+                complete = completed_downloads(set(download_dir.glob("*")) - previous)
+                if complete:
+                    return complete
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return []
+            # Woken early by the folder changing; events are re-read at least every POLL_FREQUENCY
+            watcher.wait(min(remaining, POLL_FREQUENCY))
+
+
+def export_report(
+    driver: webdriver.Chrome,
+    wait: WebDriverWait,
+    timeout: int = 60,
+    keep_modal_open: bool = False,
+    download_dir: Path = DOWNLOAD_DIR,
+) -> list[Path]:
     """Click the 'Xuất Hóa Đơn' button and wait for the downloaded files.
     
     Args:
         keep_modal_open: If True, don't dismiss popups to keep modal open for reuse
+        download_dir: Folder the browser currently downloads into
     """
 
-    files_before = list(DOWNLOAD_DIR.glob("*"))
-    
-    # Wait a moment for the page to fully load
-    time.sleep(1)
+    files_before = list(download_dir.glob("*"))
     
     # Only dismiss popups if we're not keeping modal open (to reuse existing modal)
     if not keep_modal_open:
@@ -668,46 +659,17 @@ def export_report(driver: webdriver.Chrome, wait: WebDriverWait, timeout: int =
     else:
         print("ℹ️ Keeping modal open for reuse")
 
-    # Wait for modal to be visible if it exists (increased timeout since modal appears after row click)
+    # Wait for a visible modal with data (it appears after the row click)
     # IMPORTANT: Only proceed if modal has data, not blank
-    modal = None
-    try:
-        modal = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, ".modal.show, .modal[style*='display: block'], .modal:not([style*='display: none'])"))
-        )
-        # Ensure modal is visible
-        WebDriverWait(driver, 5).until(EC.visibility_of(modal))
-        
-        # Check if modal has content (not blank) - wait up to 3 seconds
-        has_content = False
-        for check in range(3):
-            try:
-                modal_content = modal.find_element(By.CSS_SELECTOR, ".modal-body, .modal-content")
-                text_content = modal_content.text.strip()
-                if text_content and len(text_content) > 10:  # Has meaningful content
-                    print("✅ Modal dialog detected with content")
-                    has_content = True
-                    break
-            except Exception:
-                pass
-            time.sleep(1)
-        
-        if not has_content:
-            print("⚠️ Modal detected but appears blank, waiting...")
-            time.sleep(2)
-            # Re-check modal
-            try:
-                modal = driver.find_element(By.CSS_SELECTOR, ".modal.show, .modal[style*='display: block']")
-                modal_content = modal.find_element(By.CSS_SELECTOR, ".modal-body, .modal-content")
-                text_content = modal_content.text.strip()
-                if not text_content or len(text_content) <= 10:
-                    print("⚠️ Modal is still blank, may download empty file")
-            except Exception:
-                print("⚠️ Could not verify modal content")
-        
-        time.sleep(1)  # Give modal time to fully render/update content
-    except TimeoutException:
-        print("ℹ️ No modal detected, trying to find button directly on page")
+    modal = wait_for(driver, modal_has_content(), 10, soft=True)
+    if modal is not None:
+        print("✅ Modal dialog detected with content")
+    else:
+        modal, _ = open_modal_text(driver)
+        if modal is not None:
+            print("⚠️ Modal is still blank, may download empty file")
+        else:
+            print("ℹ️ No modal detected, trying to find button directly on page")
     
     # Try multiple selectors to find and click the export button
     # Priority: modal footer button > button with icon > generic button
@@ -719,9 +681,7 @@ def export_report(driver: webdriver.Chrome, wait: WebDriverWait, timeout: int =
         try:
             # Wait for element to be visible and clickable
             # Use find_elements to get all matches, then take the first one
-            elements = WebDriverWait(driver, 5).until(
-                lambda d: d.find_elements(*selector)
-            )
+            elements = wait_for(driver, lambda d: d.find_elements(*selector), 5)
             if elements:
                 # Get the first clickable button
                 for elem in elements:
@@ -742,34 +702,24 @@ def export_report(driver: webdriver.Chrome, wait: WebDriverWait, timeout: int =
         return []
 
     # Final check: Ensure modal still has content before clicking export
-    try:
-        if modal:
-            modal_content = modal.find_element(By.CSS_SELECTOR, ".modal-body, .modal-content")
-            text_content = modal_content.text.strip()
-            if not text_content or len(text_content) <= 10:
-                print("⚠️ Modal appears blank, waiting for content...")
-                time.sleep(2)
-                # Re-check
-                modal_content = modal.find_element(By.CSS_SELECTOR, ".modal-body, .modal-content")
-                text_content = modal_content.text.strip()
-                if not text_content or len(text_content) <= 10:
-                    print("⚠️ Modal is still blank, aborting export to prevent empty download")
-                    return []
-    except Exception:
-        pass
+    if modal is not None and wait_for(driver, modal_has_content(), 2, soft=True) is None:
+        print("⚠️ Modal is still blank, aborting export to prevent empty download")
+        return []
 
     # Scroll into view and click ONCE
     try:
-        driver.execute_script("arguments[0].scrollIntoView({block: 'center', behavior: 'smooth'});", button)
-        time.sleep(0.5)
+        driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", button)
         
         # Don't clear overlays - might trigger modal close
         # clear_overlays(driver)
-        time.sleep(0.3)
+        
+        # Downloads reported by Chrome from here on belong to this export
+        download_tracker = DownloadTracker(driver)
+        network_idle = NetworkIdle()
         
         # Click ONCE - use JavaScript click to ensure it's treated as user action
-        # Only click if button is still visible and enabled
-        if button.is_displayed() and button.is_enabled():
+        # Only click if button is visible and enabled
+        if wait_for(driver, element_ready(button), 5, soft=True):
             try:
                 # Use JavaScript click to bypass some security restrictions
                 driver.execute_script("arguments[0].click();", button)
@@ -797,8 +747,8 @@ def export_report(driver: webdriver.Chrome, wait: WebDriverWait, timeout: int =
             print("⚠️ Button không còn visible/enabled, không thể click")
             return []
         
-        # Wait a moment for download dialog/confirmation if any
-        time.sleep(2)
+        # Wait for a download confirmation dialog or for the export request to finish
+        wait_for(driver, lambda d: EC.alert_is_present()(d) or network_idle(d), 10, soft=True)
         
         # Check if there's a download confirmation dialog and handle it
         try:
@@ -815,7 +765,13 @@ def export_report(driver: webdriver.Chrome, wait: WebDriverWait, timeout: int =
         print(f"⚠️  Lỗi khi click nút export: {e}")
         return []
 
-    downloaded = wait_for_download(files_before, timeout=timeout)
+    downloaded = wait_for_download(
+        files_before,
+        timeout=timeout,
+        download_dir=download_dir,
+        driver=driver,
+        tracker=download_tracker,
+    )
     if downloaded:
         print(f"✅ Đã tải {len(downloaded)} file(s):")
         for path in downloaded:
@@ -825,6 +781,68 @@ def export_report(driver: webdriver.Chrome, wait: WebDriverWait, timeout: int =
     return downloaded
 
 
+def log_in(driver: webdriver.Chrome, wait: WebDriverWait, username: str, password: str):
+    """Log in, unless the browser profile still holds a Fabi session (pooled Chrome)."""
+    driver.get(LOGIN_URL)
+    wait.until(lambda d: d.find_elements(*EMAIL_INPUT) or "dashboard" in d.current_url)
+    if "dashboard" in driver.current_url:
+        print("♻️ Still logged in (browser profile), skipping login")
+        return
+    wait_and_type(driver, EMAIL_INPUT, username)
+    wait_and_type(driver, PASSWORD_INPUT, password)
+    wait_and_click(driver, LOGIN_BUTTON)
+
+
+def open_b07_session(username: str, password: str, headless: bool = False, wait_seconds: int = 40):
+    """Start (or borrow) Chrome, log in and open B07. Returns (driver, wait)."""
+    driver = configure_driver(headless=headless)
+    wait = WebDriverWait(driver, wait_seconds)
+    try:
+        if "payment-method" in driver.current_url.lower():
+            # Pooled Chrome left on B07 by the previous run: reload for fresh figures
+            driver.refresh()
+            wait_for_loading(driver)
+        else:
+            log_in(driver, wait, username, password)
+            navigate_to_b07(driver, wait)
+        print(f"✅ Opened B07 report: {driver.current_url}")
+    except Exception:
+        driver.quit()
+        raise
+    return driver, wait
+
+
+def export_payment_method(session, job) -> list[Path]:
+    """Fetch-plan job: open one payment method's modal, export it into the job's own folder, close the modal."""
+    driver, wait = session
+
+    # The page has no recorded date filter (Menu/fetch-api.txt), so it exports the range it shows: today
+    today = date.today()
+    if (job.from_date, job.to_date) != (today, today):
+        raise ValueError("the B07 page only exports today's range here - use fabi_http.py for other dates")
+
+    download_dir = job_dir(job)
+    set_download_dir(driver, download_dir)
+    print(f"\n📥 Downloading {job_label(job)}...")
+
+    if not click_payment_method(driver, job.method):
+        return []
+    pin_modal_open(driver)
+
+    downloaded = export_report(driver, wait, download_dir=download_dir)
+    if downloaded:
+        print(f"✅ Downloaded {len(downloaded)} file(s) for {job.method}")
+    else:
+        print(f"⚠️ No files downloaded for {job.method}")
+
+    # Close the modal so the next row of the table can be clicked
+    close_modal(driver, wait)
+    if not wait_for(driver, modal_closed, 3, soft=True):
+        print("⚠️ Modal still open, trying to close again...")
+        close_modal(driver, wait)
+    return downloaded
+
+
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Automate Fabi report navigation.")
     parser.add_argument("--username", help="Fabi username (email). Defaults to $FABI_USERNAME.")
@@ -837,7 +855,19 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument(
         "--no-click-transfer",
         action="store_true",
-        help="Skip clicking the Transfer filter after opening B07.",
+        help="Only open B07, skip the exports.",
+    )
+    parser.add_argument(
+        "--methods",
+        nargs="+",
+        default=list(DEFAULT_METHODS),
+        help="B07 payment methods to export (e.g. TRANSFER ATM GRAB_ONLINE). Default: TRANSFER ATM.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f"Browser sessions exporting in parallel (each logs in once). Default: {DEFAULT_WORKERS}.",
     )
     parser.add_argument(
         "--wait",
@@ -858,170 +888,39 @@ def main():
         print("❌ Missing credentials. Provide --username/--password or set FABI_USERNAME/FABI_PASSWORD.")
         sys.exit(1)
 
-    driver = configure_driver(headless=args.headless)
-    wait = WebDriverWait(driver, args.wait)
+    # Visible browsers stay open for manual inspection, so keep them until Ctrl+C
+    keep_open = not args.headless
+    sessions = []
 
-    try:
-        driver.get(LOGIN_URL)
-        wait_and_type(driver, EMAIL_INPUT, username)
-        wait_and_type(driver, PASSWORD_INPUT, password)
-        wait_and_click(driver, LOGIN_BUTTON)
+    def open_session():
+        session = open_b07_session(username, password, headless=args.headless, wait_seconds=args.wait)
+        sessions.append(session)
+        return session
 
-        navigate_to_b07(driver, wait)
-        print(f"✅ Opened B07 report: {driver.current_url}")
+    def close_session(session):
+        session[0].quit()
+        sessions.remove(session)
 
+    try:
         if args.no_click_transfer:
-            print("ℹ️ Skipping transfer filter as requested.")
+            open_session()
+            print("ℹ️ Skipping exports as requested.")
         else:
-            # Step 1: Click TRANSFER and download
-            clicked = click_transfer_filter(driver, wait)
-            if clicked:
-                print("✅ Transfer filter clicked.")
-                
-                # Wait for modal to appear and ensure it has data loaded
-                print("⏳ Waiting for modal to appear and load data...")
-                try:
-                    # Wait for modal to be visible
-                    modal = WebDriverWait(driver, 10).until(
-                        EC.presence_of_element_located((By.CSS_SELECTOR, ".modal.show, .modal[style*='display: block']"))
-                    )
-                    WebDriverWait(driver, 5).until(EC.visibility_of(modal))
-                    print("✅ Modal appeared")
-                    
-                    # Prevent modal from auto-closing by disabling event listeners
-                    try:
-                        driver.execute_script("""
-                            // Disable auto-close on backdrop click
-                            var modals = document.querySelectorAll('.modal');
-                            modals.forEach(function(modal) {
-                                if (modal.style.display !== 'none' && modal.classList.contains('show')) {
-                                    // Remove backdrop click handler
-                                    modal.setAttribute('data-backdrop', 'static');
-                                    modal.setAttribute('data-keyboard', 'false');
-                                    
-                                    // Prevent ESC key from closing
-                                    var originalRemove = modal.remove;
-                                    modal.remove = function() {};
-                                    
-                                    // Disable all close button handlers temporarily
-                                    var closeBtns = modal.querySelectorAll('[data-dismiss="modal"], .close, button.close');
-                                    closeBtns.forEach(function(btn) {
-                                        btn.onclick = null;
-                                        btn.addEventListener('click', function(e) {
-                                            e.stopPropagation();
-                                        }, true);
-                                    });
-                                }
-                            });
-                        """)
-                        print("ℹ️ Disabled auto-close handlers on modal")
-                    except Exception as e:
-                        print(f"⚠️ Could not disable auto-close: {e}")
-                    
-                    # Wait for data to load in modal (check multiple times)
-                    data_loaded = False
-                    for attempt in range(5):  # Check up to 5 times
-                        time.sleep(1)
-                        try:
-                            modal_content = modal.find_element(By.CSS_SELECTOR, ".modal-body, .modal-content")
-                            # Check if modal has actual content (not just empty)
-                            text_content = modal_content.text.strip()
-                            if text_content and len(text_content) > 10:  # Has meaningful content
-                                print(f"✅ Modal has data loaded (attempt {attempt + 1})")
-                                data_loaded = True
-                                break
-                        except Exception:
-                            pass
-                    
-                    if not data_loaded:
-                        print("⚠️ Modal content not fully loaded, but proceeding...")
-                    
-                    # Verify modal is still open before proceeding
-                    try:
-                        modal_check = driver.find_element(By.CSS_SELECTOR, ".modal.show, .modal[style*='display: block']")
-                        if not modal_check.is_displayed():
-                            print("⚠️ Modal closed unexpectedly, waiting for it to reopen...")
-                            time.sleep(2)
-                            modal = WebDriverWait(driver, 5).until(
-                                EC.presence_of_element_located((By.CSS_SELECTOR, ".modal.show, .modal[style*='display: block']"))
-                            )
-                    except Exception:
-                        print("⚠️ Could not verify modal state")
-                except TimeoutException:
-                    print("⚠️ Modal did not appear after clicking TRANSFER")
-                
-                # Export TRANSFER data
-                print("\n📥 Downloading TRANSFER data...")
-                transfer_files = export_report(driver, wait, keep_modal_open=False)
-                if transfer_files:
-                    print(f"✅ Downloaded {len(transfer_files)} file(s) for TRANSFER")
-                else:
-                    print("⚠️ No files downloaded for TRANSFER")
-                
-                # Close TRANSFER modal by clicking X button ONCE
-                print("\n🔒 Closing TRANSFER modal...")
-                close_modal(driver, wait)
-                
-                # Verify modal is closed before continuing
-                time.sleep(1)
-                try:
-                    modal = driver.find_element(By.CSS_SELECTOR, ".modal.show, .modal[style*='display: block']")
-                    if modal.is_displayed():
-                        print("⚠️ Modal still open, trying to close again...")
-                        close_modal(driver, wait)
-                        time.sleep(1)
-                except Exception:
-                    print("✅ Modal is closed")
-            else:
-                print("⚠️ Transfer filter not found. Please adjust the SELECTOR or verify UI state.")
-            
-            # Step 2: Click ATM row to open new modal
-            print("\n🔄 Switching to ATM filter...")
-            atm_clicked = click_atm_filter(driver, wait, keep_modal_open=False)
-            if atm_clicked:
-                print("✅ ATM filter clicked.")
-                print("⏳ Waiting for modal content to update with ATM data...")
-                time.sleep(2)  # Wait for modal content to update with ATM data
-                
-                # Export ATM data - reuse the same modal
-                print("\n📥 Downloading ATM data...")
-                atm_files = export_report(driver, wait, keep_modal_open=True)
-                if atm_files:
-                    print(f"✅ Downloaded {len(atm_files)} file(s) for ATM")
-                    # Rename ATM files to add "(1)" to avoid overwriting TRANSFER files
-                    # Both TRANSFER and ATM downloads have the same filename (e.g., sale_by_payment_method.xls)
-                    # So we rename ATM file to sale_by_payment_method (1).xls
-                    for file_path in atm_files:
-                        try:
-                            # Get file name and extension
-                            stem = file_path.stem  # filename without extension (e.g., "sale_by_payment_method")
-                            suffix = file_path.suffix  # extension (e.g., ".xls")
-                            
-                            # Create new filename with "(1)" before extension
-                            # Example: sale_by_payment_method.xls → sale_by_payment_method (1).xls
-                            new_name = f"{stem} (1){suffix}"
-                            new_path = file_path.parent / new_name
-                            
-                            # Check if new name already exists, if so use (2), (3), etc.
-                            counter = 1
-                            while new_path.exists():
-                                counter += 1
-                                new_name = f"{stem} ({counter}){suffix}"
-                                new_path = file_path.parent / new_name
-                            
-                            # Rename the file
-                            file_path.rename(new_path)
-                            print(f"   • Renamed ATM file: {file_path.name} → {new_path.name}")
-                            print(f"     (TRANSFER: {file_path.name}, ATM: {new_path.name})")
-                        except Exception as e:
-                            print(f"⚠️ Could not rename {file_path.name}: {e}")
-                else:
-                    print("⚠️ No files downloaded for ATM")
-            else:
-                print("⚠️ ATM filter not found. Please adjust the SELECTOR or verify UI state.")
+            today = date.today()
+            jobs = plan_jobs([method.upper() for method in args.methods], [(today, today)])
+            results = run_plan(
+                jobs,
+                export_payment_method,
+                open_session,
+                close_session=None if keep_open else close_session,
+                workers=args.workers,
+            )
+            print_summary(results)
+            # TRANSFER → sale_by_payment_method.xls, ATM → sale_by_payment_method (1).xls
+            publish_reports(results, DOWNLOAD_DIR)
 
         # Keep the browser open for manual inspection unless headless mode is used.
-        if not args.headless:
+        if keep_open and sessions:
             print("ℹ️ Leaving browser window open for manual actions. Press Ctrl+C to quit.")
             while True:
                 time.sleep(1)
@@ -1032,9 +931,9 @@ def main():
     except NoSuchElementException as err:
         print(f"❌ Could not locate element: {err}")
     finally:
-        driver.quit()
+        for driver, _ in list(sessions):
+            driver.quit()
 
 
 if __name__ == "__main__":
     main()
-
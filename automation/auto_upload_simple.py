@@ -16,15 +16,13 @@ Sử dụng:
     python3 auto_upload_simple.py
 """
 
+import sys
 import time
 from pathlib import Path
-from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
 import platform
 import subprocess
 
@@ -32,6 +30,10 @@ import subprocess
 PACKAGE_DIR = Path(__file__).resolve().parent
 PROJECT_ROOT = PACKAGE_DIR.parent
 
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+from automation.browser_pool import attach_driver, lease_browser, start_chrome
+
 # ============================================================================
 # CẤU HÌNH
 # ============================================================================
@@ -52,15 +54,23 @@ CUSTOMER_ADDRESS = "Khách Hàng Không Cung Cấp Thông Tin"
 # ============================================================================
 
 def setup_driver():
-    """Setup Chrome với options tối ưu"""
-    chrome_options = Options()
-    chrome_options.add_argument('--start-maximized')
-    chrome_options.add_argument('--disable-blink-features=AutomationControlled')
-    chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-    chrome_options.add_experimental_option('useAutomationExtension', False)
-    
-    service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=chrome_options)
+    """Setup Chrome với options tối ưu.
+
+    Browser pool (automation/browser_pool.py) đang chạy thì mượn Chrome có sẵn của nó: profile
+    riêng giữ phiên đăng nhập, khỏi mở Chrome mới + đăng nhập lại. Không thì mở Chrome mới
+    (đường dẫn chromedriver đã lưu trong .wdm/).
+    """
+    lease = lease_browser("upload")
+    if lease is not None:
+        driver = attach_driver(lease)
+        print(f"♻️ Dùng Chrome '{lease.name}' chạy sẵn trong browser pool")
+    else:
+        chrome_options = Options()
+        chrome_options.add_argument('--start-maximized')
+        chrome_options.add_argument('--disable-blink-features=AutomationControlled')
+        chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+        chrome_options.add_experimental_option('useAutomationExtension', False)
+        driver = start_chrome(chrome_options)
     driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
     
     return driver
@@ -0,0 +1,606 @@
+#!/usr/bin/env python3
+"""
+POOL CHROME CHẠY SẴN (FETCH FABI + UPLOAD HÓA ĐƠN)
+==================================================
+Trước đây mỗi lần fetch / upload: ChromeDriverManager().install() (hỏi phiên bản qua mạng),
+mở Chrome mới (5-15 giây) rồi đăng nhập lại từ đầu. Module này:
+
+- resolve_chromedriver(): tìm chromedriver 1 lần, lưu đường dẫn vào .wdm/chromedriver-path.json.
+  start_chrome() dùng đường dẫn đã lưu; Chrome vừa cập nhật (lệch phiên bản) thì tìm lại 1 lần
+- BrowserPool: giữ sẵn các Chrome đang chạy (--remote-debugging-port), mỗi Chrome 1 profile riêng
+  trong .browser-profiles/<tên>/ → cookie đăng nhập còn nguyên giữa các lần chạy
+- BrowserPoolServer: API socket cục bộ (mỗi dòng 1 JSON) để script fetch / upload mượn 1 Chrome:
+    {"op": "lease", "profile": "fabi", "headless": false}
+        → {"ok": true, "name": "fabi-1", "debugger_address": "127.0.0.1:9310", "driver_path": "..."}
+    {"op": "release"}   (hoặc đóng kết nối: script chết giữa chừng thì Chrome vẫn được trả lại)
+    {"op": "status"}
+- lease_browser() / attach_driver(): phía script. Pool không chạy → None, script tự mở Chrome như cũ
+
+Chạy riêng (web control panel cũng tự bật pool khi khởi động):
+    python3 automation/browser_pool.py
+    python3 automation/browser_pool.py --headless      # Chrome 'fabi' headless (như fetch từ web panel)
+"""
+
+import argparse
+import json
+import os
+import shutil
+import signal
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from urllib.error import URLError
+from urllib.request import urlopen
+
+PACKAGE_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = PACKAGE_DIR.parent
+WDM_DIR = PROJECT_ROOT / ".wdm"
+DRIVER_CACHE_FILE = WDM_DIR / "chromedriver-path.json"
+PROFILES_DIR = PROJECT_ROOT / ".browser-profiles"
+
+POOL_HOST = "127.0.0.1"
+POOL_PORT = int(os.getenv("BROWSER_POOL_PORT", "9300"))
+
+# Cổng remote debugging của Chrome thứ 1, 2, ... trong pool
+FIRST_DEBUG_PORT = 9310
+
+# Số Chrome giữ sẵn cho mỗi loại việc (fetch mặc định chạy 2 phiên song song)
+POOL_SIZES = {
+    "fabi": 2,
+    "upload": 1,
+}
+
+# Cờ Chrome của mọi phiên trong pool (giống configure_driver / setup_driver)
+CHROME_ARGS = [
+    "--no-first-run",
+    "--no-default-browser-check",
+    "--disable-gpu",
+    "--no-sandbox",
+    "--window-size=1440,900",
+    "--disable-blink-features=AutomationControlled",
+    "--disable-features=DownloadBubble,DownloadBubbleV2",
+    "--safebrowsing-disable-download-protection",
+]
+
+# Cờ thêm theo profile (fetch Fabi cần giống configure_driver để tải file)
+PROFILE_CHROME_ARGS = {
+    "fabi": ["--disable-web-security", "--allow-running-insecure-content"],
+}
+
+# Preferences ghi vào profile mới (giống prefs tải file của configure_driver)
+PROFILE_PREFERENCES = {
+    "download": {"prompt_for_download": False, "directory_upgrade": True},
+    "safebrowsing": {"enabled": False},
+    "profile": {"default_content_setting_values": {"automatic_downloads": 1}},
+}
+
+CHROME_CANDIDATES = [
+    "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome",
+    r"C:\Program Files\Google\Chrome\Application\chrome.exe",
+    r"C:\Program Files (x86)\Google\Chrome\Application\chrome.exe",
+]
+
+CHROME_START_TIMEOUT = 20
+LEASE_TIMEOUT = 120
+CONNECT_TIMEOUT = 0.5
+
+# ============================================================================
+# CHROMEDRIVER
+# ============================================================================
+
+_driver_lock = threading.Lock()
+
+def resolve_chromedriver(refresh=False):
+    """Đường dẫn chromedriver: lấy từ .wdm/chromedriver-path.json, chỉ gọi webdriver-manager khi chưa có"""
+    with _driver_lock:
+        if not refresh and DRIVER_CACHE_FILE.exists():
+            try:
+                path = json.loads(DRIVER_CACHE_FILE.read_text(encoding="utf-8"))["path"]
+                if Path(path).exists():
+                    return path
+            except (ValueError, KeyError):
+                pass
+
+        os.environ.setdefault("WDM_LOCAL", "1")
+        os.environ.setdefault("WDM_LOG_LEVEL", "0")
+        from webdriver_manager.chrome import ChromeDriverManager
+
+        path = ChromeDriverManager().install()
+        WDM_DIR.mkdir(exist_ok=True)
+        DRIVER_CACHE_FILE.write_text(
+            json.dumps({"path": path, "resolved_at": datetime.now().isoformat(timespec="seconds")}),
+            encoding="utf-8",
+        )
+        return path
+
+def start_chrome(options, driver_path=None):
+    """
+    webdriver.Chrome với chromedriver đã lưu. Chrome đã cập nhật mà driver cũ không khớp
+    (SessionNotCreatedException) thì tìm driver mới và thử lại 1 lần.
+    """
+    from selenium import webdriver
+    from selenium.common.exceptions import SessionNotCreatedException
+    from selenium.webdriver.chrome.service import Service
+
+    try:
+        return webdriver.Chrome(service=Service(driver_path or resolve_chromedriver()), options=options)
+    except SessionNotCreatedException:
+        return webdriver.Chrome(service=Service(resolve_chromedriver(refresh=True)), options=options)
+
+def find_chrome_binary():
+    """File chạy Chrome ($CHROME_BINARY, PATH, rồi vị trí cài đặt mặc định); None nếu không có"""
+    configured = os.getenv("CHROME_BINARY")
+    if configured:
+        return configured
+    for name in ("google-chrome", "google-chrome-stable", "chromium", "chromium-browser", "chrome"):
+        path = shutil.which(name)
+        if path:
+            return path
+    for path in CHROME_CANDIDATES:
+        if Path(path).exists():
+            return path
+    return None
+
+# ============================================================================
+# POOL
+# ============================================================================
+
+class _Instance:
+    """
+    1 Chrome của pool: profile + cổng debug cố định, trạng thái idle / starting / leased.
+
+    Pool / web panel chết mà không kịp chạy atexit (SIGTERM, crash) thì Chrome vẫn chạy tiếp
+    trên cổng + profile đó. Lần sau pool nhận lại Chrome này (adopted) thay vì mở Chrome thứ 2
+    trên cùng profile (Chrome thứ 2 chuyển sang Chrome cũ rồi thoát ngay).
+    """
+
+    def __init__(self, name, port, extra_args=()):
+        self.name = name
+        self.port = port
+        self.extra_args = list(extra_args)
+        self.profile_dir = PROFILES_DIR / name
+        self.process = None
+        self.adopted = False
+        self.headless = None
+        self.state = "idle"
+        self.leases = 0
+        self.started_at = None
+
+    @property
+    def debugger_address(self):
+        return f"{POOL_HOST}:{self.port}"
+
+    def _version(self):
+        """/json/version của Chrome trên cổng debug, None nếu không có gì trả lời"""
+        try:
+            with urlopen(f"http://{self.debugger_address}/json/version", timeout=1) as response:
+                if response.status != 200:
+                    return None
+                return json.loads(response.read())
+        except (URLError, OSError, ValueError):
+            return None
+
+    def responding(self):
+        return self._version() is not None
+
+    @property
+    def running(self):
+        return self.adopted or (self.process is not None and self.process.poll() is None)
+
+    def _profile_port(self):
+        """Cổng debug mà Chrome đang dùng profile này ghi trong <profile>/DevToolsActivePort"""
+        try:
+            return int((self.profile_dir / "DevToolsActivePort").read_text().split()[0])
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def _profile_owner_pid(self):
+        """PID của Chrome đang giữ profile (<profile>/SingletonLock → 'hostname-pid'), None nếu không có"""
+        try:
+            target = os.readlink(self.profile_dir / "SingletonLock")
+        except OSError:
+            return None
+        host, _, pid = target.rpartition("-")
+        if host != socket.gethostname() or not pid.isdigit():
+            return None
+        return int(pid)
+
+    def adopt(self):
+        """Nhận Chrome đang chạy trên đúng cổng + profile này (Chrome còn sót, hoặc process đã thoát mà cổng vẫn trả lời)"""
+        version = self._version()
+        if version is None or self._profile_port() != self.port:
+            return False
+        if not self.adopted:
+            print(f"♻️ Nhận lại Chrome {self.name} đang chạy sẵn trên cổng {self.port}")
+        self.process = None
+        self.adopted = True
+        self.headless = "HeadlessChrome" in version.get("User-Agent", "")
+        self.started_at = self.started_at or datetime.now().isoformat(timespec="seconds")
+        return True
+
+    def alive(self):
+        if self.process is not None and self.process.poll() is None:
+            return self.responding()
+        return self.adopt()
+
+    def _seed_preferences(self):
+        preferences = self.profile_dir / "Default" / "Preferences"
+        if not preferences.exists():
+            preferences.parent.mkdir(parents=True, exist_ok=True)
+            preferences.write_text(json.dumps(PROFILE_PREFERENCES), encoding="utf-8")
+
+    def launch(self, chrome_binary, headless):
+        self.stop()
+        self._terminate_profile_owner()
+        if self.responding():
+            raise RuntimeError(f"Cổng debug {self.port} của Chrome {self.name} đang bị chương trình khác dùng")
+        self._seed_preferences()
+        args = [chrome_binary, f"--remote-debugging-port={self.port}", f"--user-data-dir={self.profile_dir}", *CHROME_ARGS, *self.extra_args]
+        if headless:
+            args.append("--headless=new")
+        args.append("about:blank")
+        self.process = subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        deadline = time.monotonic() + CHROME_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                # Chrome vừa mở đã chuyển sang 1 Chrome khác đang chạy trên profile này
+                if self.adopt():
+                    return
+                raise RuntimeError(f"Chrome {self.name} thoát ngay khi khởi động (exit {self.process.returncode})")
+            if self.responding():
+                self.headless = headless
+                self.started_at = datetime.now().isoformat(timespec="seconds")
+                return
+            time.sleep(0.2)
+        self.stop()
+        raise RuntimeError(f"Chrome {self.name} không mở cổng debug {self.port} sau {CHROME_START_TIMEOUT}s")
+
+    def _terminate_profile_owner(self):
+        """Tắt Chrome khác còn giữ profile (không có process handle: Chrome đã nhận lại / còn sót)"""
+        pid = self._profile_owner_pid()
+        if pid is None or pid == os.getpid():
+            return
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except OSError:
+            return  # đã thoát (lock cũ) hoặc không phải của mình
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            try:
+                os.kill(pid, 0)
+            except OSError:
+                return
+            time.sleep(0.1)
+        try:
+            os.kill(pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+        except OSError:
+            pass
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        elif self.adopted:
+            self._terminate_profile_owner()
+        self.process = None
+        self.adopted = False
+        self.started_at = None
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "state": self.state,
+            "running": self.running,
+            "adopted": self.adopted,
+            "headless": self.headless,
+            "debugger_address": self.debugger_address,
+            "profile_dir": str(self.profile_dir),
+            "leases": self.leases,
+            "started_at": self.started_at,
+        }
+
+class BrowserPool:
+    """
+    Các Chrome chạy sẵn theo profile ('fabi', 'upload'); mỗi Chrome chỉ cho 1 script mượn 1 lúc.
+
+    headless: chế độ mở sẵn - True/False cho mọi profile, hoặc dict {profile: True/False}
+    (profile không có trong dict: False). Nên đặt đúng chế độ mà script sẽ mượn, vì mượn
+    khác chế độ thì Chrome phải mở lại.
+    """
+
+    def __init__(self, sizes=POOL_SIZES, headless=False, chrome_binary=None):
+        self.headless = headless
+        self.chrome_binary = chrome_binary or find_chrome_binary()
+        self.driver_path = None
+        self._cond = threading.Condition()
+        self._instances = {}
+        port = FIRST_DEBUG_PORT
+        for profile, size in sizes.items():
+            self._instances[profile] = []
+            for index in range(size):
+                extra_args = PROFILE_CHROME_ARGS.get(profile, ())
+                self._instances[profile].append(_Instance(f"{profile}-{index + 1}", port, extra_args))
+                port += 1
+
+    def _resolve_driver(self):
+        if self.driver_path is None:
+            try:
+                self.driver_path = resolve_chromedriver()
+            except Exception as e:
+                # Script mượn Chrome sẽ tự tìm driver
+                print(f"⚠️ Browser pool: không tìm được chromedriver: {e}")
+
+    def _reserve(self, instance):
+        with self._cond:
+            if instance.state != "idle":
+                return False
+            instance.state = "starting"
+            return True
+
+    def _set_state(self, instance, state):
+        with self._cond:
+            instance.state = state
+            self._cond.notify_all()
+
+    def warm(self):
+        """Mở sẵn mọi Chrome chưa chạy (lỗi chỉ ghi log - lần mượn sau sẽ thử lại)"""
+        if self.chrome_binary is None:
+            print("⚠️ Browser pool: không tìm thấy Chrome (đặt biến CHROME_BINARY)")
+            return
+        self._resolve_driver()
+        for profile, instances in self._instances.items():
+            headless = self.headless_for(profile)
+            for instance in instances:
+                if not self._reserve(instance):
+                    continue
+                try:
+                    if not instance.alive() or instance.headless != headless:
+                        instance.launch(self.chrome_binary, headless)
+                        print(f"🔥 Chrome {instance.name} sẵn sàng (cổng {instance.port})")
+                except Exception as e:
+                    print(f"⚠️ Không mở được Chrome {instance.name}: {e}")
+                finally:
+                    self._set_state(instance, "idle")
+
+    def headless_for(self, profile):
+        """Chế độ mở sẵn của profile"""
+        if isinstance(self.headless, dict):
+            return bool(self.headless.get(profile, False))
+        return bool(self.headless)
+
+    def lease(self, profile, headless=None, timeout=LEASE_TIMEOUT):
+        """Mượn 1 Chrome rảnh của profile (chờ tối đa timeout giây); Chrome chết / sai chế độ thì mở lại"""
+        if profile not in self._instances:
+            raise ValueError(f"Pool không có profile '{profile}'")
+        if self.chrome_binary is None:
+            raise RuntimeError("Không tìm thấy Chrome (đặt biến CHROME_BINARY)")
+        headless = self.headless_for(profile) if headless is None else headless
+
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                free = [instance for instance in self._instances[profile] if instance.state == "idle"]
+                if free:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"Không có Chrome '{profile}' rảnh sau {timeout}s")
+                self._cond.wait(remaining)
+            # Ưu tiên Chrome đang chạy đúng chế độ (khỏi phải mở lại)
+            free.sort(key=lambda instance: (not instance.running, instance.headless != headless))
+            instance = free[0]
+            instance.state = "starting"
+
+        try:
+            if not instance.alive() or instance.headless != headless:
+                instance.launch(self.chrome_binary, headless)
+            self._resolve_driver()
+        except Exception:
+            self._set_state(instance, "idle")
+            raise
+        with self._cond:
+            instance.state = "leased"
+            instance.leases += 1
+        return instance
+
+    def release(self, instance):
+        self._set_state(instance, "idle")
+
+    def status(self):
+        with self._cond:
+            return {
+                "chrome_binary": self.chrome_binary,
+                "driver_path": self.driver_path,
+                "headless": {profile: self.headless_for(profile) for profile in self._instances},
+                "instances": [instance.to_dict() for instances in self._instances.values() for instance in instances],
+            }
+
+    def close(self):
+        for instances in self._instances.values():
+            for instance in instances:
+                instance.stop()
+
+# ============================================================================
+# API SOCKET
+# ============================================================================
+
+class _LeaseHandler(socketserver.StreamRequestHandler):
+    """1 kết nối = tối đa 1 Chrome đang mượn; kết nối đóng thì Chrome được trả lại"""
+
+    def _reply(self, data):
+        self.wfile.write((json.dumps(data, ensure_ascii=False) + "\n").encode("utf-8"))
+
+    def handle(self):
+        pool = self.server.pool
+        instance = None
+        try:
+            for line in self.rfile:
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    self._reply({"ok": False, "error": "JSON không hợp lệ"})
+                    continue
+
+                op = request.get("op")
+                if op == "lease":
+                    if instance is not None:
+                        self._reply({"ok": False, "error": f"Kết nối này đang mượn {instance.name}"})
+                        continue
+                    try:
+                        instance = pool.lease(
+                            request.get("profile", "fabi"),
+                            request.get("headless"),
+                            request.get("timeout", LEASE_TIMEOUT),
+                        )
+                    except (ValueError, RuntimeError, TimeoutError, OSError) as e:
+                        self._reply({"ok": False, "error": str(e)})
+                        continue
+                    self._reply({
+                        "ok": True,
+                        "name": instance.name,
+                        "debugger_address": instance.debugger_address,
+                        "driver_path": pool.driver_path,
+                    })
+                elif op == "release":
+                    if instance is not None:
+                        pool.release(instance)
+                        instance = None
+                    self._reply({"ok": True})
+                elif op == "status":
+                    self._reply({"ok": True, **pool.status()})
+                else:
+                    self._reply({"ok": False, "error": f"Lệnh không hợp lệ: {op}"})
+        except OSError:
+            pass  # script đã ngắt kết nối
+        finally:
+            if instance is not None:
+                pool.release(instance)
+
+class BrowserPoolServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, pool, host=POOL_HOST, port=POOL_PORT):
+        super().__init__((host, port), _LeaseHandler)
+        self.pool = pool
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="browser-pool", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self.pool.close()
+
+# ============================================================================
+# PHÍA SCRIPT (FETCH / UPLOAD)
+# ============================================================================
+
+class BrowserLease:
+    """Chrome đang mượn từ pool; giữ kết nối socket tới khi release()"""
+
+    def __init__(self, sock, info):
+        self._sock = sock
+        self.name = info["name"]
+        self.debugger_address = info["debugger_address"]
+        self.driver_path = info.get("driver_path")
+
+    def release(self):
+        if self._sock is None:
+            return
+        try:
+            self._sock.sendall(b'{"op": "release"}\n')
+        except OSError:
+            pass
+        finally:
+            self._sock.close()
+            self._sock = None
+
+def lease_browser(profile, headless=False, timeout=LEASE_TIMEOUT, host=POOL_HOST, port=POOL_PORT):
+    """
+    Mượn 1 Chrome chạy sẵn của profile.
+
+    Returns: BrowserLease, hoặc None nếu pool không chạy / không cho mượn được (script tự mở Chrome)
+    """
+    try:
+        sock = socket.create_connection((host, port), timeout=CONNECT_TIMEOUT)
+    except OSError:
+        return None
+
+    try:
+        sock.settimeout(timeout + CHROME_START_TIMEOUT)
+        request = {"op": "lease", "profile": profile, "headless": headless, "timeout": timeout}
+        sock.sendall((json.dumps(request) + "\n").encode("utf-8"))
+        reply = json.loads(sock.makefile("r", encoding="utf-8").readline() or "{}")
+    except (OSError, ValueError) as e:
+        sock.close()
+        print(f"⚠️ Browser pool không trả lời: {e}")
+        return None
+
+    if not reply.get("ok"):
+        sock.close()
+        print(f"⚠️ Browser pool: {reply.get('error', 'lỗi không rõ')}")
+        return None
+    sock.settimeout(None)
+    return BrowserLease(sock, reply)
+
+def attach_driver(lease, options=None):
+    """
+    WebDriver điều khiển Chrome đã mượn (debuggerAddress). driver.quit() chỉ tắt chromedriver -
+    Chrome (và phiên đăng nhập) vẫn chạy - rồi trả Chrome về pool.
+    """
+    from selenium.webdriver.chrome.options import Options
+
+    options = options or Options()
+    options.debugger_address = lease.debugger_address
+    try:
+        driver = start_chrome(options, driver_path=lease.driver_path)
+    except Exception:
+        lease.release()
+        raise
+
+    quit_driver = driver.quit
+
+    def quit():
+        try:
+            quit_driver()
+        finally:
+            lease.release()
+
+    driver.quit = quit
+    return driver
+
+def main():
+    parser = argparse.ArgumentParser(description="Giữ sẵn Chrome (đã đăng nhập) cho fetch Fabi / upload hóa đơn.")
+    parser.add_argument("--headless", action="store_true", help="Mở sẵn Chrome 'fabi' ở chế độ headless (upload luôn có cửa sổ).")
+    parser.add_argument("--port", type=int, default=POOL_PORT, help=f"Cổng API socket. Mặc định: {POOL_PORT}.")
+    args = parser.parse_args()
+
+    pool = BrowserPool(headless={"fabi": args.headless, "upload": False})
+    if pool.chrome_binary is None:
+        print("❌ Không tìm thấy Chrome. Đặt biến CHROME_BINARY=/đường/dẫn/chrome")
+        sys.exit(1)
+
+    server = BrowserPoolServer(pool, port=args.port).start()
+    print(f"🌐 Browser pool đang chạy: {POOL_HOST}:{args.port} (Ctrl+C để dừng)")
+    pool.warm()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+        print("\n👋 Đã tắt browser pool")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+PHÂN BỔ GIẢM GIÁ CHO CẢ BATCH
+=============================
+Giảm giá + chiết khấu thanh toán của mỗi hóa đơn được trừ vào 1 món (món có thành tiền
+cao nhất, món đứng trước nếu bằng nhau). Quy tắc:
+- Tổng giảm giá < 1.000đ: bỏ qua (thường là parse sai)
+- Tổng giảm giá > 50% tổng bill: bỏ qua
+- Mỗi món giảm tối đa 90% thành tiền; phần vượt trần là phần "chưa áp dụng"
+
+Cả ngày được xử lý một lượt: với numpy, các món được trải thành cột (hóa đơn, số lượng,
+đơn giá) và tính bằng vài phép reduceat; không có numpy thì dùng vòng lặp Python cho ra
+đúng cùng kết quả (tests/test_discounts.py so 2 cách tính với nhau). Hàm trả về report (không print), bên gọi tự quyết định hiển thị.
+"""
+
+from automation.money import discount_cap, to_dong
+
+try:
+    import numpy as np
+except ImportError:  # numpy là tùy chọn - không có thì dùng vòng lặp Python
+    np = None
+
+MIN_DISCOUNT = 1000
+MAX_BILL_PERCENT = 50
+MAX_ITEM_PERCENT = 90
+
+def _empty_report(engine):
+    return {
+        'engine': engine,
+        'applied': [],      # {'invoice_id', 'item', 'discount', 'old_price', 'new_price'}
+        'skipped': [],      # {'invoice_id', 'reason', 'discount', 'items_total'}
+        'remainders': [],   # {'invoice_id', 'discount', 'applied', 'remaining'}
+    }
+
+def _requested_discount(invoice):
+    return invoice['discount'] + invoice['payment_discount']
+
+def _record_result(report, invoice, target_item, discount, applied, new_price):
+    """Ghi giá mới vào món và thêm dòng vào report"""
+    old_price = target_item['price']
+    target_item['price'] = new_price
+    report['applied'].append({
+        'invoice_id': invoice['invoice_id'],
+        'item': target_item['name'],
+        'discount': applied,
+        'old_price': old_price,
+        'new_price': new_price,
+    })
+    remaining = discount - applied
+    if remaining > 1:
+        report['remainders'].append({
+            'invoice_id': invoice['invoice_id'],
+            'discount': discount,
+            'applied': applied,
+            'remaining': remaining,
+        })
+
+def _skip_entry(invoice, reason, discount, items_total):
+    return {
+        'invoice_id': invoice['invoice_id'],
+        'reason': reason,
+        'discount': discount,
+        'items_total': items_total,
+    }
+
+def _skip(report, invoice, reason, discount, items_total):
+    report['skipped'].append(_skip_entry(invoice, reason, discount, items_total))
+
+# ============================================================================
+# VÒNG LẶP PYTHON
+# ============================================================================
+
+def _allocate_python(invoices):
+    report = _empty_report('python')
+    for invoice in invoices:
+        items = invoice['items']
+        if not items:
+            continue
+        requested = _requested_discount(invoice)
+        if requested <= 0:
+            continue
+        if requested < MIN_DISCOUNT:
+            _skip(report, invoice, 'too_small', requested, None)
+            continue
+
+        discount = to_dong(requested)
+        amounts = [to_dong(item['quantity'] * item['price']) for item in items]
+        items_total = sum(amounts)
+        if items_total <= 0:
+            continue
+        if discount * 100 > items_total * MAX_BILL_PERCENT:
+            _skip(report, invoice, 'over_half', discount, items_total)
+            continue
+        if discount >= items_total:
+            _skip(report, invoice, 'over_total', discount, items_total)
+            continue
+
+        target = max(range(len(items)), key=amounts.__getitem__)
+        target_item = items[target]
+        applied = min(discount, discount_cap(amounts[target], MAX_ITEM_PERCENT))
+        new_price = max((amounts[target] - applied) / target_item['quantity'], 1.0)
+        _record_result(report, invoice, target_item, discount, applied, new_price)
+    return report
+
+# ============================================================================
+# NUMPY
+# ============================================================================
+
+def _to_dong_array(values):
+    """money.to_dong cho cả mảng: làm tròn nửa lên theo trị tuyệt đối (-12,5 → -13)"""
+    return (np.sign(values) * np.floor(np.abs(values) + 0.5)).astype(np.int64)
+
+def _allocate_numpy(invoices):
+    report = _empty_report('numpy')
+
+    # Chỉ các hóa đơn có món và có giảm giá mới cần tính
+    # skipped: (vị trí hóa đơn, entry) - sắp lại theo thứ tự hóa đơn như vòng lặp Python
+    candidates = []
+    positions = []
+    skipped = []
+    for position, invoice in enumerate(invoices):
+        if not invoice['items']:
+            continue
+        requested = _requested_discount(invoice)
+        if requested <= 0:
+            continue
+        if requested < MIN_DISCOUNT:
+            skipped.append((position, _skip_entry(invoice, 'too_small', requested, None)))
+            continue
+        candidates.append(invoice)
+        positions.append(position)
+    if not candidates:
+        report['skipped'] = [entry for _, entry in skipped]
+        return report
+
+    # Cột món: các món của cùng hóa đơn nằm liền nhau, starts = vị trí món đầu của từng hóa đơn
+    counts = np.fromiter((len(invoice['items']) for invoice in candidates), dtype=np.int64, count=len(candidates))
+    starts = np.zeros(len(candidates), dtype=np.int64)
+    np.cumsum(counts[:-1], out=starts[1:])
+    n_items = int(counts.sum())
+    quantities = np.fromiter((item['quantity'] for invoice in candidates for item in invoice['items']),
+                             dtype=np.float64, count=n_items)
+    prices = np.fromiter((item['price'] for invoice in candidates for item in invoice['items']),
+                         dtype=np.float64, count=n_items)
+    owner = np.repeat(np.arange(len(candidates)), counts)
+
+    # Thành tiền (làm tròn nửa lên về đồng, giống money.to_dong) và tổng từng hóa đơn
+    amounts = _to_dong_array(quantities * prices)
+    totals = np.add.reduceat(amounts, starts)
+
+    # Món mục tiêu: vị trí đầu tiên đạt thành tiền lớn nhất trong hóa đơn
+    best = np.maximum.reduceat(amounts, starts)
+    is_best = np.flatnonzero(amounts == best[owner])
+    _, first = np.unique(owner[is_best], return_index=True)
+    target = is_best[first]
+
+    requested = np.fromiter((_requested_discount(invoice) for invoice in candidates),
+                            dtype=np.float64, count=len(candidates))
+    discounts = _to_dong_array(requested)
+
+    target_amounts = amounts[target]
+    applied = np.minimum(discounts, target_amounts * MAX_ITEM_PERCENT // 100)
+    new_prices = np.maximum((target_amounts - applied) / quantities[target], 1.0)
+
+    positive = totals > 0
+    over_half = positive & (discounts * 100 > totals * MAX_BILL_PERCENT)
+    over_total = positive & ~over_half & (discounts >= totals)
+    apply = positive & ~over_half & ~over_total
+
+    for index in np.flatnonzero(over_half | over_total):
+        reason = 'over_half' if over_half[index] else 'over_total'
+        entry = _skip_entry(candidates[index], reason, int(discounts[index]), int(totals[index]))
+        skipped.append((positions[index], entry))
+    skipped.sort(key=lambda pair: pair[0])
+    report['skipped'] = [entry for _, entry in skipped]
+
+    for index in np.flatnonzero(apply):
+        invoice = candidates[index]
+        target_item = invoice['items'][int(target[index] - starts[index])]
+        _record_result(report, invoice, target_item, int(discounts[index]),
+                       int(applied[index]), float(new_prices[index]))
+    return report
+
+# ============================================================================
+# API
+# ============================================================================
+
+def allocate_discounts(invoices, use_numpy=None):
+    """
+    Trừ giảm giá của từng hóa đơn vào món có thành tiền cao nhất (sửa giá trực tiếp trong item).
+
+    use_numpy: None = dùng numpy nếu có, False = luôn dùng vòng lặp Python
+
+    Returns: report {'engine', 'applied', 'skipped', 'remainders'}
+    """
+    if use_numpy is None:
+        use_numpy = np is not None
+    if use_numpy and np is not None:
+        return _allocate_numpy(invoices)
+    return _allocate_python(invoices)
+
+def discount_report_lines(report):
+    """Các dòng tóm tắt report để in ra log"""
+    lines = []
+    if report['applied']:
+        total_applied = sum(entry['discount'] for entry in report['applied'])
+        lines.append(f"   💰 Giảm giá: đã trừ vào {len(report['applied'])} hóa đơn (tổng {total_applied:,.0f}đ)")
+    for entry in report['skipped']:
+        if entry['reason'] == 'over_half':
+            lines.append(f"⚠️  Cảnh báo: Hóa đơn {entry['invoice_id']} có giảm giá bất thường ({entry['discount']:,.0f}đ > 50% tổng {entry['items_total']:,.0f}đ). Bỏ qua phân bổ giảm giá.")
+        elif entry['reason'] == 'over_total':
+            lines.append(f"⚠️  Cảnh báo: Hóa đơn {entry['invoice_id']} có giảm giá >= tổng giá trị. Bỏ qua phân bổ giảm giá.")
+    for entry in report['remainders']:
+        lines.append(f"   ⚠️  Cảnh báo: HĐ {entry['invoice_id']} còn {entry['remaining']:,.0f}đ giảm giá chưa được áp dụng (do giới hạn 90% giá trị món)")
+    return lines
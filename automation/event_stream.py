@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+LUỒNG SỰ KIỆN SERVER-SENT EVENTS (WEB CONTROL PANEL)
+====================================================
+Thread đọc output của script upload / fetch, job xử lý và các API xóa file đẩy sự kiện
+vào EventBroker; /api/stream gửi chúng cho trình duyệt (EventSource) thay vì trình duyệt
+hỏi lại toàn bộ log mỗi giây.
+
+- Mỗi sự kiện có seq tăng dần (id của SSE) → mỗi dòng log chỉ gửi 1 lần
+- Giữ lại HISTORY_SIZE sự kiện gần nhất: EventSource tự kết nối lại với Last-Event-ID và
+  nhận tiếp phần còn thiếu; tụt quá xa thì nhận sự kiện 'reset' (tải lại trạng thái đầy đủ)
+- publish(..., apply=...) / snapshot(...) chạy cùng 1 lock: trạng thái đầy đủ gửi lúc kết
+  nối luôn khớp với seq (không mất / không lặp dòng log)
+"""
+
+import json
+import threading
+from collections import deque
+
+HISTORY_SIZE = 2000
+
+# Gửi comment giữ kết nối sau mỗi khoảng này khi không có sự kiện
+HEARTBEAT_SECONDS = 15
+
+def format_sse(seq, event, data):
+    payload = json.dumps(data, ensure_ascii=False)
+    return f"id: {seq}\nevent: {event}\ndata: {payload}\n\n"
+
+class EventBroker:
+    """Hàng sự kiện dùng chung cho mọi kết nối /api/stream"""
+
+    def __init__(self, history=HISTORY_SIZE):
+        self._events = deque(maxlen=history)
+        self._seq = 0
+        self._cond = threading.Condition()
+
+    @property
+    def last_seq(self):
+        return self._seq
+
+    def publish(self, event, data, apply=None):
+        """
+        Thêm sự kiện. apply: (tùy chọn) hàm cập nhật trạng thái chạy cùng lock với sự kiện,
+        vd. thêm dòng vào list log dùng cho API polling
+
+        Returns: seq của sự kiện
+        """
+        with self._cond:
+            if apply is not None:
+                apply()
+            self._seq += 1
+            self._events.append((self._seq, event, data))
+            self._cond.notify_all()
+            return self._seq
+
+    def snapshot(self, build):
+        """(seq hiện tại, build()) - build chạy trong lock nên không lẫn với publish"""
+        with self._cond:
+            return self._seq, build()
+
+    def events_since(self, seq, timeout=None):
+        """
+        Các sự kiện có seq lớn hơn seq (chờ tối đa timeout giây nếu chưa có).
+
+        Returns: (events, complete) - complete=False nếu sự kiện cũ đã bị bỏ khỏi history
+        """
+        with self._cond:
+            if self._seq <= seq:
+                self._cond.wait(timeout)
+            if not self._events or self._seq <= seq:
+                return [], True
+            complete = self._events[0][0] <= seq + 1
+            return [entry for entry in self._events if entry[0] > seq], complete
+
+    def stream(self, since, heartbeat=HEARTBEAT_SECONDS):
+        """Generator các chuỗi SSE từ sau seq since (dùng làm body response Flask)"""
+        seq = since
+        while True:
+            events, complete = self.events_since(seq, timeout=heartbeat)
+            if not events:
+                yield ": ping\n\n"
+                continue
+            if not complete:
+                yield format_sse(events[0][0] - 1, 'reset', {})
+            for seq, event, data in events:
+                yield format_sse(seq, event, data)
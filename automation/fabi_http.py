@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Fetch B07 exports over HTTP
+===========================
+
+Browser-free alternative to auto_fetch_fabi.py. Instead of opening Chrome,
+navigating to B07 and clicking through two modals, this helper:
+1. Logs in once (one POST), or takes over the cookies / token of a single
+   Selenium login (--browser-login)
+2. Requests the exports (TRANSFER and ATM by default) concurrently
+3. Saves each export in downloads/<date>/<METHOD>/ and, for a single date
+   range, copies them into data/ under the names process_invoices expects
+   (sale_by_payment_method.xls = TRANSFER, sale_by_payment_method (1).xls = ATM)
+
+Endpoints:
+    Menu/fetch-api.txt records the B07 table and the export modal (DOM only),
+    not the HTTP calls behind them, so the calls are configured in
+    Menu/fabi-endpoints.json. Copy Menu/fabi-endpoints.example.json and fill in
+    the login / export requests seen in DevTools -> Network when clicking
+    "Xuất hoá đơn". String values may use {username}, {password},
+    {payment_method}, {from_date} and {to_date}. The example points at
+    REPLACE-ME placeholders on purpose: a config that still contains one is
+    refused, so credentials are never sent to a guessed URL.
+
+Usage:
+    python3 automation/fabi_http.py --username <email> --password <password>
+    python3 automation/fabi_http.py --date 2025-12-05
+    python3 automation/fabi_http.py --date 2025-11-01 --to-date 2025-11-30 --per-day --workers 4 \
+        --methods TRANSFER ATM GRAB_ONLINE                 # backfill a month
+    python3 automation/fabi_http.py --browser-login       # Selenium login once, reuse its session
+    python3 automation/fabi_http.py --record recordings/  # save responses for fabi_stub_server.py
+    python3 automation/fabi_http.py --base-url http://127.0.0.1:8765   # against the stub server
+
+Environment variables (fallbacks):
+    FABI_USERNAME
+    FABI_PASSWORD
+
+Requires the `requests` package (pip install requests); the stub server and
+fetch_planner.py do not.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from datetime import date
+from pathlib import Path
+from urllib.parse import parse_qsl, urlsplit
+
+try:
+    import requests
+except ImportError:  # requests is optional - only needed to actually fetch
+    requests = None
+
+PACKAGE_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = PACKAGE_DIR.parent
+DOWNLOAD_DIR = PROJECT_ROOT / "data"
+ENDPOINTS_FILE = PROJECT_ROOT / "Menu" / "fabi-endpoints.json"
+EXAMPLE_ENDPOINTS_FILE = PROJECT_ROOT / "Menu" / "fabi-endpoints.example.json"
+
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+from automation.fetch_planner import (
+    DEFAULT_METHODS,
+    DEFAULT_WORKERS,
+    date_ranges,
+    job_dir,
+    job_label,
+    plan_jobs,
+    print_summary,
+    FETCH_DIR,
+    publish_reports,
+    report_filename,
+    run_plan,
+)
+
+REQUEST_TIMEOUT = 60
+
+# Index file of a recordings directory (shared with fabi_stub_server.py)
+RECORDINGS_INDEX = "index.json"
+
+# Marks the values of fabi-endpoints.example.json that still have to be filled in
+PLACEHOLDER_MARKER = "REPLACE-ME"
+
+
+class FabiHttpError(Exception):
+    """The Fabi API answered with something other than a login / report file"""
+
+
+def load_endpoints(path=ENDPOINTS_FILE) -> dict:
+    path = Path(path)
+    if not path.exists():
+        raise FabiHttpError(
+            f"{path} not found. Copy {EXAMPLE_ENDPOINTS_FILE.name} and fill in the "
+            "login / export requests from DevTools -> Network."
+        )
+    with open(path, encoding="utf-8") as f:
+        endpoints = json.load(f)
+    unfilled = sorted(_placeholder_keys(endpoints))
+    if unfilled:
+        raise FabiHttpError(
+            f"{path.name} still has {PLACEHOLDER_MARKER} placeholders ({', '.join(unfilled)}). "
+            "Fill in the real base URL and login / export requests from DevTools -> Network."
+        )
+    return endpoints
+
+
+def _placeholder_keys(value, prefix=""):
+    """Dotted keys of every string in value that still contains PLACEHOLDER_MARKER (comments skipped)."""
+    if isinstance(value, str):
+        return [prefix or "(value)"] if PLACEHOLDER_MARKER in value else []
+    if isinstance(value, dict):
+        items = ((f"{prefix}.{key}" if prefix else key, item) for key, item in value.items() if not key.startswith("_"))
+    elif isinstance(value, list):
+        items = ((f"{prefix}[{index}]", item) for index, item in enumerate(value))
+    else:
+        return []
+    return [found for key, item in items for found in _placeholder_keys(item, key)]
+
+
+def fill_template(value, values: dict):
+    """Replace {placeholders} in every string inside value (dicts / lists included)."""
+    if isinstance(value, str):
+        return value.format_map(values)
+    if isinstance(value, dict):
+        return {key: fill_template(item, values) for key, item in value.items()}
+    if isinstance(value, list):
+        return [fill_template(item, values) for item in value]
+    return value
+
+
+def _lookup(data, dotted: str):
+    """data['a']['b'] for 'a.b'."""
+    for key in dotted.split("."):
+        data = data[key]
+    return data
+
+
+# ============================================================================
+# RECORDINGS (replayed by fabi_stub_server.py)
+# ============================================================================
+
+_record_lock = threading.Lock()
+
+
+def record_response(record_dir, response: "requests.Response"):
+    """Append one response to record_dir/index.json (+ its body as a separate file)."""
+    record_dir = Path(record_dir)
+    record_dir.mkdir(parents=True, exist_ok=True)
+    index_path = record_dir / RECORDINGS_INDEX
+    request_url = urlsplit(response.request.url)
+
+    with _record_lock:
+        entries = json.loads(index_path.read_text(encoding="utf-8")) if index_path.exists() else []
+        body_file = f"{len(entries) + 1:03d}{Path(request_url.path).suffix or '.body'}"
+        (record_dir / body_file).write_bytes(response.content)
+        entries.append({
+            "method": response.request.method,
+            "path": request_url.path,
+            "query": dict(parse_qsl(request_url.query)),
+            "status": response.status_code,
+            "headers": {
+                key: value for key, value in response.headers.items()
+                if key.lower() in ("content-type", "content-disposition", "set-cookie")
+            },
+            "body_file": body_file,
+        })
+        index_path.write_text(json.dumps(entries, indent=2, ensure_ascii=False), encoding="utf-8")
+
+
+# ============================================================================
+# CLIENT
+# ============================================================================
+
+class FabiClient:
+    """Logged-in Fabi API session; export() is safe to call from several threads."""
+
+    def __init__(self, endpoints: dict, base_url=None, timeout=REQUEST_TIMEOUT, record_dir=None):
+        if requests is None:
+            raise FabiHttpError("fabi_http.py needs the requests package (pip install requests)")
+        self.endpoints = endpoints
+        self.base_url = (base_url or endpoints["base_url"]).rstrip("/")
+        self.timeout = timeout
+        self.record_dir = record_dir
+        self.headers = dict(endpoints.get("headers", {}))
+        self.cookies = requests.cookies.RequestsCookieJar()
+
+    def _session(self) -> "requests.Session":
+        # One Session per request/thread: requests.Session is not thread-safe
+        session = requests.Session()
+        session.headers.update(self.headers)
+        session.cookies.update(self.cookies)
+        return session
+
+    def _send(self, session, spec: dict, values: dict) -> "requests.Response":
+        kwargs = {key: fill_template(spec[key], values) for key in ("params", "json", "data", "headers") if key in spec}
+        url = fill_template(spec["path"], values)
+        if not url.startswith(("http://", "https://")):
+            url = self.base_url + url
+        response = session.request(spec.get("method", "GET"), url, timeout=self.timeout, **kwargs)
+        if self.record_dir:
+            record_response(self.record_dir, response)
+        if response.status_code >= 400:
+            raise FabiHttpError(f"{spec.get('method', 'GET')} {spec['path']}: HTTP {response.status_code}")
+        return response
+
+    def set_token(self, token: str):
+        login = self.endpoints.get("login", {})
+        header = login.get("token_header", "Authorization")
+        self.headers[header] = login.get("token_prefix", "Bearer ") + token
+
+    def login(self, username: str, password: str):
+        """Log in with one request; keeps the cookies and (if configured) the bearer token."""
+        spec = self.endpoints["login"]
+        with self._session() as session:
+            response = self._send(session, spec, {"username": username, "password": password})
+            self.cookies.update(session.cookies)
+
+        if spec.get("token_field"):
+            try:
+                token = _lookup(response.json(), spec["token_field"])
+            except (ValueError, KeyError, TypeError):
+                raise FabiHttpError("Login response has no token (wrong credentials?)")
+            self.set_token(token)
+
+    def use_browser_session(self, driver):
+        """Take over the cookies / stored token of a Selenium session that is already logged in."""
+        for cookie in driver.get_cookies():
+            self.cookies.set(cookie["name"], cookie["value"], domain=cookie.get("domain"), path=cookie.get("path", "/"))
+        self.headers["User-Agent"] = driver.execute_script("return navigator.userAgent;")
+
+        storage_key = self.endpoints.get("login", {}).get("token_storage_key")
+        if storage_key:
+            token = driver.execute_script("return window.localStorage.getItem(arguments[0]);", storage_key)
+            if token:
+                self.set_token(token)
+
+    def export(self, payment_method: str, from_date: str, to_date: str, dest: Path) -> Path:
+        """Download one payment-method export to dest (written as dest.part, then renamed)."""
+        values = {"payment_method": payment_method, "from_date": from_date, "to_date": to_date}
+        spec = self.endpoints["export"]
+
+        with self._session() as session:
+            response = self._send(session, spec, values)
+            # Some exports answer with a link to the generated file instead of the file itself
+            if spec.get("download_field"):
+                try:
+                    file_url = _lookup(response.json(), spec["download_field"])
+                except (ValueError, KeyError, TypeError):
+                    raise FabiHttpError(f"{payment_method}: export response has no {spec['download_field']}")
+                response = self._send(session, {"method": "GET", "path": file_url}, values)
+
+        content_type = response.headers.get("Content-Type", "")
+        if not response.content or "json" in content_type:
+            raise FabiHttpError(f"{payment_method}: expected a report file, got {content_type or 'an empty body'}")
+
+        dest = Path(dest)
+        partial = dest.with_name(dest.name + ".part")  # ignored by the data/ watcher until renamed
+        partial.write_bytes(response.content)
+        os.replace(partial, dest)
+        return dest
+
+
+def fetch_plan(client: FabiClient, jobs, workers=DEFAULT_WORKERS, root=FETCH_DIR) -> dict:
+    """
+    Run fetch-plan jobs concurrently; each export goes to its own <root>/<range>/<METHOD>/ folder
+    (root = downloads/).
+
+    Returns: {job: [Path]} ([] for a failed job - the error is printed)
+    """
+    date_format = client.endpoints.get("date_format", "%Y-%m-%d")
+
+    def run_job(_session, job):
+        dest = job_dir(job, root) / report_filename(job.method)
+        path = client.export(job.method, job.from_date.strftime(date_format), job.to_date.strftime(date_format), dest)
+        print(f"✅ {job_label(job)}: {path.name} ({path.stat().st_size:,} bytes)")
+        return [path]
+
+    return run_plan(jobs, run_job, workers=workers)
+
+
+def browser_login(client: FabiClient, username: str, password: str, headless: bool = False, wait_seconds: int = 40):
+    """Log in once with Selenium (same steps as auto_fetch_fabi.py) and hand the session to client."""
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    from automation.auto_fetch_fabi import configure_driver, log_in
+
+    driver = configure_driver(headless=headless)
+    try:
+        wait = WebDriverWait(driver, wait_seconds)
+        log_in(driver, wait, username, password)
+        wait.until(lambda d: "/login" not in d.current_url)
+        client.use_browser_session(driver)
+    finally:
+        driver.quit()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Download Fabi B07 exports over HTTP (no browser).")
+    parser.add_argument("--username", help="Fabi username (email). Defaults to $FABI_USERNAME.")
+    parser.add_argument("--password", help="Fabi password. Defaults to $FABI_PASSWORD.")
+    parser.add_argument("--date", type=date.fromisoformat, help="Report day (YYYY-MM-DD). Default: today.")
+    parser.add_argument("--to-date", type=date.fromisoformat, help="Last day of a date range (with --date).")
+    parser.add_argument(
+        "--per-day",
+        action="store_true",
+        help="Split --date..--to-date into one export per day (backfill) instead of one range.",
+    )
+    parser.add_argument(
+        "--methods",
+        nargs="+",
+        default=list(DEFAULT_METHODS),
+        help="Payment methods to export. Default: TRANSFER ATM.",
+    )
+    parser.add_argument("--endpoints", default=str(ENDPOINTS_FILE), help="Endpoint config (JSON).")
+    parser.add_argument("--base-url", help="Override base_url from the endpoint config (e.g. the stub server).")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f"Exports running at the same time. Default: {DEFAULT_WORKERS}.",
+    )
+    parser.add_argument("--out", default=str(DOWNLOAD_DIR), help="Where a single-range fetch is published. Default: data/.")
+    parser.add_argument(
+        "--browser-login",
+        action="store_true",
+        help="Log in once with Selenium and reuse its cookies instead of the login endpoint.",
+    )
+    parser.add_argument("--headless", action="store_true", help="Headless Chrome for --browser-login.")
+    parser.add_argument("--record", help="Save every response to this folder (for fabi_stub_server.py).")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    username = args.username or os.getenv("FABI_USERNAME")
+    password = args.password or os.getenv("FABI_PASSWORD")
+    if not username or not password:
+        print("❌ Missing credentials. Provide --username/--password or set FABI_USERNAME/FABI_PASSWORD.")
+        sys.exit(1)
+
+    try:
+        ranges = date_ranges(args.date or date.today(), args.to_date, per_day=args.per_day)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    jobs = plan_jobs([method.upper() for method in args.methods], ranges)
+
+    if requests is None:
+        print("❌ fabi_http.py needs the requests package: pip install requests")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    try:
+        client = FabiClient(load_endpoints(args.endpoints), base_url=args.base_url, record_dir=args.record)
+        if args.browser_login:
+            browser_login(client, username, password, headless=args.headless)
+            print("✅ Logged in with the browser, session handed over")
+        else:
+            client.login(username, password)
+            print("✅ Logged in")
+    except (FabiHttpError, requests.RequestException) as e:
+        print(f"❌ Login failed: {e}")
+        sys.exit(1)
+
+    results = fetch_plan(client, jobs, workers=args.workers)
+    print_summary(results)
+    publish_reports(results, Path(args.out))
+    print(f"⏱️  {len(jobs)} export(s) in {time.perf_counter() - start:.1f}s")
+    if not all(results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Local stub of the Fabi API
+==========================
+
+Replays recorded responses so fabi_http.py can be run without touching the
+real Fabi account (testing, debugging the endpoint config, timing).
+
+A recordings folder holds index.json plus one body file per response; the
+easiest way to create one is `fabi_http.py --record <folder>`. Format:
+
+    [
+      {"method": "POST", "path": "/api/login", "status": 200,
+       "headers": {"Content-Type": "application/json"}, "body_file": "001.body"},
+      {"method": "GET", "path": "/api/report/export", "query": {"payment_method": "ATM"},
+       "status": 200, "headers": {"Content-Type": "application/vnd.ms-excel"},
+       "body_file": "002.xls"}
+    ]
+
+A request matches the first entry with the same method and path whose "query"
+items are all present in the request (drop keys such as dates from "query" to
+replay a recording for any day). Unmatched requests get a JSON 404.
+
+Usage:
+    python3 automation/fabi_stub_server.py recordings/ --port 8765
+    python3 automation/fabi_http.py --base-url http://127.0.0.1:8765 --username x --password y
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qsl, urlsplit
+
+RECORDINGS_INDEX = "index.json"  # same as fabi_http.RECORDINGS_INDEX
+
+DEFAULT_PORT = 8765
+
+
+def load_recordings(directory) -> list:
+    directory = Path(directory)
+    with open(directory / RECORDINGS_INDEX, encoding="utf-8") as f:
+        entries = json.load(f)
+    for entry in entries:
+        entry["body"] = (directory / entry["body_file"]).read_bytes() if entry.get("body_file") else b""
+    return entries
+
+
+def match_recording(entries: list, method: str, path: str, query: dict):
+    for entry in entries:
+        if entry["method"] != method or entry["path"] != path:
+            continue
+        if all(query.get(key) == value for key, value in entry.get("query", {}).items()):
+            return entry
+    return None
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    server_version = "FabiStub/1.0"
+
+    def _replay(self):
+        url = urlsplit(self.path)
+        # Read the request body so keep-alive connections stay in sync
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+
+        entry = match_recording(self.server.recordings, self.command, url.path, dict(parse_qsl(url.query)))
+        if entry is None:
+            status, headers, body = 404, {"Content-Type": "application/json"}, b'{"error": "no recording"}'
+        else:
+            status, headers, body = entry["status"], entry.get("headers", {}), entry["body"]
+
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_PUT = _replay
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def start_server(directory, host="127.0.0.1", port=DEFAULT_PORT, delay=0.0, verbose=False) -> ThreadingHTTPServer:
+    """
+    Start the stub in a background thread (port=0 picks a free port).
+
+    Returns: the server - its URL is http://{host}:{server.server_port}; call shutdown() to stop.
+    """
+    server = ThreadingHTTPServer((host, port), ReplayHandler)
+    server.recordings = load_recordings(directory)
+    server.delay = delay
+    server.verbose = verbose
+    threading.Thread(target=server.serve_forever, name="fabi-stub", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded Fabi API responses locally.")
+    parser.add_argument("recordings", help="Folder with index.json + body files.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds to wait before each response.")
+    args = parser.parse_args()
+
+    server = start_server(args.recordings, args.host, args.port, args.delay, verbose=True)
+    print(f"🧪 Fabi stub serving {len(server.recordings)} recording(s) on http://{args.host}:{server.server_port}")
+    print("   Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print("\n⏹️  Stopped.")
+
+
+if __name__ == "__main__":
+    main()
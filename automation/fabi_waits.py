@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Readiness conditions for the Fabi report pages
+==============================================
+
+Small wait-condition helpers used by auto_fetch_fabi.py instead of fixed
+``time.sleep`` calls. Every condition is a callable ``condition(driver)``
+that returns a truthy value once the page is ready, so it plugs straight into
+``WebDriverWait(...).until(...)``:
+
+- ``modal_has_content``   an open modal whose .modal-body has real text
+- ``no_spinners``         no visible loading spinner / skeleton
+- ``element_ready``       a button is displayed and enabled
+- ``modal_closed``        no modal is visible anymore
+- ``report_table_ready``  the B07 table has rendered its rows
+- ``NetworkIdle``         no XHR/fetch in flight for a short quiet period,
+                          read from the Chrome DevTools Performance log
+                          (needs ``enable_performance_log`` on the options)
+- ``DownloadTracker``     the downloads started after it was created have
+                          finished, from the DevTools download events in the
+                          same log
+
+``get_log("performance")`` drains the log, so both log readers go through one
+``DevToolsLog`` per driver (``devtools_log(driver)``).
+
+``wait_for`` runs a condition with a short poll interval and, for soft waits,
+returns None instead of raising on timeout.
+"""
+
+import json
+import time
+
+from selenium.common.exceptions import StaleElementReferenceException, TimeoutException, WebDriverException
+from selenium.webdriver.support.ui import WebDriverWait
+
+# How often conditions are re-checked (WebDriverWait defaults to 0.5s)
+POLL_FREQUENCY = 0.1
+
+OPEN_MODAL_CSS = ".modal.show, .modal[style*='display: block']"
+MODAL_BODY_CSS = ".modal-body, .modal-content"
+SPINNER_CSS = ".spinner-border, .skeleton-loader, [role='status'].spinner-border"
+REPORT_TABLE_ROWS_CSS = ".report-table tbody tr, table.table tbody tr"
+
+# Modal text shorter than this is treated as blank (header only / still loading)
+MIN_MODAL_TEXT = 10
+
+# Network must be quiet this long (seconds) to count as idle
+NETWORK_QUIET_SECONDS = 0.5
+
+# Chrome reports downloads in the Browser domain (Browser.setDownloadBehavior with
+# eventsEnabled) and, for pages with the Page domain enabled, in the Page domain
+DOWNLOAD_BEGIN_EVENTS = ("Browser.downloadWillBegin", "Page.downloadWillBegin")
+DOWNLOAD_PROGRESS_EVENTS = ("Browser.downloadProgress", "Page.downloadProgress")
+DOWNLOAD_DONE_STATES = ("completed", "canceled")
+
+_VISIBLE_MODAL_TEXT_JS = """
+for (const modal of document.querySelectorAll(arguments[0])) {
+    const style = getComputedStyle(modal);
+    if (style.display === 'none' || style.visibility === 'hidden') continue;
+    const body = modal.querySelector(arguments[1]);
+    return [modal, body ? body.innerText.trim() : ''];
+}
+return null;
+"""
+
+_VISIBLE_SPINNERS_JS = """
+return Array.from(document.querySelectorAll(arguments[0]))
+    .some(el => el.offsetWidth > 0 || el.offsetHeight > 0 || el.getClientRects().length > 0);
+"""
+
+
+def enable_performance_log(options):
+    """Ask ChromeDriver to record DevTools network and page events (read through DevToolsLog)."""
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+
+
+def open_modal_text(driver):
+    """(modal element, body text) of the visible modal, or (None, '') if none is open."""
+    found = driver.execute_script(_VISIBLE_MODAL_TEXT_JS, OPEN_MODAL_CSS, MODAL_BODY_CSS)
+    if not found:
+        return None, ""
+    return found[0], found[1]
+
+
+def modal_has_content(min_chars=MIN_MODAL_TEXT):
+    """Visible modal whose body text is longer than min_chars -> returns the modal."""
+    def condition(driver):
+        modal, text = open_modal_text(driver)
+        if modal is not None and len(text) > min_chars:
+            return modal
+        return False
+    return condition
+
+
+def modal_closed(driver):
+    modal, _ = open_modal_text(driver)
+    return modal is None
+
+
+def no_spinners(driver):
+    return not driver.execute_script(_VISIBLE_SPINNERS_JS, SPINNER_CSS)
+
+
+def report_table_ready(driver):
+    """The B07 report table has at least one body row -> returns the first row."""
+    rows = driver.find_elements("css selector", REPORT_TABLE_ROWS_CSS)
+    return rows[0] if rows else False
+
+
+def element_ready(element):
+    """Displayed, enabled and not marked disabled by CSS class."""
+    def condition(driver):
+        try:
+            if not (element.is_displayed() and element.is_enabled()):
+                return False
+            classes = element.get_attribute("class") or ""
+        except StaleElementReferenceException:
+            return False
+        return element if "disabled" not in classes.split() else False
+    return condition
+
+
+class DevToolsLog:
+    """
+    The Chrome Performance log of one driver.
+
+    poll() drains the log and returns the new DevTools messages to the caller
+    (each a dict with "method" and a "params" dict; malformed entries are skipped);
+    download events are also folded into ``downloads`` (guid -> {"filename",
+    "state", "received", "total", "path"}) so they are not lost when another
+    reader (NetworkIdle) happens to drain them.
+    """
+
+    def __init__(self):
+        self.available = True
+        self.downloads = {}
+
+    def poll(self, driver) -> list:
+        if not self.available:
+            return []
+        try:
+            entries = driver.get_log("performance")
+        except (WebDriverException, ValueError):
+            self.available = False
+            return []
+        messages = []
+        for entry in entries:
+            # One unexpected entry must not fail the wait (and the export) around it
+            try:
+                message = json.loads(entry["message"])["message"]
+                params = message.setdefault("params", {})
+            except (ValueError, KeyError, TypeError, AttributeError):
+                continue
+            if not isinstance(params, dict):
+                continue
+            self._track_download(message.get("method"), params)
+            messages.append(message)
+        return messages
+
+    def _track_download(self, method, params):
+        guid = params.get("guid")
+        if guid is None:
+            return
+        if method in DOWNLOAD_BEGIN_EVENTS:
+            download = self._download(guid)
+            download["filename"] = params.get("suggestedFilename") or ""
+        elif method in DOWNLOAD_PROGRESS_EVENTS:
+            download = self._download(guid)
+            # Browser and Page events repeat each other: never move back from a final state
+            if download["state"] in DOWNLOAD_DONE_STATES:
+                return
+            download["state"] = params.get("state", download["state"])
+            download["received"] = params.get("receivedBytes", download["received"])
+            download["total"] = params.get("totalBytes", download["total"])
+            if params.get("filePath"):  # newer Chrome: where the finished file was saved
+                download["path"] = params["filePath"]
+
+    def _download(self, guid) -> dict:
+        return self.downloads.setdefault(
+            guid, {"filename": "", "state": "inProgress", "received": 0, "total": 0, "path": None}
+        )
+
+
+def devtools_log(driver) -> DevToolsLog:
+    """The DevToolsLog of this driver (created on first use)."""
+    log = getattr(driver, "_devtools_log", None)
+    if log is None:
+        log = DevToolsLog()
+        driver._devtools_log = log
+    return log
+
+
+class NetworkIdle:
+    """
+    Condition: no network request in flight for ``quiet`` seconds.
+
+    Reads Network.requestWillBeSent / loadingFinished / loadingFailed from the
+    Chrome Performance log; only XHR/fetch requests count (analytics beacons or
+    websockets would otherwise keep the page "busy" forever). When the log is
+    not available (capability not set, other browser) it falls back to the
+    number of finished resource entries staying the same for the quiet period.
+    """
+
+    _START = "Network.requestWillBeSent"
+    _END = ("Network.loadingFinished", "Network.loadingFailed")
+    _TRACKED_TYPES = ("XHR", "Fetch")
+
+    def __init__(self, quiet=NETWORK_QUIET_SECONDS):
+        self.quiet = quiet
+        self.in_flight = set()
+        self.last_activity = time.monotonic()
+        self._use_log = True
+        self._resource_count = None
+
+    def _drain_log(self, driver):
+        log = devtools_log(driver)
+        messages = log.poll(driver)
+        if not log.available:
+            self._use_log = False
+            return
+        for message in messages:
+            method = message.get("method")
+            request_id = message["params"].get("requestId")
+            if request_id is None:
+                continue
+            if method == self._START:
+                if message["params"].get("type") in self._TRACKED_TYPES:
+                    self.in_flight.add(request_id)
+                    self.last_activity = time.monotonic()
+            elif method in self._END and request_id in self.in_flight:
+                self.in_flight.discard(request_id)
+                self.last_activity = time.monotonic()
+
+    def _poll_resources(self, driver):
+        count = driver.execute_script("return performance.getEntriesByType('resource').length;")
+        if count != self._resource_count:
+            self._resource_count = count
+            self.last_activity = time.monotonic()
+
+    def __call__(self, driver):
+        if self._use_log:
+            self._drain_log(driver)
+        if not self._use_log:
+            self._poll_resources(driver)
+        return not self.in_flight and time.monotonic() - self.last_activity >= self.quiet
+
+
+class DownloadTracker:
+    """
+    Condition: every download that began after the tracker was created is done.
+
+    Create it right before the click that starts the download. Returns the
+    finished downloads (DevToolsLog.downloads entries, state "completed" or
+    "canceled"); ``started`` tells whether the browser has reported a download
+    at all - without download events (no Performance log, older Chrome) it
+    never does and the caller has to watch the folder instead.
+    """
+
+    def __init__(self, driver):
+        self.log = devtools_log(driver)
+        self.log.poll(driver)
+        self._known = set(self.log.downloads)
+
+    def new_downloads(self) -> list:
+        return [download for guid, download in self.log.downloads.items() if guid not in self._known]
+
+    @property
+    def started(self) -> bool:
+        return bool(self.new_downloads())
+
+    def __call__(self, driver):
+        self.log.poll(driver)
+        downloads = self.new_downloads()
+        if downloads and all(download["state"] in DOWNLOAD_DONE_STATES for download in downloads):
+            return downloads
+        return False
+
+
+def wait_for(driver, condition, timeout, message=None, soft=False):
+    """
+    Wait until condition(driver) is truthy, re-checking every POLL_FREQUENCY seconds.
+
+    soft=True: print ``message`` and return None on timeout instead of raising.
+    """
+    try:
+        return WebDriverWait(driver, timeout, poll_frequency=POLL_FREQUENCY).until(condition)
+    except TimeoutException:
+        if not soft:
+            raise
+        if message:
+            print(message)
+        return None
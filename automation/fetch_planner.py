@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Plan and run Fabi exports in parallel
+=====================================
+
+A fetch plan is the list of (payment method x date range) exports to make,
+e.g. TRANSFER + ATM + GRAB_ONLINE for every day of a month. run_plan() hands
+the jobs to a pool of workers; each worker opens its own session once (a
+logged-in Chrome for auto_fetch_fabi.py, nothing for the HTTP fetcher) and
+reuses it for every job it picks up.
+
+Every job downloads into its own folder, downloads/<range>/<METHOD>/, so
+files with the same name never collide (the TRANSFER and ATM exports are both
+called sale_by_payment_method.xls). publish_reports() then copies the files of
+a single-range plan into data/ under the names process_invoices expects.
+"""
+
+import os
+import queue
+import shutil
+import threading
+from collections import namedtuple
+from datetime import date, timedelta
+from pathlib import Path
+
+PACKAGE_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = PACKAGE_DIR.parent
+DATA_DIR = PROJECT_ROOT / "data"
+FETCH_DIR = PROJECT_ROOT / "downloads"
+
+DEFAULT_METHODS = ("TRANSFER", "ATM")
+DEFAULT_WORKERS = 2
+
+# Same names as process_invoices.DEFAULT_FILE1 / DEFAULT_FILE2
+REPORT_FILES = {
+    "TRANSFER": "sale_by_payment_method.xls",
+    "ATM": "sale_by_payment_method (1).xls",
+}
+
+FetchJob = namedtuple("FetchJob", ["method", "from_date", "to_date"])
+
+
+def report_filename(payment_method: str) -> str:
+    return REPORT_FILES.get(payment_method, f"sale_by_payment_method_{payment_method.lower()}.xls")
+
+
+def date_ranges(start: date, end: date = None, per_day: bool = True) -> list:
+    """[(from, to), ...] covering start..end: one range per day, or the whole span as one range."""
+    end = end or start
+    if end < start:
+        raise ValueError(f"End date {end} is before start date {start}")
+    if not per_day:
+        return [(start, end)]
+    return [(start + timedelta(days=offset),) * 2 for offset in range((end - start).days + 1)]
+
+
+def plan_jobs(methods, ranges) -> list:
+    """Every payment method for every date range (grouped by range, methods in the given order)."""
+    return [FetchJob(method, from_date, to_date) for from_date, to_date in ranges for method in methods]
+
+
+def range_label(job: FetchJob) -> str:
+    if job.from_date == job.to_date:
+        return job.from_date.isoformat()
+    return f"{job.from_date.isoformat()}_{job.to_date.isoformat()}"
+
+
+def job_label(job: FetchJob) -> str:
+    return f"{job.method} {range_label(job)}"
+
+
+def job_dir(job: FetchJob, root=FETCH_DIR) -> Path:
+    """Empty download folder of one job (leftovers of an earlier run are removed)."""
+    directory = Path(root) / range_label(job) / job.method
+    if directory.exists():
+        shutil.rmtree(directory)
+    directory.mkdir(parents=True)
+    return directory
+
+
+# ============================================================================
+# WORKER POOL
+# ============================================================================
+
+def run_plan(jobs, run_job, open_session=None, close_session=None, workers=DEFAULT_WORKERS) -> dict:
+    """
+    Run jobs on up to `workers` threads.
+
+    open_session(): called lazily once per worker (again after a job failed, since the
+    session may be broken); run_job(session, job) returns the downloaded paths;
+    close_session(session) is called when the worker runs out of jobs.
+
+    Returns: {job: [Path, ...]} for every job; a failed job maps to [] (the error is printed).
+    """
+    pending = queue.Queue()
+    for job in jobs:
+        pending.put(job)
+    results = {}
+    lock = threading.Lock()
+
+    def work():
+        session = None
+        try:
+            while True:
+                try:
+                    job = pending.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    if session is None and open_session is not None:
+                        session = open_session()
+                    paths = run_job(session, job) or []
+                except Exception as e:
+                    print(f"❌ {job_label(job)}: {e}")
+                    paths = []
+                    if session is not None and close_session is not None:
+                        close_session(session)
+                    session = None
+                with lock:
+                    results[job] = list(paths)
+        finally:
+            if session is not None and close_session is not None:
+                close_session(session)
+
+    threads = [
+        threading.Thread(target=work, name=f"fetch-worker-{index + 1}", daemon=True)
+        for index in range(max(1, min(workers, len(jobs))))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {job: results.get(job, []) for job in jobs}
+
+
+def print_summary(results: dict):
+    ok = [job for job, paths in results.items() if paths]
+    print(f"\n📊 {len(ok)}/{len(results)} export(s) downloaded")
+    for job, paths in results.items():
+        if paths:
+            names = ", ".join(path.name for path in paths)
+            print(f"   ✅ {job_label(job)}: {names}")
+        else:
+            print(f"   ❌ {job_label(job)}: no file")
+
+
+def publish_reports(results: dict, dest_dir=DATA_DIR) -> list:
+    """
+    Copy the exports of a single-range plan into dest_dir (TRANSFER → sale_by_payment_method.xls,
+    ATM → sale_by_payment_method (1).xls, ...). Multi-range plans stay in their job folders.
+
+    Returns: the published paths
+    """
+    ranges = {(job.from_date, job.to_date) for job in results}
+    if len(ranges) != 1:
+        print(f"ℹ️ {len(ranges)} date ranges fetched - files stay in {FETCH_DIR}/<range>/<METHOD>/")
+        return []
+
+    dest_dir = Path(dest_dir)
+    dest_dir.mkdir(exist_ok=True)
+    published = []
+    for job, paths in results.items():
+        if not paths:
+            print(f"⚠️ {job.method}: nothing downloaded - {dest_dir.name}/{report_filename(job.method)} (if any) is from an earlier fetch")
+            continue
+        if len(paths) > 1:
+            print(f"⚠️ {job_label(job)}: {len(paths)} files downloaded, publishing {paths[0].name}")
+        target = dest_dir / report_filename(job.method)
+        partial = target.with_name(target.name + ".part")  # ignored by the data/ watcher until renamed
+        shutil.copyfile(paths[0], partial)
+        os.replace(partial, target)
+        published.append(target)
+        print(f"📁 {job.method}: {paths[0].name} → {dest_dir.name}/{target.name}")
+    return published
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+THEO DÕI THƯ MỤC DATA/ (FILE EXPORT FABI MỚI)
+=============================================
+- DownloadWatcher: chờ thư mục thay đổi bằng inotify (Linux, qua ctypes - không cần cài
+  thêm gì); máy khác thì quét lại thư mục theo chu kỳ (polling)
+- File đang tải (.crdownload / .part / .tmp, hoặc còn file .crdownload đi kèm) bị bỏ qua
+- DataFolderDaemon: thread chạy nền, khi có file báo cáo mới tải xong và thư mục đã yên
+  (debounce) thì gọi hàm xử lý (parse → phân bổ giảm giá → ghi file). Trạng thái được
+  giữ trong dict status để web control panel đọc
+
+Chạy riêng (không cần web):
+    python3 automation/folder_watcher.py
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+PACKAGE_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = PACKAGE_DIR.parent
+DATA_DIR = PROJECT_ROOT / "data"
+
+# File tạm của trình duyệt khi đang tải
+PARTIAL_SUFFIXES = ('.crdownload', '.part', '.tmp')
+
+# Chỉ các file này mới kích hoạt xử lý (data/ còn có menu.json, ...)
+REPORT_SUFFIXES = ('.xls', '.xlsx', '.html', '.htm')
+
+# Chu kỳ quét lại thư mục khi không có inotify
+POLL_INTERVAL = 1.0
+
+# Thư mục phải yên bao lâu (giây) sau thay đổi cuối trước khi xử lý
+DEBOUNCE_SECONDS = 5.0
+
+# Khi không có việc: thức dậy sau mỗi khoảng này để kiểm tra lệnh dừng
+IDLE_WAIT = 5.0
+
+# ============================================================================
+# INOTIFY (LINUX)
+# ============================================================================
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+class _Inotify:
+    """1 watch inotify trên 1 thư mục; chỉ cần biết 'có thay đổi', không đọc chi tiết event"""
+
+    def __init__(self, directory):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1')
+        if libc.inotify_add_watch(fd, os.fsencode(str(directory)), WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(errno, 'inotify_add_watch', str(directory))
+        self.fd = fd
+
+    def wait(self, timeout):
+        """True nếu có event trong timeout giây (các event đang chờ được đọc bỏ hết)"""
+        ready, _, _ = select.select([self.fd], [], [], max(timeout, 0))
+        if not ready:
+            return False
+        try:
+            while os.read(self.fd, 64 * 1024):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+def _open_inotify(directory):
+    """inotify cho thư mục, None nếu hệ điều hành không hỗ trợ (macOS, Windows, ...)"""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        return _Inotify(directory)
+    except (OSError, AttributeError, TypeError):
+        return None
+
+# ============================================================================
+# FILE ĐÃ TẢI XONG
+# ============================================================================
+
+def is_partial_download(path):
+    return path.name.endswith(PARTIAL_SUFFIXES)
+
+def completed_downloads(paths):
+    """Các file đã tải xong (không phải file tạm, không còn file .crdownload đi kèm)"""
+    complete = []
+    for path in paths:
+        if is_partial_download(path):
+            continue
+        if path.with_name(path.name + '.crdownload').exists():
+            continue
+        if path.is_file():
+            complete.append(path)
+    return sorted(complete)
+
+def has_partial_downloads(directory):
+    return any(is_partial_download(path) for path in Path(directory).glob('*'))
+
+def report_files(directory):
+    """Các file báo cáo đã tải xong trong thư mục"""
+    candidates = [path for path in Path(directory).glob('*') if path.suffix.lower() in REPORT_SUFFIXES]
+    return completed_downloads(candidates)
+
+def _file_signature(paths):
+    signature = []
+    for path in paths:
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        signature.append((path.name, stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+# ============================================================================
+# WATCHER
+# ============================================================================
+
+class DownloadWatcher:
+    """Chờ thay đổi trong 1 thư mục: inotify nếu có, không thì quét lại mỗi poll_interval giây"""
+
+    def __init__(self, directory, poll_interval=POLL_INTERVAL):
+        self.directory = Path(directory)
+        self.poll_interval = poll_interval
+        self._inotify = _open_inotify(self.directory)
+        self._snapshot = None if self._inotify else self._scan()
+
+    @property
+    def mode(self):
+        return 'inotify' if self._inotify is not None else 'polling'
+
+    def _scan(self):
+        return _file_signature(sorted(self.directory.glob('*')))
+
+    def wait(self, timeout):
+        """Chờ tối đa timeout giây; True nếu thư mục có thay đổi"""
+        if self._inotify is not None:
+            return self._inotify.wait(timeout)
+        deadline = time.monotonic() + timeout
+        while True:
+            snapshot = self._scan()
+            if snapshot != self._snapshot:
+                self._snapshot = snapshot
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(self.poll_interval, remaining))
+
+    def wait_for_new_files(self, files_before, timeout):
+        """Chờ tới khi có file mới (so với files_before) tải xong; [] nếu hết timeout"""
+        deadline = time.monotonic() + timeout
+        previous = set(files_before)
+        while True:
+            complete = completed_downloads(set(self.directory.glob('*')) - previous)
+            if complete:
+                return complete
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return []
+            self.wait(remaining)
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+# ============================================================================
+# DAEMON XỬ LÝ FILE MỚI
+# ============================================================================
+
+class DataFolderDaemon(threading.Thread):
+    """
+    Thread nền: khi file báo cáo trong thư mục thay đổi và thư mục đã yên debounce giây
+    (không còn file đang tải, busy() = False) thì gọi process(files).
+
+    process(files) trả về dict kết quả (ví dụ {'created': ..., 'files': [...]}) - được lưu
+    vào status['last_result']. File có sẵn lúc khởi động không bị xử lý lại.
+    """
+
+    def __init__(self, directory, process, debounce=DEBOUNCE_SECONDS, busy=None, poll_interval=POLL_INTERVAL):
+        super().__init__(name='data-folder-watcher', daemon=True)
+        self.directory = Path(directory)
+        self.process = process
+        self.debounce = debounce
+        self.busy = busy
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+        self.status = {
+            'enabled': True,
+            'mode': None,
+            'state': 'starting',    # starting / idle / waiting / processing / stopped
+            'directory': str(self.directory),
+            'files': [],
+            'last_change': None,
+            'last_run': None,
+            'runs': 0,
+            'last_result': None,
+            'last_error': None,
+        }
+
+    def stop(self):
+        self._stop_event.set()
+
+    def snapshot_status(self):
+        return dict(self.status)
+
+    def _should_hold(self):
+        if has_partial_downloads(self.directory):
+            return True
+        return bool(self.busy and self.busy())
+
+    def _run_batch(self, files):
+        self.status.update(state='processing', files=[path.name for path in files], last_error=None)
+        try:
+            result = self.process(files)
+            self.status['last_result'] = result
+            if isinstance(result, dict) and result.get('error'):
+                self.status['last_error'] = result['error']
+        except Exception as e:
+            self.status['last_error'] = str(e)
+            print(f"❌ Lỗi khi xử lý file mới trong {self.directory.name}/: {e}")
+        self.status['runs'] += 1
+        self.status['last_run'] = datetime.now().isoformat(timespec='seconds')
+
+    def run(self):
+        self.directory.mkdir(exist_ok=True)
+        with DownloadWatcher(self.directory, self.poll_interval) as watcher:
+            self.status['mode'] = watcher.mode
+            processed = _file_signature(report_files(self.directory))
+            pending = False
+            self.status['state'] = 'idle'
+            while not self._stop_event.is_set():
+                if watcher.wait(self.debounce if pending else IDLE_WAIT):
+                    # Còn thay đổi → đợi thêm cho tới khi thư mục yên
+                    pending = True
+                    self.status.update(state='waiting', last_change=datetime.now().isoformat(timespec='seconds'))
+                    continue
+                if not pending or self._should_hold():
+                    continue
+                pending = False
+                files = report_files(self.directory)
+                signature = _file_signature(files)
+                if files and signature != processed:
+                    self._run_batch(files)
+                    processed = signature
+                self.status['state'] = 'idle'
+        self.status['state'] = 'stopped'
+
+def main():
+    """Theo dõi data/ và xử lý file mới ngay khi tải xong (Ctrl+C để dừng)"""
+    if str(PROJECT_ROOT) not in sys.path:
+        sys.path.insert(0, str(PROJECT_ROOT))
+    from automation.process_invoices import process_data_folder
+
+    daemon = DataFolderDaemon(DATA_DIR, lambda files: process_data_folder(DATA_DIR))
+    daemon.start()
+    print(f"👀 Đang theo dõi {DATA_DIR} (Ctrl+C để dừng)")
+    try:
+        while daemon.is_alive():
+            daemon.join(timeout=1)
+    except KeyboardInterrupt:
+        daemon.stop()
+        print("\n👋 Dừng theo dõi")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+SỔ GHI HÓA ĐƠN ĐÃ TẠO (invoice-ledger.sqlite3)
+==============================================
+Trong ngày báo cáo Fabi được export lại nhiều lần (file dài thêm dần). Mỗi hóa đơn đã
+ghi ra tax_files được lưu vào SQLite: fingerprint (hash các row nguồn + cấu hình ảnh
+hưởng tới file) và tên file đã tạo. Lần chạy sau:
+
+- Hóa đơn không đổi, file vẫn còn → giữ nguyên file, không ghi lại
+- Hóa đơn mới / đã đổi → ghi file (file cũ có tên khác của hóa đơn đó bị xóa)
+- Hóa đơn có trong sổ (cùng ngày) nhưng không còn trong báo cáo → báo lại để kiểm tra
+"""
+
+import hashlib
+import sqlite3
+import time
+from pathlib import Path
+
+LEDGER_FILE = 'invoice-ledger.sqlite3'
+
+# Tăng số này khi cách tạo file hóa đơn thay đổi để tất cả hóa đơn được ghi lại
+LEDGER_FORMAT_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS invoices (
+    output_dir TEXT NOT NULL,
+    invoice_id TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    date TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (output_dir, invoice_id)
+)
+"""
+
+def invoice_fingerprint(invoice, *context):
+    """Fingerprint của hóa đơn: hash row nguồn + context (cấu hình ảnh hưởng tới file)"""
+    source_hash = invoice.get('source_hash')
+    if not source_hash:
+        return None
+    digest = hashlib.sha256(source_hash.encode('utf-8'))
+    digest.update(repr((LEDGER_FORMAT_VERSION,) + context).encode('utf-8'))
+    return digest.hexdigest()
+
+class InvoiceLedger:
+    """Sổ hóa đơn của 1 thư mục output (đọc hết vào RAM khi mở, ghi lại khi commit)"""
+
+    def __init__(self, ledger_path, output_dir):
+        self.output_dir = Path(output_dir)
+        self._dir_key = str(self.output_dir.resolve())
+        self._conn = sqlite3.connect(str(ledger_path), timeout=30)
+        self._conn.execute(_SCHEMA)
+        rows = self._conn.execute(
+            'SELECT invoice_id, fingerprint, filename, date FROM invoices WHERE output_dir = ?',
+            (self._dir_key,),
+        )
+        self.entries = {invoice_id: (fingerprint, filename, date) for invoice_id, fingerprint, filename, date in rows}
+
+    def is_current(self, invoice_id, fingerprint, filename):
+        """Hóa đơn đã được ghi với đúng fingerprint + tên file này và file vẫn còn"""
+        if fingerprint is None:
+            return False
+        entry = self.entries.get(invoice_id)
+        if entry is None or entry[0] != fingerprint or entry[1] != filename:
+            return False
+        return (self.output_dir / filename).exists()
+
+    def previous_filename(self, invoice_id):
+        entry = self.entries.get(invoice_id)
+        return entry[1] if entry else None
+
+    def record(self, invoice_id, fingerprint, filename, date):
+        self._conn.execute(
+            'INSERT OR REPLACE INTO invoices (output_dir, invoice_id, fingerprint, filename, date, updated_at) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (self._dir_key, invoice_id, fingerprint, filename, date, time.time()),
+        )
+        self.entries[invoice_id] = (fingerprint, filename, date)
+
+    def missing_from(self, invoice_ids, dates):
+        """Các hóa đơn trong sổ (thuộc các ngày dates) nhưng không có trong invoice_ids: [(invoice_id, filename)]"""
+        return sorted(
+            (invoice_id, filename)
+            for invoice_id, (_, filename, date) in self.entries.items()
+            if date in dates and invoice_id not in invoice_ids
+        )
+
+    def forget(self, invoice_ids):
+        self._conn.executemany(
+            'DELETE FROM invoices WHERE output_dir = ? AND invoice_id = ?',
+            [(self._dir_key, invoice_id) for invoice_id in invoice_ids],
+        )
+        for invoice_id in invoice_ids:
+            self.entries.pop(invoice_id, None)
+
+    def close(self):
+        self._conn.commit()
+        self._conn.close()
+
+def open_ledger(ledger_path, output_dir):
+    """Mở sổ hóa đơn, None nếu không mở được (khi đó mọi hóa đơn đều được ghi lại như cũ)"""
+    try:
+        return InvoiceLedger(ledger_path, output_dir)
+    except sqlite3.Error as e:
+        print(f"⚠️  Không mở được sổ hóa đơn ({Path(ledger_path).name}): {e} - ghi lại tất cả hóa đơn")
+        return None
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+MANIFEST CỦA THƯ MỤC HÓA ĐƠN (tax_files/manifest.jsonl)
+=======================================================
+Khi tạo file hóa đơn, mỗi file .xlsx được ghi thêm 1 dòng JSON vào manifest:
+các món (đúng giá trị đã ghi vào Excel), tổng tiền, tên file, size + mtime của file.
+
+Các script kiểm tra và web đọc manifest thay vì mở lại hàng trăm file bằng openpyxl.
+File .xlsx nào không có trong manifest, hoặc đã bị sửa sau khi ghi (size/mtime khác),
+thì vẫn được đọc bằng openpyxl như trước - kết quả luôn khớp với file thật.
+
+Các file .xlsx vẫn được tạo như cũ để upload.
+"""
+
+import json
+import os
+from pathlib import Path
+
+MANIFEST_FILE = 'manifest.jsonl'
+
+HEADER_NAMES = ('ten_san_pham', 'tên sản phẩm', 'ten san pham')
+
+# Cache tóm tắt manifest cho web: (path, mtime_ns, size) -> summary
+_summary_cache = {}
+
+# ============================================================================
+# GHI MANIFEST
+# ============================================================================
+
+def _file_stamp(path):
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+def _as_read_back(value):
+    """Số như khi đọc lại từ file Excel (ghi với 16 chữ số, openpyxl trả int nếu không có phần thập phân)"""
+    if not isinstance(value, float):
+        return value
+    text = f"{value:.16G}"
+    if '.' in text or 'E' in text:
+        return float(text)
+    return int(text)
+
+def build_record(output_file, invoice, lines, total, total_with_vat, payment_method):
+    """Record manifest cho 1 file hóa đơn vừa ghi xong"""
+    size, mtime_ns = _file_stamp(output_file)
+    return {
+        'file': Path(output_file).name,
+        'invoice_id': invoice.get('invoice_id', ''),
+        'date': invoice.get('date', ''),
+        'payment_method': payment_method,
+        'items_count': len(lines),
+        'total': total,
+        'total_with_vat': total_with_vat,
+        'final_total': invoice.get('final_total', 0),
+        'lines': [[_as_read_back(value) for value in line] for line in lines],
+        'size': size,
+        'mtime_ns': mtime_ns,
+    }
+
+def _read_records(manifest_path):
+    """Đọc manifest: file -> record (dòng sau ghi đè dòng trước)"""
+    records = {}
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(record, dict) and record.get('file'):
+                    records[record['file']] = record
+    except OSError:
+        pass
+    return records
+
+def write_manifest(tax_dir, new_records):
+    """
+    Gộp các record mới vào manifest và bỏ record của file không còn tồn tại.
+    Ghi ra file tạm rồi rename để không ai đọc phải manifest ghi dở.
+    """
+    tax_dir = Path(tax_dir)
+    manifest_path = tax_dir / MANIFEST_FILE
+    existing = set(os.listdir(tax_dir))
+
+    records = _read_records(manifest_path)
+    for record in new_records:
+        records[record['file']] = record
+
+    tmp_path = manifest_path.with_name(manifest_path.name + '.tmp')
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for name in sorted(records):
+                if name in existing:
+                    f.write(json.dumps(records[name], ensure_ascii=False) + '\n')
+        tmp_path.replace(manifest_path)
+    except OSError as e:
+        print(f"⚠️  Không ghi được manifest ({manifest_path.name}): {e}")
+
+def remove_manifest(tax_dir):
+    try:
+        (Path(tax_dir) / MANIFEST_FILE).unlink()
+    except FileNotFoundError:
+        pass
+
+# ============================================================================
+# ĐỌC HÓA ĐƠN (MANIFEST, HOẶC OPENPYXL NẾU CẦN)
+# ============================================================================
+
+def read_invoice_lines_from_excel(excel_file):
+    """(tên món, đơn vị, số lượng, đơn giá) của các dòng sau header - giá trị thô openpyxl đọc được"""
+    import openpyxl
+
+    wb = openpyxl.load_workbook(excel_file, read_only=True)
+    try:
+        ws = wb.active
+        lines = []
+        for row in ws.iter_rows(min_row=2, min_col=3, max_col=6, values_only=True):
+            row = tuple(row) + (None,) * (4 - len(row))
+            lines.append(list(row[:4]))
+        return lines
+    finally:
+        wb.close()
+
+def invoice_id_from_filename(filename):
+    stem = Path(filename).stem
+    return stem.split(' - ')[0] if ' - ' in stem else stem
+
+def load_invoice_records(tax_dir):
+    """
+    Trả về record của tất cả file .xlsx trong tax_dir (sắp xếp theo tên file):
+        {'file', 'invoice_id', 'lines', 'from_manifest', ...}
+    Đọc lỗi → record có key 'error' và lines rỗng.
+    """
+    tax_dir = Path(tax_dir)
+    if not tax_dir.exists():
+        return []
+
+    manifest = _read_records(tax_dir / MANIFEST_FILE)
+    records = []
+    for entry in sorted(os.scandir(tax_dir), key=lambda e: e.name):
+        if entry.name.startswith('.') or not entry.name.endswith('.xlsx') or not entry.is_file():
+            continue
+        st = entry.stat()
+        record = manifest.get(entry.name)
+        if record and record.get('size') == st.st_size and record.get('mtime_ns') == st.st_mtime_ns:
+            record = dict(record, from_manifest=True)
+        else:
+            record = {'file': entry.name, 'invoice_id': invoice_id_from_filename(entry.name), 'from_manifest': False}
+            try:
+                record['lines'] = read_invoice_lines_from_excel(entry.path)
+            except Exception as e:
+                record['lines'] = []
+                record['error'] = str(e)
+        records.append(record)
+    return records
+
+def iter_item_lines(record):
+    """Các dòng món của record (bỏ dòng trống tên và dòng header lặp lại)"""
+    for name, unit, quantity, price in record.get('lines', []):
+        if not name:
+            continue
+        if str(name).strip().lower() in HEADER_NAMES:
+            continue
+        yield name, unit, quantity, price
+
+def manifest_summary(tax_dir):
+    """Tóm tắt manifest cho trang web (chỉ đọc lại khi manifest thay đổi)"""
+    manifest_path = Path(tax_dir) / MANIFEST_FILE
+    try:
+        st = manifest_path.stat()
+    except OSError:
+        return None
+    key = (str(manifest_path), st.st_mtime_ns, st.st_size)
+    cached = _summary_cache.get(key)
+    if cached is None:
+        records = _read_records(manifest_path).values()
+        cached = {
+            'invoices': len(records),
+            'items': sum(r.get('items_count', 0) for r in records),
+            'total_with_vat': round(sum(r.get('total_with_vat', 0) for r in records)),
+            'updated': int(st.st_mtime),
+        }
+        _summary_cache.clear()
+        _summary_cache[key] = cached
+    return cached
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+HÓA ĐƠN / MÓN DẠNG GỌN (__slots__)
+=================================
+Parser tạo Invoice và LineItem thay cho dict: mỗi object chỉ giữ đúng các field,
+không có dict riêng cho từng món (ngày lễ có hàng chục nghìn dòng món).
+
+Cả hai vẫn đọc/ghi được như dict (invoice['items'], item['price'], .get(), .keys())
+nên các hàm cũ (add_service_fee_to_invoice, create_invoice_file, manifest, ...) và
+hóa đơn Grab vẫn dùng dict thường đều chạy như trước. to_dict() trả về dict thật
+khi cần JSON.
+"""
+
+import sys
+
+class _Record:
+    """Truy cập field như dict: record['field'], record.get('field'), dict(record)"""
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.__slots__
+
+    def get(self, key, default=None):
+        if key not in self.__slots__:
+            return default
+        return getattr(self, key)
+
+    def keys(self):
+        return self.__slots__
+
+    # Không có items(): Invoice có field 'items'. dict(record) dùng keys() + __getitem__
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.__slots__}
+
+    def __eq__(self, other):
+        if isinstance(other, (_Record, dict)):
+            return self.to_dict() == dict(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        fields = ', '.join(f'{key}={getattr(self, key)!r}' for key in self.__slots__)
+        return f'{type(self).__name__}({fields})'
+
+class LineItem(_Record):
+    """1 dòng món: tên (đã intern), số lượng, đơn vị, đơn giá"""
+
+    __slots__ = ('name', 'quantity', 'unit', 'price')
+
+    def __init__(self, name, quantity, unit, price):
+        self.name = sys.intern(name)
+        self.quantity = quantity
+        self.unit = sys.intern(unit) if unit else unit
+        self.price = price
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['name'], data['quantity'], data['unit'], data['price'])
+
+class Invoice(_Record):
+    """1 hóa đơn từ báo cáo Fabi (source_hash: hash các row nguồn, dùng cho sổ hóa đơn)"""
+
+    __slots__ = ('number', 'invoice_id', 'date', 'items', 'discount',
+                 'payment_discount', 'final_total', 'payment_method', 'source_hash')
+
+    def __init__(self, number, invoice_id, date, items=None, discount=0,
+                 payment_discount=0, final_total=0, payment_method=None, source_hash=None):
+        self.number = number
+        self.invoice_id = invoice_id
+        self.date = date
+        self.items = items if items is not None else []
+        self.discount = discount
+        self.payment_discount = payment_discount
+        self.final_total = final_total
+        self.payment_method = payment_method
+        self.source_hash = source_hash
+
+    def to_dict(self):
+        data = super().to_dict()
+        data['items'] = [item.to_dict() if isinstance(item, _Record) else dict(item) for item in self.items]
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        items = [LineItem.from_dict(item) for item in data.get('items', [])]
+        return cls(data.get('number'), data.get('invoice_id', ''), data.get('date', ''), items,
+                   data.get('discount', 0), data.get('payment_discount', 0),
+                   data.get('final_total', 0), data.get('payment_method'), data.get('source_hash'))
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+GHI FILE HÓA ĐƠN SONG SONG
+==========================
+Ghi nhiều file .xlsx cùng lúc trên N process (bước nén zip của xlsxwriter chỉ chạy
+trên 1 core, ngày lễ có hàng trăm file).
+
+- Tên file do bên gọi tính sẵn → kết quả giống hệt khi ghi tuần tự
+- Lỗi của từng file được gom lại, không làm dừng cả batch
+- Batch nhỏ (hoặc không tạo được process pool) → ghi tuần tự ngay trong process
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Dưới ngưỡng này ghi tuần tự (chi phí khởi động worker lớn hơn lợi ích)
+MIN_PARALLEL_FILES = 16
+MAX_WORKERS = 8
+
+def default_worker_count():
+    return max(1, min(MAX_WORKERS, (os.cpu_count() or 1) - 1))
+
+def _write_one(write_func, invoice, output_file):
+    """Chạy trong worker: trả về None nếu thành công, ngược lại chuỗi lỗi"""
+    try:
+        write_func(invoice, output_file)
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    return None
+
+def _write_sequential(write_func, jobs, progress=None):
+    errors = []
+    for done, (invoice, output_file) in enumerate(jobs, 1):
+        error = _write_one(write_func, invoice, output_file)
+        if error:
+            errors.append({'invoice_id': invoice.get('invoice_id'), 'file': str(output_file), 'error': error})
+        if progress:
+            progress(done, len(jobs))
+    return errors
+
+def write_invoice_files(jobs, write_func, workers=None, progress=None):
+    """
+    Ghi các file hóa đơn.
+
+    jobs: list (invoice, output_file) - output_file đã có tên cuối cùng
+    write_func: hàm ghi 1 file, dạng write_func(invoice, output_file) (phải ở cấp module)
+    progress: (tùy chọn) progress(số file đã xong, tổng số file) sau mỗi file
+
+    Returns: list lỗi [{'invoice_id', 'file', 'error'}] (rỗng nếu tất cả thành công)
+    """
+    # Trùng tên file: giữ job cuối (giống ghi tuần tự) - tránh 2 worker ghi đè cùng 1 file
+    last_by_file = {}
+    for invoice, output_file in jobs:
+        last_by_file[str(output_file)] = invoice
+    jobs = [(invoice, output_file) for output_file, invoice in last_by_file.items()]
+    if workers is None:
+        workers = default_worker_count()
+    workers = min(workers, len(jobs))
+
+    if workers <= 1 or len(jobs) < MIN_PARALLEL_FILES:
+        return _write_sequential(write_func, jobs, progress)
+
+    # spawn: an toàn khi được gọi từ thread của web server
+    try:
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    except (OSError, NotImplementedError, ValueError) as e:
+        print(f"⚠️  Không tạo được process pool ({e}) - ghi tuần tự")
+        return _write_sequential(write_func, jobs, progress)
+
+    errors = []
+    with executor:
+        futures = [
+            (invoice, output_file, executor.submit(_write_one, write_func, invoice, output_file))
+            for invoice, output_file in jobs
+        ]
+        for done, (invoice, output_file, future) in enumerate(futures, 1):
+            try:
+                error = future.result()
+            except Exception as e:
+                # Worker chết / không pickle được dữ liệu
+                error = f"{type(e).__name__}: {e}"
+            if error:
+                errors.append({'invoice_id': invoice.get('invoice_id'), 'file': output_file, 'error': error})
+            if progress:
+                progress(done, len(futures))
+    return errors
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+GHI FILE HÓA ĐƠN XLSX TỪ TEMPLATE
+=================================
+Mọi file hóa đơn có cùng layout 6 cột (Tinh_chat, Ma_so, Ten_san_pham, Don_vi_tinh,
+So_luong, Don_gia), cùng độ rộng cột và cùng format. Thay vì dựng lại Workbook của
+xlsxwriter cho từng file:
+
+1. Dựng 1 file mẫu bằng chính hàm ghi xlsxwriter (1 món giả) - mỗi process 1 lần
+2. Giữ nguyên các phần tĩnh của file zip ĐÃ NÉN SẴN (styles, workbook, theme,
+   content types, ...) cùng header zip của chúng
+3. Mỗi hóa đơn chỉ render sheet1.xml + sharedStrings.xml (+ thời gian trong core.xml)
+   rồi ghép lại thành file zip
+
+Kết quả giống từng byte với file xlsxwriter ghi ra (trừ thời gian tạo file).
+Template tự kiểm tra khi dựng: render lại món giả phải ra đúng file mẫu, nếu không
+(ví dụ xlsxwriter đổi version) thì tắt đường nhanh và dùng xlsxwriter như cũ.
+"""
+
+import io
+import math
+import os
+import re
+import shutil
+import struct
+import tempfile
+import zipfile
+import zlib
+from datetime import datetime, timezone
+
+SHEET_PART = 'xl/worksheets/sheet1.xml'
+SST_PART = 'xl/sharedStrings.xml'
+CORE_PART = 'docProps/core.xml'
+
+# Món giả dùng để dựng file mẫu (không trùng với header)
+TEMPLATE_ITEM = {'name': '_template_name_', 'unit': '_template_unit_', 'quantity': 1, 'price': 1}
+
+XLS_STRMAX = 32767
+
+_CONTROL_ESCAPE_RE = re.compile('(_x[0-9a-fA-F]{4}_)')
+_CONTROL_CHARS_RE = re.compile(r'([\x00-\x08\x0b-\x1f])')
+_URL_RE = re.compile(r'(ftp|http)s?://|mailto:|(in|ex)ternal:|file://')
+_CORE_TIME_RE = re.compile(rb'(<dcterms:(?:created|modified) xsi:type="dcterms:W3CDTF">)[^<]*(<)')
+
+# Vị trí CRC/size trong local header và central directory của zip
+_LOCAL_CRC_AT = 14
+_CENTRAL_CRC_AT = 16
+_CENTRAL_OFFSET_AT = 42
+
+# Template của process hiện tại: chưa dựng = False, dựng lỗi/không dùng được = None
+_template = False
+
+class TemplateMismatch(Exception):
+    """File mẫu không có cấu trúc như mong đợi"""
+
+# ============================================================================
+# CHUỖI / SỐ (GIỐNG CÁCH XLSXWRITER GHI)
+# ============================================================================
+
+def _is_plain_string(value):
+    """Chuỗi mà xlsxwriter.write() ghi thành shared string bình thường"""
+    if not isinstance(value, str) or len(value) > XLS_STRMAX:
+        return False
+    if value.startswith('=') or (value.startswith('{=') and value.endswith('}')):
+        return False  # công thức
+    if ':' in value and _URL_RE.match(value):
+        return False  # hyperlink
+    if value.startswith('<r>') and value.endswith('</r>'):
+        return False  # rich string
+    return True
+
+def _si_element(string):
+    string = _CONTROL_ESCAPE_RE.sub(r'_x005F\1', string)
+    string = _CONTROL_CHARS_RE.sub(lambda m: f"_x{ord(m.group(1)):04X}_", string)
+    attr = ' xml:space="preserve"' if (string[:1].isspace() or string[-1:].isspace()) else ''
+    string = string.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    return f"<si><t{attr}>{string}</t></si>"
+
+def _number(value):
+    return f"{value:.16G}"
+
+# ============================================================================
+# TEMPLATE
+# ============================================================================
+
+class InvoiceXlsxTemplate:
+    """Các phần tĩnh của file hóa đơn (đã nén) + khung XML của sheet và shared strings"""
+
+    def __init__(self, data):
+        self._read_zip(data)
+        self._read_sheet(self._payload(SHEET_PART))
+        self._read_shared_strings(self._payload(SST_PART))
+        self._core_xml = self._payload(CORE_PART)
+
+    def _payload(self, name):
+        for entry in self._entries:
+            if entry['name'] == name:
+                return entry['payload']
+        raise TemplateMismatch(f"thiếu {name}")
+
+    def _read_zip(self, data):
+        self._entries = []
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            infos = zf.infolist()
+            payloads = {info.filename: zf.read(info) for info in infos}
+
+        # Central directory: ngay sau phần dữ liệu, kết thúc bằng end record 22 byte (không comment)
+        end_record = data[-22:]
+        if end_record[:4] != b'PK\x05\x06':
+            raise TemplateMismatch("zip có comment / zip64")
+        cd_size, cd_offset = struct.unpack('<LL', end_record[12:20])
+        pos = cd_offset
+        for info in infos:
+            name_len, extra_len, comment_len = struct.unpack('<HHH', data[pos + 28:pos + 34])
+            central = data[pos:pos + 46 + name_len + extra_len + comment_len]
+            pos += len(central)
+
+            start = info.header_offset
+            local_name_len, local_extra_len = struct.unpack('<HH', data[start + 26:start + 30])
+            local_len = 30 + local_name_len + local_extra_len
+            if info.flag_bits & 0x08:
+                raise TemplateMismatch("zip có data descriptor")
+            self._entries.append({
+                'name': info.filename,
+                'local_header': data[start:start + local_len],
+                'compressed': data[start + local_len:start + local_len + info.compress_size],
+                'central': central,
+                'payload': payloads[info.filename],
+                'compress_type': info.compress_type,
+            })
+        self._end_record = end_record
+
+    def _read_sheet(self, xml):
+        xml = xml.decode('utf-8')
+        dimension = '<dimension ref="A1:F2"/>'
+        row2 = xml.find('<row r="2"')
+        if dimension not in xml or row2 == -1 or '</sheetData>' not in xml:
+            raise TemplateMismatch("sheet1.xml khác dạng mong đợi")
+
+        before_dimension, after_dimension = xml.split(dimension, 1)
+        self._sheet_head = before_dimension + '<dimension ref="A1:F'
+        self._sheet_body = '"/>' + after_dimension[:after_dimension.index('<row r="2"')]
+        self._sheet_tail = xml[xml.index('</sheetData>'):]
+
+        styles = dict(re.findall(r'<c r="([A-F])2" s="(\d+)"', xml))
+        if set(styles) != set('ABCDEF') or len({styles['A'], styles['B'], styles['C'], styles['D']}) != 1 \
+                or styles['E'] != styles['F']:
+            raise TemplateMismatch("format các cột khác dạng mong đợi")
+        self._cell_style = styles['A']
+        self._number_style = styles['E']
+
+    def _read_shared_strings(self, xml):
+        xml = xml.decode('utf-8')
+        first = xml.find('<si>')
+        if first == -1:
+            raise TemplateMismatch("sharedStrings.xml không có chuỗi")
+        head = xml[:first]
+        items = re.findall(r'<si>.*?</si>', xml[first:])
+        if len(items) != 8 or not re.search(r'count="\d+" uniqueCount="\d+"', head):
+            raise TemplateMismatch("sharedStrings.xml khác dạng mong đợi")
+        self._sst_head = head
+        self._sst_tail = '</sst>'
+        # Header của bảng (6 chuỗi đầu) - bỏ 2 chuỗi của món giả
+        self._header_strings = [_unescape_si(item) for item in items[:6]]
+        self._header_si = items[:6]
+
+    # ------------------------------------------------------------------------
+    # RENDER
+    # ------------------------------------------------------------------------
+
+    def render(self, rows, created=None):
+        """
+        rows: list (tên món, đơn vị, số lượng, đơn giá) - giống các giá trị create_invoice_file ghi
+        Returns: bytes của file .xlsx, hoặc None nếu có giá trị cần xlsxwriter xử lý riêng
+        """
+        if not rows:
+            return None  # xlsxwriter bỏ các format không dùng khỏi styles.xml → khác file mẫu
+        strings = {s: i for i, s in enumerate(self._header_strings)}
+        si_parts = list(self._header_si)
+        string_count = len(self._header_strings)
+        cell_style = self._cell_style
+        number_style = self._number_style
+
+        row_parts = []
+        for r, (name, unit, quantity, price) in enumerate(rows, 2):
+            cells = [f'<row r="{r}" spans="1:6"><c r="A{r}" s="{cell_style}"><v>1</v></c><c r="B{r}" s="{cell_style}"/>']
+            for col, value in (('C', name), ('D', unit)):
+                if value == '':
+                    cells.append(f'<c r="{col}{r}" s="{cell_style}"/>')
+                    continue
+                if not _is_plain_string(value):
+                    return None
+                index = strings.get(value)
+                if index is None:
+                    index = strings[value] = len(strings)
+                    si_parts.append(_si_element(value))
+                string_count += 1
+                cells.append(f'<c r="{col}{r}" s="{cell_style}" t="s"><v>{index}</v></c>')
+            for col, value in (('E', quantity), ('F', price)):
+                if not math.isfinite(value):
+                    return None
+                cells.append(f'<c r="{col}{r}" s="{number_style}"><v>{_number(value)}</v></c>')
+            cells.append('</row>')
+            row_parts.append(''.join(cells))
+
+        last_row = len(rows) + 1
+        sheet = ''.join((self._sheet_head, str(last_row), self._sheet_body, ''.join(row_parts), self._sheet_tail))
+        sst_head = re.sub(r'count="\d+" uniqueCount="\d+"',
+                          f'count="{string_count}" uniqueCount="{len(strings)}"', self._sst_head, count=1)
+        sst = ''.join((sst_head, ''.join(si_parts), self._sst_tail))
+
+        if created is None:
+            created = datetime.now(timezone.utc)
+        stamp = created.strftime('%Y-%m-%dT%H:%M:%SZ').encode('ascii')
+        core = _CORE_TIME_RE.sub(lambda m: m.group(1) + stamp + m.group(2), self._core_xml)
+
+        return self._build_zip({
+            SHEET_PART: sheet.encode('utf-8'),
+            SST_PART: sst.encode('utf-8'),
+            CORE_PART: core,
+        })
+
+    def _build_zip(self, dynamic):
+        out = []
+        centrals = []
+        offset = 0
+        for entry in self._entries:
+            local_header = entry['local_header']
+            compressed = entry['compressed']
+            central = entry['central']
+            payload = dynamic.get(entry['name'])
+            if payload is not None:
+                if entry['compress_type'] == zipfile.ZIP_DEFLATED:
+                    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+                    compressed = compressor.compress(payload) + compressor.flush()
+                else:
+                    compressed = payload
+                sizes = struct.pack('<LLL', zlib.crc32(payload), len(compressed), len(payload))
+                local_header = local_header[:_LOCAL_CRC_AT] + sizes + local_header[_LOCAL_CRC_AT + 12:]
+                central = central[:_CENTRAL_CRC_AT] + sizes + central[_CENTRAL_CRC_AT + 12:]
+            central = central[:_CENTRAL_OFFSET_AT] + struct.pack('<L', offset) + central[_CENTRAL_OFFSET_AT + 4:]
+            out.append(local_header)
+            out.append(compressed)
+            centrals.append(central)
+            offset += len(local_header) + len(compressed)
+
+        central_dir = b''.join(centrals)
+        end_record = self._end_record[:12] + struct.pack('<LL', len(central_dir), offset) + self._end_record[20:]
+        out.append(central_dir)
+        out.append(end_record)
+        return b''.join(out)
+
+    def write(self, rows, output_file):
+        """Ghi file; trả về False nếu phải dùng xlsxwriter cho hóa đơn này"""
+        data = self.render(rows)
+        if data is None:
+            return False
+        with open(output_file, 'wb') as f:
+            f.write(data)
+        return True
+
+def _unescape_si(si):
+    text = re.sub(r'^<si><t[^>]*>|</t></si>$', '', si)
+    return text.replace('&lt;', '<').replace('&gt;', '>').replace('&amp;', '&')
+
+# ============================================================================
+# API
+# ============================================================================
+
+def build_template(write_func, item_rows_func):
+    """
+    Dựng template từ hàm ghi xlsxwriter.
+
+    write_func(invoice, output_file): hàm ghi chuẩn (create_invoice_file)
+    item_rows_func(invoice): các giá trị (tên, đơn vị, số lượng, đơn giá) mà write_func ghi
+    """
+    tmp_dir = tempfile.mkdtemp(prefix='invoice-template-')
+    try:
+        sample_path = os.path.join(tmp_dir, 'template.xlsx')
+        sample_invoice = {'items': [dict(TEMPLATE_ITEM)]}
+        write_func(sample_invoice, sample_path)
+        with open(sample_path, 'rb') as f:
+            data = f.read()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    template = InvoiceXlsxTemplate(data)
+
+    # Tự kiểm tra: render lại món giả (cùng thời gian tạo) phải ra đúng file mẫu
+    created = re.search(rb'<dcterms:created xsi:type="dcterms:W3CDTF">([^<]*)<', template._core_xml)
+    created = datetime.strptime(created.group(1).decode('ascii'), '%Y-%m-%dT%H:%M:%SZ') if created else None
+    if created is None or template.render(item_rows_func(sample_invoice), created=created) != data:
+        raise TemplateMismatch("render lại file mẫu không khớp với xlsxwriter")
+    return template
+
+def get_invoice_template(write_func, item_rows_func):
+    """Template của process hiện tại (dựng 1 lần); None nếu không dùng được"""
+    global _template
+    if _template is False:
+        try:
+            _template = build_template(write_func, item_rows_func)
+        except (TemplateMismatch, OSError, ValueError, zipfile.BadZipFile) as e:
+            print(f"⚠️  Không dùng được template xlsx ({e}) - ghi bằng xlsxwriter")
+            _template = None
+    return _template
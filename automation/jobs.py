@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+HÀNG ĐỢI JOB CHẠY NỀN (WEB CONTROL PANEL)
+=========================================
+Xử lý hóa đơn chạy trên 1 worker thread riêng thay vì trong request Flask:
+
+- submit() trả về Job ngay; API trả job id, trình duyệt hỏi lại /api/jobs/<id>
+- Các job chạy lần lượt (1 worker). Job cùng loại đang chờ trong hàng đợi được dùng lại
+  thay vì thêm job mới (job đó chạy sau nên sẽ thấy file mới nhất)
+- print() trong job được ghi vào log của chính job đó (mỗi dòng 1 entry có seq, mức độ),
+  không dùng contextlib.redirect_stdout (đổi stdout của cả process, lẫn log giữa các thread)
+- report_progress(...) cập nhật tiến độ của job đang chạy (không làm gì khi chạy ngoài job)
+- listener(job, update, data) (tùy chọn) được gọi khi job đổi trạng thái ('state'), tiến độ
+  ('progress') hoặc có dòng log mới ('log') - web đẩy các thay đổi này qua /api/stream
+"""
+
+import itertools
+import queue
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+
+# Số job đã xong được giữ lại để tra cứu
+MAX_FINISHED_JOBS = 50
+
+# Số dòng log tối đa của 1 job
+MAX_JOB_LOGS = 5000
+
+_current = threading.local()
+
+def current_job():
+    return getattr(_current, 'job', None)
+
+def report_progress(**fields):
+    """Cập nhật tiến độ job đang chạy trên thread này (vd. invoices=120, files_written=80)"""
+    job = current_job()
+    if job is not None:
+        job.update_progress(fields)
+
+def _log_level(message):
+    text = message.lstrip()
+    if text.startswith('❌'):
+        return 'error'
+    if text.startswith('⚠️'):
+        return 'warning'
+    return 'info'
+
+# ============================================================================
+# LOG CỦA JOB
+# ============================================================================
+
+class JobLogSink:
+    """File-like: gom text theo dòng rồi ghi vào log của job"""
+
+    def __init__(self, job):
+        self.job = job
+        self._partial = ''
+
+    def write(self, text):
+        *lines, self._partial = (self._partial + text).split('\n')
+        for line in lines:
+            self.job.add_log(line)
+        return len(text)
+
+    def flush(self):
+        if self._partial:
+            self.job.add_log(self._partial)
+            self._partial = ''
+
+class _ThreadStdout:
+    """sys.stdout dùng chung: thread đang chạy job ghi vào log job, thread khác ghi ra stdout gốc"""
+
+    def __init__(self, original):
+        self.original = original
+
+    def _target(self):
+        sink = getattr(_current, 'sink', None)
+        return sink if sink is not None else self.original
+
+    def write(self, text):
+        return self._target().write(text)
+
+    def flush(self):
+        return self._target().flush()
+
+    def __getattr__(self, name):
+        return getattr(self.original, name)
+
+_install_lock = threading.Lock()
+
+def install_stdout_router():
+    """Thay sys.stdout bằng router theo thread (gọi nhiều lần cũng chỉ cài 1 lần)"""
+    with _install_lock:
+        if not isinstance(sys.stdout, _ThreadStdout):
+            sys.stdout = _ThreadStdout(sys.stdout)
+
+# ============================================================================
+# JOB
+# ============================================================================
+
+class Job:
+    """1 lần chạy: trạng thái queued → running → succeeded / failed"""
+
+    def __init__(self, kind, func, listener=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.func = func
+        self.listener = listener
+        self.state = 'queued'
+        self.created_at = datetime.now().isoformat(timespec='seconds')
+        self.started_at = None
+        self.finished_at = None
+        self.progress = {}
+        self.logs = []          # {'seq', 'time', 'level', 'message'}
+        self.warnings = 0
+        self.errors = 0
+        self.result = None
+        self.error = None
+        self._seq = itertools.count(1)
+        self._done = threading.Event()
+
+    @property
+    def finished(self):
+        return self._done.is_set()
+
+    def _notify(self, update, data=None):
+        if self.listener is not None:
+            self.listener(self, update, data)
+
+    def update_progress(self, fields):
+        self.progress.update(fields)
+        self._notify('progress', fields)
+
+    def add_log(self, message):
+        level = _log_level(message)
+        if level == 'warning':
+            self.warnings += 1
+        elif level == 'error':
+            self.errors += 1
+        entry = {
+            'seq': next(self._seq),
+            'time': time.time(),
+            'level': level,
+            'message': message,
+        }
+        self.logs.append(entry)
+        if len(self.logs) > MAX_JOB_LOGS:
+            del self.logs[:len(self.logs) - MAX_JOB_LOGS]
+        self._notify('log', entry)
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def run(self):
+        self.state = 'running'
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        sink = JobLogSink(self)
+        _current.job, _current.sink = self, sink
+        self._notify('state')
+        try:
+            self.result = self.func()
+            self.state = 'succeeded'
+        except Exception as e:
+            self.error = str(e)
+            self.state = 'failed'
+            sink.write(f"❌ Lỗi: {e}\n")
+        finally:
+            sink.flush()
+            _current.job = _current.sink = None
+            self.finished_at = datetime.now().isoformat(timespec='seconds')
+            self._done.set()
+            self._notify('state')
+
+    def to_dict(self, since=0, include_logs=True):
+        """Trạng thái job + các dòng log có seq > since"""
+        data = {
+            'id': self.id,
+            'kind': self.kind,
+            'state': self.state,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'progress': dict(self.progress),
+            'warnings': self.warnings,
+            'errors': self.errors,
+            'result': self.result,
+            'error': self.error,
+        }
+        if include_logs:
+            data['logs'] = [entry for entry in list(self.logs) if entry['seq'] > since]
+        return data
+
+# ============================================================================
+# HÀNG ĐỢI
+# ============================================================================
+
+class JobQueue:
+    """Hàng đợi 1 worker: các job chạy lần lượt theo thứ tự submit"""
+
+    def __init__(self, name='jobs', listener=None):
+        self.name = name
+        self.listener = listener
+        self._jobs = {}
+        self._order = []
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._work, name=f'{self.name}-worker', daemon=True)
+            self._worker.start()
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                # Từ đây submit() không dùng lại job này nữa (nó đã bắt đầu đọc file)
+                job.state = 'running'
+            job.run()
+            self._prune()
+
+    def _prune(self):
+        with self._lock:
+            finished = [job_id for job_id in self._order if self._jobs[job_id].finished]
+            for job_id in finished[:max(len(finished) - MAX_FINISHED_JOBS, 0)]:
+                self._order.remove(job_id)
+                del self._jobs[job_id]
+
+    def submit(self, kind, func):
+        """
+        Thêm job vào hàng đợi.
+
+        Returns: (job, reused) - reused=True nếu đã có job cùng loại đang chờ (chưa chạy)
+        """
+        install_stdout_router()
+        with self._lock:
+            for job_id in self._order:
+                job = self._jobs[job_id]
+                if job.kind == kind and job.state == 'queued':
+                    return job, True
+            job = Job(kind, func, self.listener)
+            self._jobs[job.id] = job
+            self._order.append(job.id)
+            self._ensure_worker()
+        job._notify('state')
+        self._queue.put(job)
+        return job, False
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def active(self):
+        """Job đang chạy hoặc đang chờ"""
+        with self._lock:
+            return [self._jobs[job_id] for job_id in self._order if not self._jobs[job_id].finished]
+
+    def recent(self, limit=20):
+        with self._lock:
+            return [self._jobs[job_id] for job_id in self._order[-limit:]]
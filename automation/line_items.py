@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+NHẬN DIỆN DÒNG MÓN TRONG EXPORT FABI
+====================================
+Các bước kiểm tra 1 cửa sổ 4 cell (tên, số lượng, đơn vị, giá) dùng chung cho
+process_invoices.py và check_missing_items.py - parser và script kiểm tra luôn
+dùng đúng cùng một luật.
+
+- Các pattern bỏ qua tên món được gộp thành 1 regex biên dịch sẵn
+- Bảng str.maketrans để bỏ ' ', ',', '.' khỏi giá (thay cho 3 lần replace)
+"""
+
+import re
+
+# Tên món hợp lệ phải nằm trong khoảng này
+MIN_QUANTITY = 1
+MAX_QUANTITY = 200
+MIN_PRICE = 500
+MAX_PRICE = 2000000
+
+# Cell không phải tên món (header, tên quán)
+NON_ITEM_NAMES = frozenset(['', 'STT', 'Mã hoá đơn', 'Simple Place'])
+
+# Tên chứa các pattern này là ghi chú / option / phương thức thanh toán, không phải món
+SKIP_NAME_PATTERNS = (
+    r'\bcrispy\b', r'\bsoft\b', r'cut in 4', r'- edit\s*$',
+    r'đổi phương thức', r'\bpayment\b', r'\btransfer\b',
+    r'\bcod\b', r'\batm\b', 'background-color', 'vertical-align',
+    'ghi chú', 'giảm sốt'
+)
+SKIP_NAME_RE = re.compile('|'.join(f'(?:{pattern})' for pattern in SKIP_NAME_PATTERNS))
+
+PRICE_CLEAN_TABLE = str.maketrans('', '', ' ,.')
+
+def parse_quantity(cell):
+    """Số lượng trong cell (None nếu không phải số lượng hợp lệ 1-200)"""
+    if not cell.isdigit():
+        return None
+    qty = int(cell)
+    if MIN_QUANTITY <= qty <= MAX_QUANTITY:
+        return qty
+    return None
+
+def clean_price(cell):
+    """Bỏ dấu cách / phẩy / chấm: '125.000' -> '125000'"""
+    return cell.translate(PRICE_CLEAN_TABLE)
+
+def is_skipped_name(name):
+    """Tên là ghi chú / option / phương thức thanh toán → không phải món"""
+    return SKIP_NAME_RE.search(name.lower()) is not None
+
+def is_item_price(price_value):
+    return MIN_PRICE <= price_value <= MAX_PRICE
+
+def cell_unit(unit_candidate):
+    """Đơn vị trong cell (mặc định 'Phần' nếu trống hoặc là số)"""
+    return unit_candidate if unit_candidate and not unit_candidate.isdigit() else 'Phần'
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+MENU INDEX ĐÃ BIÊN DỊCH
+=======================
+Parse menu Excel một lần, lưu kết quả (danh sách món + name_mapping + price_to_items
++ các dict tra cứu món theo tên) vào file pickle cạnh file menu, và load lại trong vài mili-giây ở các lần chạy sau.
+
+- Cache được đánh key theo mtime + size + sha256 của từng file menu
+- Menu thay đổi → cache tự động bị bỏ và build lại
+- Không import pandas trừ khi thật sự cần parse lại file Excel
+"""
+
+import hashlib
+import pickle
+import re
+from pathlib import Path
+
+# Tăng số này mỗi khi cấu trúc index thay đổi để cache cũ tự động bị bỏ
+INDEX_FORMAT_VERSION = 2
+
+# Các file menu (đường dẫn tương đối với thư mục gốc project)
+MENU_FILES = [
+    'Menu/simple-place-menu.xlsx',
+    'Menu/taco-place-menu.xlsx'
+]
+
+INDEX_CACHE_FILE = 'Menu/.menu-index.pickle'
+
+# Nhóm được xem là bia/rượu: chỉ các nhóm sau trong menu
+ALCOHOL_GROUPS = {'BEER & CRAFT BEERS', 'SANGRIA', 'RED', 'WHITE'}
+
+# Cache trong process: (fingerprint, index) để các request web không phải đọc lại pickle
+_memory_cache = {}
+
+# ============================================================================
+# HÀM TIỆN ÍCH CHUẨN HÓA KEY TÊN MÓN
+# ============================================================================
+
+def normalize_menu_key(s):
+    """
+    Chuẩn hóa chuỗi để dùng làm key so sánh tên món:
+    - Đưa về lowercase
+    - Bỏ ký tự đặc biệt (giữ lại chữ, số, khoảng trắng)
+    - Gom nhiều khoảng trắng thành 1
+
+    Ví dụ:
+        'V - Bruschetta'  -> 'v bruschetta'
+        'V-Bruschetta'    -> 'v bruschetta'
+    """
+    if not s:
+        return ''
+    s = s.lower().strip()
+    # Bỏ ký tự không phải chữ/số/khoảng trắng (bao gồm '-', '/', ',', ...)
+    s = re.sub(r'[^\w\s]', ' ', s)
+    # Gom nhiều khoảng trắng liên tiếp thành 1
+    s = re.sub(r'\s+', ' ', s)
+    return s
+
+# ============================================================================
+# FINGERPRINT FILE MENU
+# ============================================================================
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _stat_fingerprint(menu_files, root):
+    """(file, mtime_ns, size) cho từng file menu đang tồn tại - rất rẻ, không đọc nội dung"""
+    stamps = []
+    for menu_file in menu_files:
+        path = Path(root) / menu_file
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            continue
+        stamps.append((menu_file, st.st_mtime_ns, st.st_size))
+    return tuple(stamps)
+
+def _content_fingerprint(menu_files, root):
+    """(file, sha256) cho từng file menu đang tồn tại"""
+    hashes = []
+    for menu_file in menu_files:
+        path = Path(root) / menu_file
+        if path.exists():
+            hashes.append((menu_file, _file_sha256(path)))
+    return tuple(hashes)
+
+def _index_version(content_fingerprint):
+    """Version ngắn gọn của index - đổi khi nội dung menu (hoặc format index) đổi"""
+    digest = hashlib.sha256(repr((INDEX_FORMAT_VERSION, content_fingerprint)).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+# ============================================================================
+# BUILD INDEX
+# ============================================================================
+
+def is_alcohol_menu_item(item):
+    """Món bia/rượu hoặc Coke thường (KHÔNG phải Light/Zero) - không dùng để thay thế"""
+    full_name = item['name']
+    group_name = str(item.get('group', '')).strip().upper()
+    if group_name in ALCOHOL_GROUPS:
+        return True
+
+    item_name_lower = full_name.lower()
+    alcohol_keywords = ['bia', 'beer', 'heineken', 'tiger', 'saigon', '333', 'rượu', 'wine', 'whisky', 'vodka']
+    if any(keyword in item_name_lower for keyword in alcohol_keywords):
+        return True
+
+    # Kiểm tra Coke thường (KHÔNG phải Light/Zero)
+    if 'coke' in item_name_lower or 'coca' in item_name_lower:
+        exclude_keywords = ['light', 'zero', 'ít đường', 'không đường', 'it duong', 'khong duong']
+        if not any(exclude_kw in item_name_lower for exclude_kw in exclude_keywords):
+            return True
+
+    return False
+
+def compile_menu_index(all_items):
+    """
+    Tạo các bảng tra cứu từ danh sách món đã parse:
+    - name_mapping: key chuẩn hóa (tên đầy đủ / tên tiếng Anh) -> tên đầy đủ
+    - price_to_items: giá -> các món không phải bia/rượu
+    - by_full_name: tên đầy đủ -> món
+    - by_normalized_key: key chuẩn hóa (tên đầy đủ / tên tiếng Anh) -> món
+    Trùng tên thì giữ món xuất hiện trước (Simple Place được ưu tiên)
+    """
+    # Tạo mapping: English name (lowercase) -> Full name (Vietnamese / English)
+    name_mapping = {}
+    price_to_items = {}
+    by_full_name = {}
+    by_normalized_key = {}
+
+    for item in all_items:
+        full_name = item['name']
+        price = item['price']
+        by_full_name.setdefault(full_name, item)
+
+        # Extract English part (sau dấu /)
+        if ' / ' in full_name:
+            parts = full_name.split(' / ')
+            english_name = parts[-1].strip()
+            eng_key = normalize_menu_key(english_name)
+            # If duplicate, prefer the first one found (Simple Place takes precedence)
+            if eng_key and eng_key not in name_mapping:
+                name_mapping[eng_key] = full_name
+            if eng_key:
+                by_normalized_key.setdefault(eng_key, item)
+
+        # Map cả tên đầy đủ (prefer Simple Place if duplicate)
+        full_name_key = normalize_menu_key(full_name)
+        if full_name_key and full_name_key not in name_mapping:
+            name_mapping[full_name_key] = full_name
+        if full_name_key:
+            by_normalized_key.setdefault(full_name_key, item)
+
+        # Chỉ thêm món không phải bia/rượu (và không phải Coke thường) vào price_to_items
+        if not is_alcohol_menu_item(item):
+            price_to_items.setdefault(price, []).append(item)
+
+    return {
+        'all_items': all_items,
+        'name_mapping': name_mapping,
+        'price_to_items': price_to_items,
+        'by_full_name': by_full_name,
+        'by_normalized_key': by_normalized_key,
+    }
+
+def build_menu_index(menu_files, root):
+    """Parse tất cả file menu (chậm: pandas + Excel) và biên dịch index"""
+    # Import muộn: pandas chỉ được load khi thật sự phải parse lại Excel
+    from Menu.parse_menu import parse_excel_menu
+
+    all_items = []
+    for menu_file in menu_files:
+        menu_path = Path(root) / menu_file
+        if menu_path.exists():
+            items = parse_excel_menu(str(menu_path))
+            # Track source menu for each item
+            menu_type = 'simple' if 'simple-place' in menu_file.lower() else 'taco'
+            for item in items:
+                item['menu_source'] = menu_type
+                all_items.append(item)
+
+    return compile_menu_index(all_items)
+
+# ============================================================================
+# LOAD INDEX (CÓ CACHE)
+# ============================================================================
+
+def _read_cache(cache_path):
+    try:
+        with open(cache_path, 'rb') as f:
+            cached = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        return None
+    if not isinstance(cached, dict) or cached.get('format') != INDEX_FORMAT_VERSION:
+        return None
+    return cached
+
+def _write_cache(cache_path, cached):
+    # Ghi ra file tạm rồi rename để process khác không đọc phải file ghi dở
+    tmp_path = cache_path.with_name(cache_path.name + '.tmp')
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(cached, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_path.replace(cache_path)
+    except OSError as e:
+        print(f"⚠️  Không ghi được cache menu ({cache_path.name}): {e}")
+
+def load_menu_index(menu_files, root, cache_file=INDEX_CACHE_FILE):
+    """
+    Trả về index menu đã biên dịch:
+        {'version', 'all_items', 'name_mapping', 'price_to_items',
+         'by_full_name', 'by_normalized_key'}
+
+    Thứ tự ưu tiên:
+    1. Cache trong process (mtime + size không đổi)
+    2. File pickle (mtime + size khớp, hoặc sha256 khớp nếu file bị touch)
+    3. Parse lại Excel và ghi cache mới
+    """
+    root = Path(root)
+    cache_path = root / cache_file
+    stat_fp = _stat_fingerprint(menu_files, root)
+    memory_key = (str(cache_path), tuple(menu_files))
+
+    memo = _memory_cache.get(memory_key)
+    if memo and memo[0] == stat_fp:
+        return memo[1]
+
+    cached = _read_cache(cache_path)
+    if cached and cached.get('stat') != stat_fp:
+        # mtime/size đổi: chỉ build lại nếu nội dung thật sự đổi
+        content_fp = _content_fingerprint(menu_files, root)
+        if cached.get('content') == content_fp:
+            cached['stat'] = stat_fp
+            _write_cache(cache_path, cached)
+        else:
+            cached = None
+
+    if cached is None:
+        content_fp = _content_fingerprint(menu_files, root)
+        index = build_menu_index(menu_files, root)
+        index['version'] = _index_version(content_fp)
+        cached = {
+            'format': INDEX_FORMAT_VERSION,
+            'stat': stat_fp,
+            'content': content_fp,
+            'index': index,
+        }
+        _write_cache(cache_path, cached)
+
+    index = cached['index']
+    _memory_cache[memory_key] = (stat_fp, index)
+    return index
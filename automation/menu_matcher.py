@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+MATCH TÊN MÓN VỚI MENU (ĐÃ BIÊN DỊCH)
+=====================================
+MenuMatcher được build một lần từ menu:
+- Tên tiếng Anh đã làm sạch + tập từ của từng món được tính sẵn
+- Inverted index: từ → các món chứa từ đó
+- Index theo chuỗi để tìm nhanh các món có quan hệ chuỗi con (cho tên 1 từ)
+
+Khi match chỉ chấm điểm các món có khả năng đạt ngưỡng, với đúng công thức của
+match_menu_name cũ (ngưỡng 0.3/0.5, +0.2 nếu bắt đầu bằng, +0.3 nếu là chuỗi con).
+"""
+
+import re
+from bisect import bisect_right
+
+from automation.menu_index import normalize_menu_key
+
+_PUNCT_RE = re.compile(r'[^\w\s]')
+_SPICY_RE = re.compile(r'\s*\(spicy\)\s*')
+_TRAILING_EXTRA_RE = re.compile(r'\s+extra\s*$')
+_S_EXTRA_RE = re.compile(r's\s+extra')
+
+# Tách các tên tiếng Anh trong chuỗi tìm kiếm chung (không thể xuất hiện trong tên đã làm sạch)
+_BLOB_SEPARATOR = '\x00'
+
+# Matcher dùng gần nhất: (all_menu_items, name_mapping, matcher)
+_matcher_cache = None
+
+class MenuMatcher:
+    """Match tên món từ file POS với tên đầy đủ trong menu"""
+
+    def __init__(self, all_menu_items, name_mapping):
+        self.name_mapping = name_mapping
+        self._names = []
+        self._eng_cleans = []
+        self._eng_words = []
+        self._by_word = {}
+        self._by_eng_clean = {}
+
+        for idx, item in enumerate(all_menu_items):
+            full_name = item['name']
+            if ' / ' in full_name:
+                english_part = full_name.split(' / ')[-1].strip().lower()
+            else:
+                english_part = full_name.lower()
+            eng_clean = _PUNCT_RE.sub('', english_part)
+            eng_words = frozenset(eng_clean.split())
+
+            self._names.append(full_name)
+            self._eng_cleans.append(eng_clean)
+            self._eng_words.append(eng_words)
+            for word in eng_words:
+                self._by_word.setdefault(word, []).append(idx)
+            if eng_words:
+                self._by_eng_clean.setdefault(eng_clean, []).append(idx)
+
+        # Chuỗi chung chứa tất cả tên đã làm sạch: tìm "raw in eng" bằng str.find thay vì lặp cả menu
+        self._blob_offsets = []
+        offset = 0
+        for eng_clean in self._eng_cleans:
+            self._blob_offsets.append(offset)
+            offset += len(eng_clean) + len(_BLOB_SEPARATOR)
+        self._blob = _BLOB_SEPARATOR.join(self._eng_cleans)
+
+    def match(self, raw_name):
+        """Trả về tên đầy đủ trong menu, hoặc raw_name nếu không match được"""
+        raw_lower = raw_name.lower().strip()
+
+        # Loại bỏ variations
+        raw_normalized = _SPICY_RE.sub('', raw_lower).strip()
+        raw_without_extra = _TRAILING_EXTRA_RE.sub('', raw_normalized).strip()
+        raw_without_s = _S_EXTRA_RE.sub(' extra', raw_normalized)
+
+        # Direct match với key đã chuẩn hóa
+        for candidate in (raw_normalized, raw_without_s, raw_without_extra, raw_lower):
+            key = normalize_menu_key(candidate)
+            if key in self.name_mapping:
+                return self.name_mapping[key]
+
+        # Handle singular/plural variations
+        raw_normalized_singular = raw_normalized.rstrip('s')
+        raw_normalized_plural = raw_normalized + 's' if not raw_normalized.endswith('s') else raw_normalized
+
+        candidates = []
+        for raw_candidate in (raw_normalized, raw_normalized_singular, raw_normalized_plural):
+            raw_clean = _PUNCT_RE.sub('', raw_candidate)
+            raw_words = frozenset(raw_clean.split())
+            candidates.append((raw_clean, raw_words))
+
+        # Partial match: chỉ chấm điểm các món có thể đạt ngưỡng, theo đúng thứ tự menu
+        best_match = None
+        best_score = 0
+        for idx in sorted(self._candidate_items(candidates)):
+            eng_clean = self._eng_cleans[idx]
+            eng_words = self._eng_words[idx]
+            if not eng_words:
+                continue
+
+            for raw_clean, raw_words in candidates:
+                if not raw_words:
+                    continue
+                common_count = len(raw_words & eng_words)
+
+                if len(raw_words) == 1:
+                    score = common_count / len(eng_words) if common_count > 0 else 0
+                    if eng_clean.startswith(raw_clean):
+                        score += 0.2
+                else:
+                    score = common_count / max(len(raw_words), len(eng_words))
+
+                if raw_clean in eng_clean or eng_clean in raw_clean:
+                    score += 0.3
+
+                threshold = 0.3 if len(raw_words) == 1 else 0.5
+
+                if score >= threshold and score > best_score:
+                    best_score = score
+                    best_match = self._names[idx]
+                    break
+
+        return best_match if best_match else raw_name
+
+    def _candidate_items(self, candidates):
+        """
+        Các món có thể đạt ngưỡng với ít nhất một biến thể tên:
+        - Có chung ít nhất 1 từ
+        - Hoặc (tên 1 từ) có quan hệ chuỗi con - trường hợp duy nhất không chung từ mà vẫn đạt 0.3
+        """
+        found = set()
+        for raw_clean, raw_words in candidates:
+            for word in raw_words:
+                found.update(self._by_word.get(word, ()))
+
+            if len(raw_words) != 1:
+                continue
+
+            # raw_clean in eng_clean
+            start = self._blob.find(raw_clean)
+            while start != -1:
+                found.add(bisect_right(self._blob_offsets, start) - 1)
+                start = self._blob.find(raw_clean, start + 1)
+
+            # eng_clean in raw_clean
+            length = len(raw_clean)
+            for i in range(length):
+                for j in range(i + 1, length + 1):
+                    found.update(self._by_eng_clean.get(raw_clean[i:j], ()))
+        return found
+
+def get_menu_matcher(all_menu_items, name_mapping):
+    """Trả về MenuMatcher cho menu này (build một lần, dùng lại khi menu không đổi)"""
+    global _matcher_cache
+    if (_matcher_cache is not None
+            and _matcher_cache[0] is all_menu_items
+            and _matcher_cache[1] is name_mapping):
+        return _matcher_cache[2]
+    matcher = MenuMatcher(all_menu_items, name_mapping)
+    _matcher_cache = (all_menu_items, name_mapping, matcher)
+    return matcher
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+TIỀN VND DẠNG SỐ NGUYÊN
+=======================
+Thành tiền, tổng hóa đơn, giảm giá và VAT được tính bằng số nguyên đồng thay vì float
+(float cộng/nhân nhiều lần bị lệch kiểu 123456.99999 → tên file / validate lệch 1đ).
+
+Đơn giá vẫn có thể lẻ (món được giảm giá: thành tiền mới / số lượng), nhưng thành tiền
+từng dòng luôn là số đồng nguyên. Quy tắc làm tròn:
+- Thành tiền (số lượng × đơn giá): làm tròn nửa lên về đồng
+- Tổng có VAT 8% (trên tên file): bỏ phần lẻ - giống int(total * 1.08) trước đây, nhưng tính đúng
+- Phần trăm (phí dịch vụ, giá thay bia/rượu): làm tròn nửa về số chẵn - giống round() trước đây
+- Trần giảm giá theo % giá trị món: bỏ phần lẻ (giảm giá không vượt quá trần)
+
+Tổng của cả batch được gom vào array('q') (số nguyên 64-bit) và cộng một lần.
+"""
+
+import math
+from fractions import Fraction
+
+VAT_PERCENT = 8
+
+def to_dong(value):
+    """Làm tròn nửa lên về số đồng nguyên"""
+    if isinstance(value, int):
+        return value
+    if value < 0:
+        return -int(math.floor(-value + 0.5))
+    return int(math.floor(value + 0.5))
+
+def line_amount(quantity, price):
+    """Thành tiền 1 dòng (đồng)"""
+    return to_dong(quantity * price)
+
+def items_total(items):
+    """Tổng thành tiền các món (đồng, chưa VAT)"""
+    return sum(line_amount(item['quantity'], item['price']) for item in items)
+
+def rate_of(amount, rate):
+    """amount × rate (rate dạng 0.08 = 8%), làm tròn nửa về số chẵn - tính đúng, không qua float"""
+    return round(Fraction(to_dong(amount)) * Fraction(str(rate)))
+
+def scale(amount, numerator, denominator):
+    """amount × numerator / denominator (đồng), làm tròn nửa về số chẵn"""
+    return round(Fraction(to_dong(amount) * numerator, denominator))
+
+def discount_cap(amount, percent):
+    """Giảm giá tối đa = percent% của amount, bỏ phần lẻ"""
+    return to_dong(amount) * percent // 100
+
+def with_vat(amount):
+    """Tổng có VAT (đồng, bỏ phần lẻ) - số ghi trên tên file hóa đơn"""
+    return to_dong(amount) * (100 + VAT_PERCENT) // 100
+
+def format_dong(amount):
+    """123456 -> '123.456'"""
+    return f"{to_dong(amount):,}".replace(',', '.')
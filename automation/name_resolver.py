@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+CACHE PHÂN GIẢI TÊN MÓN
+=======================
+Cùng một tên món POS ("Birria Beef (Spicy)", "Nachos", ...) xuất hiện hàng trăm lần
+mỗi ngày. Kết quả match menu → sửa format tên được cache 2 tầng:
+
+1. LRU trong process, key = tên gốc từ POS
+2. File JSON trên đĩa, gắn với version của menu index - menu không đổi thì
+   lần chạy sau dùng lại luôn kết quả của hôm trước
+
+Menu đổi (version khác) → file cache cũ bị bỏ qua và ghi đè.
+"""
+
+import json
+from collections import OrderedDict
+from pathlib import Path
+
+RESOLUTION_CACHE_FILE = 'Menu/.name-resolutions.json'
+LRU_MAX_SIZE = 4096
+
+# Resolver dùng gần nhất: (all_menu_items, name_mapping, resolver)
+_resolver_cache = None
+
+class NameResolver:
+    """Phân giải tên món POS → tên đầy đủ 'Tiếng Việt / Tiếng Anh' (có cache)"""
+
+    def __init__(self, resolve_func, version=None, cache_path=None, max_size=LRU_MAX_SIZE):
+        self._resolve_func = resolve_func
+        self.version = version
+        # Không có version (menu không đến từ menu index) → chỉ cache trong RAM
+        self.cache_path = Path(cache_path) if (cache_path and version) else None
+        self.max_size = max_size
+        self._lru = OrderedDict()
+        self._stored = {}
+        self._dirty = False
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._load()
+
+    def resolve(self, raw_name):
+        value = self._lru.get(raw_name)
+        if value is not None:
+            self._lru.move_to_end(raw_name)
+            self.memory_hits += 1
+            return value
+
+        value = self._stored.get(raw_name)
+        if value is not None:
+            self.disk_hits += 1
+        else:
+            value = self._resolve_func(raw_name)
+            self._stored[raw_name] = value
+            self._dirty = True
+            self.misses += 1
+
+        self._lru[raw_name] = value
+        if len(self._lru) > self.max_size:
+            self._lru.popitem(last=False)
+        return value
+
+    def reset_stats(self):
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+        }
+
+    def _load(self):
+        if not self.cache_path or not self.cache_path.exists():
+            return
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if isinstance(data, dict) and data.get('version') == self.version:
+            names = data.get('names')
+            if isinstance(names, dict):
+                self._stored = names
+
+    def save(self):
+        """Ghi các kết quả mới ra đĩa (chỉ khi có thay đổi)"""
+        if not self.cache_path or not self._dirty:
+            return
+        tmp_path = self.cache_path.with_name(self.cache_path.name + '.tmp')
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': self.version, 'names': self._stored}, f, ensure_ascii=False, indent=0)
+            tmp_path.replace(self.cache_path)
+            self._dirty = False
+        except OSError as e:
+            print(f"⚠️  Không ghi được cache tên món ({self.cache_path.name}): {e}")
+
+def get_name_resolver(all_menu_items, name_mapping, resolve_func, version=None, cache_path=None):
+    """Trả về NameResolver cho menu này (tạo một lần, dùng lại khi menu không đổi)"""
+    global _resolver_cache
+    if (_resolver_cache is not None
+            and _resolver_cache[0] is all_menu_items
+            and _resolver_cache[1] is name_mapping):
+        return _resolver_cache[2]
+    resolver = NameResolver(resolve_func, version=version, cache_path=cache_path)
+    _resolver_cache = (all_menu_items, name_mapping, resolver)
+    return resolver
+
+def current_resolution_stats():
+    """Thống kê hit/miss của resolver đang dùng (None nếu chưa parse lần nào)"""
+    if _resolver_cache is None:
+        return None
+    return _resolver_cache[2].stats()
@@ -19,11 +19,13 @@ Sử dụng:
     3. Create Grab invoice
 """
 
+import hashlib
 import re
 import xlsxwriter
 import sys
 import os
 import random
+from array import array
 from datetime import datetime
 from pathlib import Path
 
@@ -33,44 +35,45 @@ PROJECT_ROOT = PACKAGE_DIR.parent
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
-# Import parse_menu
+# Menu index đã biên dịch (cache pickle cạnh file menu)
 script_dir = PROJECT_ROOT
-from Menu.parse_menu import parse_excel_menu
+from automation.menu_index import MENU_FILES, load_menu_index
+from automation.menu_matcher import get_menu_matcher
+from automation.discounts import allocate_discounts, discount_report_lines
+from automation.jobs import report_progress
+from automation.invoice_ledger import LEDGER_FILE, invoice_fingerprint, open_ledger
+from automation.invoice_manifest import build_record, write_manifest
+from automation.invoice_model import Invoice, LineItem
+from automation.invoice_writer import write_invoice_files
+from automation.invoice_xlsx import get_invoice_template
+from automation.money import format_dong, items_total, rate_of, scale, with_vat
+from automation.line_items import NON_ITEM_NAMES, cell_unit, clean_price, is_item_price, is_skipped_name, parse_quantity
+from automation.name_resolver import RESOLUTION_CACHE_FILE, current_resolution_stats, get_name_resolver
+from automation.sale_report import CombinedReport, header_payment_method, invoice_header_amounts, iter_tagged_rows, row_payment_method
 
 # ============================================================================
-# HÀM TIỆN ÍCH CHUẨN HÓA KEY TÊN MÓN
+# CẤU HÌNH
 # ============================================================================
 
-def normalize_menu_key(s):
-    """
-    Chuẩn hóa chuỗi để dùng làm key so sánh tên món:
-    - Đưa về lowercase
-    - Bỏ ký tự đặc biệt (giữ lại chữ, số, khoảng trắng)
-    - Gom nhiều khoảng trắng thành 1
-    
-    Ví dụ:
-        'V - Bruschetta'  -> 'v bruschetta'
-        'V-Bruschetta'    -> 'v bruschetta'
-    """
-    if not s:
-        return ''
-    s = s.lower().strip()
-    # Bỏ ký tự không phải chữ/số/khoảng trắng (bao gồm '-', '/', ',', ...)
-    s = re.sub(r'[^\w\s]', ' ', s)
-    # Gom nhiều khoảng trắng liên tiếp thành 1
-    s = re.sub(r'\s+', ' ', s)
-    return s
+OUTPUT_DIR = 'tax_files'
 
-# ============================================================================
-# CẤU HÌNH
-# ============================================================================
+# Số process ghi file Excel song song (None = tự chọn theo số CPU, 1 = ghi tuần tự)
+INVOICE_WRITER_WORKERS = None
 
-MENU_FILES = [
-    'Menu/simple-place-menu.xlsx',
-    'Menu/taco-place-menu.xlsx'
-]
+# Ghi file Excel từ template dựng sẵn (nhanh); False = luôn dùng xlsxwriter
+INVOICE_XLSX_TEMPLATE = True
 
-OUTPUT_DIR = 'tax_files'
+# Ghi thêm tax_files/manifest.jsonl (các món + tổng tiền của từng file) để các script kiểm tra
+# không phải mở lại từng file Excel
+WRITE_INVOICE_MANIFEST = True
+
+# Chỉ ghi lại hóa đơn mới / đã đổi so với lần chạy trước (sổ hóa đơn SQLite ở thư mục gốc)
+# False = lần nào cũng ghi lại tất cả file
+INCREMENTAL_PROCESSING = True
+
+# Tổng có VAT tự tính (with_vat, bỏ phần lẻ) được lệch tối đa bao nhiêu đồng so với thành tiền
+# cuối Fabi ghi trên báo cáo - Fabi làm tròn VAT theo cách riêng nên có thể chênh 1đ
+FINAL_TOTAL_ROUNDING = 1
 
 # Default files for combining
 DEFAULT_FILE1 = 'sale_by_payment_method.xls'  # transfer
@@ -97,68 +100,11 @@ SERVICE_FEE_UNIT = ""  # Để trống, không cần đơn vị
 # ============================================================================
 
 def load_menus():
-    """Load tất cả menu và tạo mapping"""
-    all_items = []
-    
-    for menu_file in MENU_FILES:
-        menu_path = script_dir / menu_file
-        if menu_path.exists():
-            items = parse_excel_menu(str(menu_path))
-            # Track source menu for each item
-            menu_type = 'simple' if 'simple-place' in menu_file.lower() else 'taco'
-            for item in items:
-                item['menu_source'] = menu_type
-                all_items.append(item)
-    
-    # Tạo mapping: English name (lowercase) -> Full name (Vietnamese / English)
-    name_mapping = {}
-    price_to_items = {}
-    
-    # Nhóm được xem là bia/rượu: chỉ các nhóm sau trong menu
-    alcohol_groups = {'BEER & CRAFT BEERS', 'SANGRIA', 'RED', 'WHITE'}
-    
-    for item in all_items:
-        full_name = item['name']
-        price = item['price']
-        
-        # Extract English part (sau dấu /)
-        if ' / ' in full_name:
-            parts = full_name.split(' / ')
-            english_name = parts[-1].strip()
-            eng_key = normalize_menu_key(english_name)
-            # If duplicate, prefer the first one found (Simple Place takes precedence)
-            if eng_key and eng_key not in name_mapping:
-                name_mapping[eng_key] = full_name
-        
-        # Map cả tên đầy đủ (prefer Simple Place if duplicate)
-        full_name_key = normalize_menu_key(full_name)
-        if full_name_key and full_name_key not in name_mapping:
-            name_mapping[full_name_key] = full_name
-        
-        # Tạo price mapping cho món không phải bia/rượu và không phải Coke
-        group_name = str(item.get('group', '')).strip().upper()
-        is_alcohol = group_name in alcohol_groups
-        
-        # Kiểm tra tên món có chứa từ khóa bia/rượu không (bao gồm cả Coke thường, nhưng KHÔNG bao gồm Coke Light/Zero)
-        if not is_alcohol:
-            item_name_lower = full_name.lower()
-            alcohol_keywords = ['bia', 'beer', 'heineken', 'tiger', 'saigon', '333', 'rượu', 'wine', 'whisky', 'vodka']
-            is_alcohol = any(keyword in item_name_lower for keyword in alcohol_keywords)
-            
-            # Kiểm tra Coke thường (KHÔNG phải Light/Zero)
-            if not is_alcohol and ('coke' in item_name_lower or 'coca' in item_name_lower):
-                exclude_keywords = ['light', 'zero', 'ít đường', 'không đường', 'it duong', 'khong duong']
-                is_coke_light_or_zero = any(exclude_kw in item_name_lower for exclude_kw in exclude_keywords)
-                if not is_coke_light_or_zero:
-                    is_alcohol = True
-        
-        # Chỉ thêm món không phải bia/rượu vào price_to_items
-        if not is_alcohol:
-            if price not in price_to_items:
-                price_to_items[price] = []
-            price_to_items[price].append(item)
-    
-    return all_items, name_mapping, price_to_items
+    """
+    Load tất cả menu và tạo mapping (dùng index đã biên dịch, chỉ parse lại Excel khi menu đổi)
+    Returns index menu (dict): all_items, name_mapping, price_to_items, by_full_name, version...
+    """
+    return load_menu_index(MENU_FILES, script_dir)
 
 # ============================================================================
 # XỬ LÝ THAY THẾ RƯỢU/BIA
@@ -210,15 +156,11 @@ def find_replacement_for_alcohol(alcohol_name, alcohol_price, price_to_items):
         
         return False
     
-    # Tính số tiền thuế 10% (áp dụng cho bia/rượu và Coke 10% đường)
-    tax_10_percent = alcohol_price * 0.10
-    
     # Giá món thay thế = giá gốc (bia/rượu hoặc Coke) + thuế 10%, sau đó điều chỉnh để sau thuế 8% vẫn đủ
-    # Công thức: adjusted_price = (alcohol_price + tax_10_percent) / 1.08 * 1.08 / 1.08
-    # Đơn giản hóa: adjusted_price = alcohol_price * 1.10 / 1.08
+    # Công thức: adjusted_price = alcohol_price * 1.10 / 1.08
     # Áp dụng cho cả bia/rượu và Coke 10% đường (cùng tính thuế 10%)
-    # Làm tròn thành số nguyên (không có phần thập phân)
-    adjusted_price = round(alcohol_price * 1.10 / 1.08)
+    # Làm tròn thành số nguyên (không có phần thập phân) - tính bằng số nguyên, không qua float
+    adjusted_price = scale(alcohol_price, 110, 108)
     
     # Tìm món có giá gần với giá gốc, đảm bảo không phải bia/rượu
     for delta in [0, 5000, -5000, 10000, -10000, 15000, -15000, 20000, -20000]:
@@ -296,219 +238,118 @@ def fix_item_name_format(item_name):
 # ============================================================================
 
 def match_menu_name(raw_name, all_menu_items, name_mapping):
-    """Match tên món từ file với tên trong menu"""
-    raw_lower = raw_name.lower().strip()
-    
-    # Loại bỏ variations
-    raw_normalized = re.sub(r'\s*\(spicy\)\s*', '', raw_lower).strip()
-    raw_without_extra = re.sub(r'\s+extra\s*$', '', raw_normalized).strip()
-    raw_without_s = re.sub(r's\s+extra', ' extra', raw_normalized)
-    
-    # Direct match với key đã chuẩn hóa
-    candidates = [raw_normalized, raw_without_s, raw_without_extra, raw_lower]
-    for candidate in candidates:
-        key = normalize_menu_key(candidate)
-        if key in name_mapping:
-            return name_mapping[key]
-    
-    # Partial match
-    best_match = None
-    best_score = 0
-    
-    # Handle singular/plural variations
-    raw_normalized_singular = raw_normalized.rstrip('s')
-    raw_normalized_plural = raw_normalized + 's' if not raw_normalized.endswith('s') else raw_normalized
-    candidates_to_try = [raw_normalized, raw_normalized_singular, raw_normalized_plural]
+    """Match tên món từ file với tên trong menu (MenuMatcher được build một lần cho mỗi menu)"""
+    return get_menu_matcher(all_menu_items, name_mapping).match(raw_name)
+
+def resolve_item_name(raw_name, all_menu_items, name_mapping):
+    """Match với menu rồi sửa format: luôn trả về tên dạng 'Tiếng Việt / Tiếng Anh'"""
+    matched_name = match_menu_name(raw_name, all_menu_items, name_mapping)
     
-    for item in all_menu_items:
-        full_name = item['name']
-        
-        if ' / ' in full_name:
-            english_part = full_name.split(' / ')[-1].strip().lower()
-        else:
-            english_part = full_name.lower()
-        
-        # Try each candidate variation
-        for raw_candidate in candidates_to_try:
-            raw_clean = re.sub(r'[^\w\s]', '', raw_candidate)
-            eng_clean = re.sub(r'[^\w\s]', '', english_part)
-            
-            raw_words = set(raw_clean.split())
-            eng_words = set(eng_clean.split())
-            
-            if raw_words and eng_words:
-                common_words = raw_words & eng_words
-                
-                if len(raw_words) == 1:
-                    score = len(common_words) / len(eng_words) if len(common_words) > 0 else 0
-                    if eng_clean.startswith(raw_clean):
-                        score += 0.2
-                else:
-                    score = len(common_words) / max(len(raw_words), len(eng_words))
-                
-                if raw_clean in eng_clean or eng_clean in raw_clean:
-                    score += 0.3
-                
-                threshold = 0.3 if len(raw_words) == 1 else 0.5
-                
-                if score >= threshold and score > best_score:
-                    best_score = score
-                    best_match = full_name
-                    break
+    # Tự động sửa format nếu không đúng
+    full_name = fix_item_name_format(matched_name)
     
-    return best_match if best_match else raw_name
+    # Đảm bảo format cuối cùng luôn có " / "
+    if ' / ' not in full_name:
+        full_name = f"{full_name} / {full_name}"
+    return full_name
+
+def get_item_name_resolver(menu):
+    """Resolver có cache (RAM + đĩa theo version menu) cho resolve_item_name - menu: index từ load_menus()"""
+    all_menu_items, name_mapping = menu['all_items'], menu['name_mapping']
+    return get_name_resolver(
+        all_menu_items, name_mapping,
+        lambda raw_name: resolve_item_name(raw_name, all_menu_items, name_mapping),
+        version=menu['version'],
+        cache_path=script_dir / RESOLUTION_CACHE_FILE,
+    )
 
 # ============================================================================
 # KẾT HỢP FILES
 # ============================================================================
 
 def combine_files(file1_path, file2_path):
-    """Kết hợp 2 file HTML thành 1, xử lý trực tiếp trong memory"""
-    
-    with open(file1_path, 'r', encoding='utf-8', errors='ignore') as f:
-        content1 = f.read()
-    
-    with open(file2_path, 'r', encoding='utf-8', errors='ignore') as f:
-        content2 = f.read()
-    
-    # Extract rows from both files
-    parts1 = content1.split('<tr>')
-    header = parts1[0] if parts1 else ''
-    rows1 = ['<tr>' + part for part in parts1[1:] if part.strip()]
-    
-    parts2 = content2.split('<tr>')
-    rows2 = ['<tr>' + part for part in parts2[1:] if part.strip()]
-    
-    # Extract footer
-    footer_pos = max(
-        content1.rfind('</table>'),
-        content1.rfind('</tbody>'),
-        content1.rfind('</html>')
-    )
-    footer = ''
-    if footer_pos >= 0:
-        tag_end = content1.find('>', footer_pos)
-        footer = content1[tag_end + 1:] if tag_end >= 0 else content1[footer_pos:]
-    
-    # Combine
-    combined_content = header + '\n'.join(rows1 + rows2) + footer
-    
-    return combined_content, len(rows1)
+    """
+    Kết hợp 2 file export: file 1 = transfer, file 2 = atm.
+    Không đọc file ngay - trả về báo cáo lazy, khi parse mỗi row được gắn nguồn của file chứa nó.
+    """
+    return CombinedReport([(file1_path, 'transfer'), (file2_path, 'atm')])
 
 # ============================================================================
 # PARSE FILE XLS
 # ============================================================================
 
-def parse_invoices_from_html(content, all_menu_items, name_mapping, price_to_items, is_combined=False):
+def parse_invoices_from_html(content, menu, is_combined=False, boundary=None):
     """
     Parse HTML content và group theo hóa đơn
-    Returns list of invoices
+    menu: index menu từ load_menus()
+    content: nội dung HTML (str), file object đã mở, Path - file được đọc streaming theo chunk,
+             hoặc CombinedReport (từ combine_files) - mỗi row biết nó thuộc file transfer hay atm
+    boundary: (combined, nội dung đã nối sẵn) số hóa đơn của file transfer - các hóa đơn sau là atm.
+              Không cần khi content là CombinedReport.
+    Returns (list Invoice, alcohol_items_found) - Invoice/LineItem đọc được như dict
     """
     
-    # Count total invoices if combined
-    total_invoice_count = 0
-    if is_combined:
-        rows_temp = content.split('<tr>')
-        for temp_row in rows_temp:
-            if re.search(r'rowspan="\d+">(\d{6})</td>', temp_row):
-                total_invoice_count += 1
-    
     invoices = []
     current_invoice = None
     invoice_counter = 0
     alcohol_items_found = []  # Track alcohol items for reporting
     
-    rows = content.split('<tr>')
+    # Hóa đơn combined chưa rõ phương thức thanh toán: (thứ tự hóa đơn, invoice)
+    # Được gán sau khi đọc hết file (khi đã biết tổng số hóa đơn) - không cần quét file 2 lần
+    pending_boundary = []
+    awaiting_boundary = False
     
-    for row in rows:
-        invoice_match = re.search(r'rowspan="\d+">(\d{6})</td>', row)
-        
-        if invoice_match:
-            invoice_num = invoice_match.group(1)
+    name_resolver = get_item_name_resolver(menu)
+    name_resolver.reset_stats()
+    
+    # Tra cứu món theo tên đầy đủ (O(1))
+    menu_by_full_name = menu['by_full_name']
+    price_to_items = menu['price_to_items']
+    
+    # Hash các row nguồn của từng hóa đơn (cùng thứ tự với invoices) - để sổ hóa đơn biết hóa đơn nào đã đổi
+    # Gồm cả version menu: menu đổi thì tên món trong file cũng có thể đổi
+    row_digests = []
+    menu_version = menu['version']
+    
+    for invoice_num, invoice_date, cells, row_source in iter_tagged_rows(content):
+        if invoice_num:
             invoice_counter += 1
             
-            date_match = re.search(r'>(\d{2}/\d{2}/\d{4})</td>', row)
-            invoice_date = date_match.group(1) if date_match else datetime.now().strftime('%d/%m/%Y')
-            
-            cells = re.findall(r'<td[^>]*>(.*?)</td>', row)
-            cells = [re.sub(r'<[^>]+>', '', cell).strip() for cell in cells]
-            
-            discount = 0
-            payment_discount = 0
-            total_amount_pos = -1
+            if not invoice_date:
+                invoice_date = datetime.now().strftime('%d/%m/%Y')
             
-            for i, cell in enumerate(cells):
-                if 15 <= i <= 25:
-                    cell_clean = cell.replace(' ', '').replace(',', '').replace('.', '')
-                    if cell_clean.isdigit() and len(cell_clean) >= 4:
-                        value = float(cell_clean)
-                        if value >= 50000 and total_amount_pos == -1:
-                            total_amount_pos = i
-                            break
+            amounts = invoice_header_amounts(cells)
+            payment_method = header_payment_method(cells)
             
-            if total_amount_pos >= 0:
-                if total_amount_pos + 1 < len(cells):
-                    cell_clean = cells[total_amount_pos + 1].replace(' ', '').replace(',', '').replace('.', '')
-                    if cell_clean.isdigit():
-                        discount = float(cell_clean)
-                
-                if total_amount_pos + 5 < len(cells):
-                    cell_clean = cells[total_amount_pos + 5].replace(' ', '').replace(',', '').replace('.', '').replace('-', '')
-                    if cell_clean.isdigit():
-                        payment_discount = float(cell_clean)
-            
-            final_total = 0
-            if len(cells) > 0:
-                last_cell_clean = cells[-1].replace(' ', '').replace(',', '').replace('.', '')
-                if last_cell_clean.isdigit() and len(last_cell_clean) >= 4:
-                    final_total = float(last_cell_clean)
-            
-            # Detect payment method
-            payment_method = None
-            for cell in cells:
-                cell_upper = cell.upper()
-                if 'ATM (' in cell_upper or cell_upper.startswith('ATM'):
-                    payment_method = 'atm'
-                    break
-                elif 'TRANSFER (' in cell_upper or cell_upper.startswith('TRANSFER'):
-                    payment_method = 'transfer'
-                    break
-            
-            if payment_method is None:
-                row_upper = row.upper()
-                if 'ATM (' in row_upper:
-                    payment_method = 'atm'
-                elif 'TRANSFER (' in row_upper:
-                    payment_method = 'transfer'
+            current_invoice = Invoice(
+                number=len(invoices) + 1,
+                invoice_id=invoice_num,
+                date=invoice_date,
+                discount=amounts['discount'],
+                payment_discount=amounts['payment_discount'],
+                final_total=amounts['final_total'],
+                payment_method=payment_method
+            )
+            invoices.append(current_invoice)
+            row_digests.append(hashlib.sha256(repr(menu_version).encode('utf-8')))
             
-            # Default for combined files: first half = transfer, second half = atm
-            if payment_method is None and is_combined and total_invoice_count > 0:
-                boundary = total_invoice_count // 2
-                payment_method = 'transfer' if invoice_counter <= boundary else 'atm'
+            # Combined: không thấy phương thức trong row → lấy theo file chứa hóa đơn
+            if payment_method is None and is_combined:
+                if row_source:
+                    current_invoice['payment_method'] = row_source
+                elif boundary is not None:
+                    current_invoice['payment_method'] = 'transfer' if invoice_counter <= boundary else 'atm'
             
-            current_invoice = {
-                'number': len(invoices) + 1,
-                'invoice_id': invoice_num,
-                'date': invoice_date,
-                'items': [],
-                'discount': discount,
-                'payment_discount': payment_discount,
-                'final_total': final_total,
-                'payment_method': payment_method
-            }
-            invoices.append(current_invoice)
+            # Combined không rõ nguồn lẫn boundary: đoán first half = transfer, second half = atm
+            awaiting_boundary = current_invoice['payment_method'] is None and is_combined
+            if awaiting_boundary:
+                pending_boundary.append((invoice_counter, current_invoice))
         
         # Extract items
         if current_invoice is not None:
-            if current_invoice.get('payment_method') is None:
-                row_upper = row.upper()
-                if 'ATM (' in row_upper:
-                    current_invoice['payment_method'] = 'atm'
-                elif 'TRANSFER (' in row_upper:
-                    current_invoice['payment_method'] = 'transfer'
-            
-            cells = re.findall(r'<td[^>]*>(.*?)</td>', row)
-            cells = [re.sub(r'<[^>]+>', '', cell).strip() for cell in cells]
+            row_digests[-1].update('\x1f'.join(cells).encode('utf-8') + b'\x1e')
+            if current_invoice.get('payment_method') is None and not awaiting_boundary:
+                current_invoice['payment_method'] = row_payment_method(cells)
             
             # Track items đã parse trong row này để tránh duplicate
             parsed_in_row = set()
@@ -524,21 +365,20 @@ def parse_invoices_from_html(content, all_menu_items, name_mapping, price_to_ite
                     
                     # Mở rộng điều kiện số lượng để không bỏ sót món
                     # Cho phép số lượng từ 1 đến 200
-                    if not (qty_candidate.isdigit() and 1 <= int(qty_candidate) <= 200):
+                    qty = parse_quantity(qty_candidate)
+                    if qty is None:
                         continue
                     
-                    qty = int(qty_candidate)
-                    price_clean = price_candidate.replace(' ', '').replace(',', '').replace('.', '')
+                    price_clean = clean_price(price_candidate)
                     if not price_clean.isdigit():
                         continue
                     
-                    price_value = float(price_clean)
-                    unit = unit_candidate if unit_candidate and not unit_candidate.isdigit() else 'Phần'
+                    price_value = int(price_clean)
+                    unit = cell_unit(unit_candidate)
                     
                     # Bỏ qua các tên không hợp lệ
                     # LƯU Ý: Cho phép tên là số (như "333" là tên bia) nếu có giá và số lượng hợp lệ
-                    if (len(name) < 1 or 
-                        name in ['', 'STT', 'Mã hoá đơn', 'Simple Place']):
+                    if len(name) < 1 or name in NON_ITEM_NAMES:
                         continue
                     
                     # Chỉ bỏ qua tên là số nếu không có context hợp lệ (giá và số lượng)
@@ -546,20 +386,13 @@ def parse_invoices_from_html(content, all_menu_items, name_mapping, price_to_ite
                     if name.isdigit() and (not price_clean.isdigit() or not qty_candidate.isdigit()):
                         continue
                     
-                    skip_patterns = [
-                        r'\bcrispy\b', r'\bsoft\b', r'cut in 4', r'- edit\s*$',
-                        r'đổi phương thức', r'\bpayment\b', r'\btransfer\b',
-                        r'\bcod\b', r'\batm\b', 'background-color', 'vertical-align',
-                        'ghi chú', 'giảm sốt'
-                    ]
-                    if any(re.search(pattern, name.lower()) for pattern in skip_patterns):
+                    if is_skipped_name(name):
                         continue
                     
                     # Mở rộng điều kiện để không bỏ sót món
                     # Cho phép giá từ 500 VND (có thể có món rẻ) đến 2,000,000 VND (có thể có món đắt)
-                    # Cho phép số lượng từ 1 đến 200 (có thể có món order nhiều)
-                    if (price_value >= 500 and price_value <= 2000000 and 
-                        qty >= 1 and qty <= 200 and len(name) > 2):
+                    # Số lượng 1-200 đã kiểm tra ở parse_quantity
+                    if is_item_price(price_value) and len(name) > 2:
                         
                         raw_unit = unit.strip() if unit else ''
                         raw_unit_lower = raw_unit.lower()
@@ -574,15 +407,8 @@ def parse_invoices_from_html(content, all_menu_items, name_mapping, price_to_ite
                         original_name = name.strip()
                         original_name_lower = original_name.lower()
                         
-                        # Match với menu
-                        matched_name = match_menu_name(original_name, all_menu_items, name_mapping)
-                        
-                        # Tự động sửa format nếu không đúng
-                        full_name = fix_item_name_format(matched_name)
-                        
-                        # Đảm bảo format cuối cùng luôn có " / "
-                        if ' / ' not in full_name:
-                            full_name = f"{full_name} / {full_name}"
+                        # Match với menu + sửa format (có cache theo tên gốc)
+                        full_name = name_resolver.resolve(original_name)
                         
                         # Tạo key để check duplicate dựa trên VỊ TRÍ CELL trong row này
                         # Tránh parse cùng 1 cell nhiều lần (do logic loop có thể parse lại)
@@ -607,7 +433,7 @@ def parse_invoices_from_html(content, all_menu_items, name_mapping, price_to_ite
                         # Ngoài ra, Coke (Coca-Cola) THƯỜNG có 10% đường nên cũng tính thuế 10% (giống bia/rượu)
                         # LƯU Ý: Coke Light và Coke Zero có lượng đường < 10g nên tính thuế 8%, KHÔNG phải 10%
                         alcohol_groups = {'BEER & CRAFT BEERS', 'SANGRIA', 'RED', 'WHITE'}
-                        matched_item = next((m for m in all_menu_items if m['name'] == full_name), None)
+                        matched_item = menu_by_full_name.get(full_name)
                         group_name = str(matched_item.get('group', '')).strip().upper() if matched_item else ''
                         is_alcohol = group_name in alcohol_groups
                         
@@ -660,8 +486,8 @@ def parse_invoices_from_html(content, all_menu_items, name_mapping, price_to_ite
                             })
                             
                             # Tính thuế 10% (áp dụng cho cả bia/rượu và Coke 10% đường)
-                            tax_10_percent = price_value * 0.10
-                            total_with_10_tax = price_value * 1.10
+                            tax_10_percent = scale(price_value, 10, 100)
+                            total_with_10_tax = price_value + tax_10_percent
                             
                             print(f"⚠️  PHÁT HIỆN {item_type} - Mã HĐ: {invoice_id} | Món: {full_name} | SL: {qty} | Giá: {price_value:,.0f}đ | Tổng: {original_amount:,.0f}đ")
                             print(f"   Thuế 10%: {tax_10_percent:,.0f}đ | Tổng với thuế 10%: {total_with_10_tax:,.0f}đ")
@@ -670,90 +496,39 @@ def parse_invoices_from_html(content, all_menu_items, name_mapping, price_to_ite
                             # Áp dụng cho cả bia/rượu và Coke 10% đường
                             full_name, clean_unit, adjusted_price = find_replacement_for_alcohol(
                                 full_name, price_value, price_to_items)
+                            added_amount = adjusted_price - price_value
                             price_value = adjusted_price
                             
-                            # Tính lại để kiểm tra
-                            replacement_total_with_8_tax = adjusted_price * 1.08
-                            print(f"   → Đã thay bằng: {full_name} | Giá mới: {price_value:,.0f}đ (đã thêm {tax_10_percent:,.0f}đ = thuế 10% của {item_type.lower()})")
+                            # Tính lại để kiểm tra (cùng cách tính với tổng ghi trên hóa đơn)
+                            replacement_total_with_8_tax = with_vat(adjusted_price)
+                            print(f"   → Đã thay bằng: {full_name} | Giá mới: {price_value:,.0f}đ (đã thêm {added_amount:,.0f}đ, thuế 10% của {item_type.lower()}: {tax_10_percent:,.0f}đ)")
                             print(f"   → Tổng sau thuế 8%: {replacement_total_with_8_tax:,.0f}đ (bằng tổng {item_type.lower()} với thuế 10%: {total_with_10_tax:,.0f}đ)")
                         
-                        current_invoice['items'].append({
-                            'name': full_name,
-                            'quantity': qty,
-                            'unit': clean_unit,
-                            'price': price_value
-                        })
+                        current_invoice['items'].append(LineItem(full_name, qty, clean_unit, price_value))
                         
                 except (ValueError, IndexError):
                     continue
     
-    # Apply discounts
-    for invoice in invoices:
-        if len(invoice['items']) == 0:
-            continue
-            
-        total_discount = invoice['discount'] + invoice['payment_discount']
-        
-        # Bỏ qua giảm giá quá nhỏ (có thể là parse sai)
-        if total_discount > 0 and total_discount < 1000:
-            # Giảm giá < 1000đ có thể là parse sai, bỏ qua
-            continue
-        
-        if total_discount > 0 and len(invoice['items']) > 0:
-            # Tính tổng giá trị tất cả các món
-            total_items_value = sum(item['quantity'] * item['price'] for item in invoice['items'])
-            
-            if total_items_value > 0:
-                # VALIDATION: Chỉ áp dụng giảm giá nếu hợp lý
-                # - Giảm giá không được vượt quá 50% tổng giá trị (tránh parse sai)
-                # - Giảm giá phải nhỏ hơn tổng giá trị
-                max_reasonable_discount = total_items_value * 0.5  # Tối đa 50%
-                
-                if total_discount > max_reasonable_discount:
-                    # Nếu giảm giá quá lớn, có thể là parse sai - bỏ qua
-                    print(f"⚠️  Cảnh báo: Hóa đơn {invoice['invoice_id']} có giảm giá bất thường ({total_discount:,.0f}đ > 50% tổng {total_items_value:,.0f}đ). Bỏ qua phân bổ giảm giá.")
-                    continue
-                
-                if total_discount >= total_items_value:
-                    # Giảm giá >= tổng giá trị là không hợp lý
-                    print(f"⚠️  Cảnh báo: Hóa đơn {invoice['invoice_id']} có giảm giá >= tổng giá trị. Bỏ qua phân bổ giảm giá.")
-                    continue
-                
-                # CHỈ ÁP DỤNG GIẢM GIÁ CHO 1 MÓN (món có giá trị cao nhất)
-                # Tìm món có giá trị cao nhất để áp dụng giảm giá
-                target_item = max(invoice['items'], 
-                                key=lambda x: x['quantity'] * x['price'])
-                
-                target_item_total = target_item['quantity'] * target_item['price']
-                
-                # Đảm bảo giảm giá không vượt quá 90% giá trị món (để giá > 0)
-                max_discount_for_item = min(total_discount, target_item_total * 0.9)
-                
-                # Tính giá mới cho món được chọn
-                new_item_total = target_item_total - max_discount_for_item
-                new_price = max(new_item_total / target_item['quantity'], 1.0)  # Giá tối thiểu là 1 đồng
-                
-                # Áp dụng giá mới
-                old_price = target_item['price']
-                target_item['price'] = new_price
-                
-                # Log thông tin
-                print(f"   💰 HĐ {invoice['invoice_id']}: Áp dụng giảm giá {max_discount_for_item:,.0f}đ cho món '{target_item['name']}' (giá: {old_price:,.0f}đ → {new_price:,.0f}đ)")
-                
-                # Nếu giảm giá còn thừa (do giới hạn 90%), cảnh báo
-                remaining_discount = total_discount - max_discount_for_item
-                if remaining_discount > 1:
-                    print(f"   ⚠️  Cảnh báo: Còn {remaining_discount:,.0f}đ giảm giá chưa được áp dụng (do giới hạn 90% giá trị món)")
-                
-                # Validation: Kiểm tra tổng sau giảm giá có hợp lý không
-                final_total_after_discount = sum(item['quantity'] * item['price'] for item in invoice['items'])
-                # Tính expected_final dựa trên giảm giá thực tế đã áp dụng (có thể nhỏ hơn total_discount nếu bị giới hạn)
-                actual_discount_applied = total_items_value - final_total_after_discount
-                expected_final = total_items_value - max_discount_for_item
-                diff = abs(final_total_after_discount - expected_final)
-                
-                if diff > 1000:  # Chênh lệch > 1000đ là bất thường
-                    print(f"⚠️  Cảnh báo: Hóa đơn {invoice['invoice_id']} sau giảm giá có chênh lệch lớn ({diff:,.0f}đ). Có thể giảm giá bị parse sai.")
+    for invoice, digest in zip(invoices, row_digests):
+        invoice['source_hash'] = digest.hexdigest()
+    
+    # Lưu các tên mới phân giải để lần chạy sau dùng lại
+    name_resolver.save()
+    
+    if pending_boundary:
+        print(f"   ⚠️  {len(pending_boundary)} hóa đơn không rõ phương thức - đoán theo nửa đầu/nửa sau")
+        half = invoice_counter // 2
+        for counter, invoice in pending_boundary:
+            invoice['payment_method'] = 'transfer' if counter <= half else 'atm'
+    
+    if isinstance(content, CombinedReport):
+        counts = content.invoice_counts
+        print(f"   ✓ Theo file: " + " | ".join(f"{source}: {count} hóa đơn" for source, count in counts.items()))
+    
+    # Apply discounts: trừ vào món có thành tiền cao nhất của từng hóa đơn (cả batch một lượt)
+    discount_report = allocate_discounts(invoices)
+    for line in discount_report_lines(discount_report):
+        print(line)
     
     # Filter empty invoices
     invoices = [inv for inv in invoices if len(inv['items']) > 0]
@@ -1147,7 +922,7 @@ def process_grab_invoice():
     
     # Load menus
     print("\n📚 Đang load menu...")
-    all_menu_items, _, _ = load_menus()
+    all_menu_items = load_menus()['all_items']
     
     # Separate Simple Place and Taco Place based on source menu
     simple_menu_items = []
@@ -1237,7 +1012,7 @@ def process_sale_by_payment_method():
     print(f"📂 File 2 (atm): {file2}")
     
     print(f"\n🔗 Đang kết hợp files...")
-    content, _ = combine_files(str(file1_path), str(file2_path))
+    content = combine_files(file1_path, file2_path)
     print(f"   ✓ Đã kết hợp files")
     
     is_combined = True
@@ -1245,12 +1020,12 @@ def process_sale_by_payment_method():
     
     # Load menus
     print(f"\n📚 Đang load menu...")
-    all_menu_items, name_mapping, price_to_items = load_menus()
-    print(f"   ✓ Tổng số món: {len(all_menu_items)}")
+    menu = load_menus()
+    print(f"   ✓ Tổng số món: {len(menu['all_items'])}")
     
     # Parse invoices
     print(f"\n📖 Đang phân tích dữ liệu...")
-    invoices, alcohol_items_found = parse_invoices_from_html(content, all_menu_items, name_mapping, price_to_items, is_combined)
+    invoices, alcohol_items_found = parse_invoices_from_html(content, menu, is_combined)
     print(f"   ✓ Tìm thấy {len(invoices)} hóa đơn")
     
     if len(invoices) == 0:
@@ -1258,7 +1033,7 @@ def process_sale_by_payment_method():
         return
     
     # Process invoices
-    _process_and_save_invoices(invoices, source_type, alcohol_items_found)
+    return _process_and_save_invoices(invoices, source_type, alcohol_items_found)
 
 def process_single_file():
     """Process single file"""
@@ -1291,20 +1066,16 @@ def process_single_file():
     
     print(f"📋 Source type: {source_type}")
     
-    # Load content
-    with open(input_path, 'r', encoding='utf-8', errors='ignore') as f:
-        content = f.read()
-    
     is_combined = 'sale_by_payment_method' in input_path.name.lower()
     
     # Load menus
     print(f"\n📚 Đang load menu...")
-    all_menu_items, name_mapping, price_to_items = load_menus()
-    print(f"   ✓ Tổng số món: {len(all_menu_items)}")
+    menu = load_menus()
+    print(f"   ✓ Tổng số món: {len(menu['all_items'])}")
     
     # Parse invoices
     print(f"\n📖 Đang phân tích dữ liệu...")
-    invoices, alcohol_items_found = parse_invoices_from_html(content, all_menu_items, name_mapping, price_to_items, is_combined)
+    invoices, alcohol_items_found = parse_invoices_from_html(input_path, menu, is_combined)
     print(f"   ✓ Tìm thấy {len(invoices)} hóa đơn")
     
     if len(invoices) == 0:
@@ -1314,16 +1085,72 @@ def process_single_file():
     # Process invoices
     _process_and_save_invoices(invoices, source_type, alcohol_items_found)
 
+def process_data_folder(data_dir):
+    """
+    Xử lý file export trong data_dir (web control panel + watcher thư mục data/):
+    có đủ 2 file sale_by_payment_method thì kết hợp, không thì lấy file báo cáo đầu tiên.
+
+    Returns: tóm tắt của _process_and_save_invoices, None nếu không có file nào
+    """
+    data_dir = Path(data_dir)
+    file_combined_1 = data_dir / DEFAULT_FILE1
+    file_combined_2 = data_dir / DEFAULT_FILE2
+
+    if file_combined_1.exists() and file_combined_2.exists():
+        print(f"\n📂 Using {data_dir.name}/: {file_combined_1.name} + {file_combined_2.name}")
+        report_progress(stage='parse', sources=[file_combined_1.name, file_combined_2.name])
+        content = combine_files(file_combined_1, file_combined_2)
+        menu = load_menus()
+        invoices, alcohol_items_found = parse_invoices_from_html(content, menu, True)
+        return _process_and_save_invoices(invoices, 'combined', alcohol_items_found)
+
+    # Single file path: pick the first .xls/.html-like file
+    data_files = sorted([p for p in data_dir.glob('*') if p.is_file()])
+    preferred_exts = ['.xls', '.xlsx', '.html', '.htm']
+    candidates = [p for p in data_files if p.suffix.lower() in preferred_exts]
+    if not candidates and data_files:
+        candidates = data_files[:1]
+    if not candidates:
+        print(f"❌ No input files found in {data_dir.name}/ folder")
+        return None
+
+    input_path = candidates[0]
+    print(f"\n📂 Using {data_dir.name}/: {input_path.name}")
+    report_progress(stage='parse', sources=[input_path.name])
+    menu = load_menus()
+    is_combined = 'sale_by_payment_method' in input_path.name.lower()
+    invoices, alcohol_items_found = parse_invoices_from_html(input_path, menu, is_combined)
+    # Detect source type from filename
+    name_lower = input_path.name.lower()
+    if 'atm' in name_lower:
+        source_type = 'atm'
+    elif 'transfer' in name_lower:
+        source_type = 'transfer'
+    else:
+        source_type = input_path.stem
+    return _process_and_save_invoices(invoices, source_type, alcohol_items_found)
+
 def _process_and_save_invoices(invoices, source_type, alcohol_items_found=None):
-    """Helper function để process và save invoices"""
+    """
+    Helper function để process và save invoices
+
+    Returns: tóm tắt {'invoices', 'files_written', 'unchanged', 'write_errors', 'validation_warnings', 'dropped'}
+    """
     output_dir = script_dir / OUTPUT_DIR
     output_dir.mkdir(exist_ok=True)
+    report_progress(stage='calculate', invoices=len(invoices))
     
     print(f"\n📝 Đang tạo file cho từng hóa đơn...")
     print(f"    {'ID':<10} {'Món':<5} {'Tổng tiền':<15} {'Giảm giá':<30} {'Validate':<10}")
     print("   " + "-" * 80)
     
     total_created = 0
+    totals_with_vat = array('q')  # Tổng có VAT (đồng) của từng hóa đơn
+    write_jobs = []  # (invoice, filename, tổng, tổng có VAT, phương thức) - ghi song song sau khi tính xong tất cả hóa đơn
+    fingerprints = {}  # filename -> fingerprint của hóa đơn cần ghi
+    unchanged_count = 0
+    replaced_files = []  # file cũ của hóa đơn đã đổi tên (tổng tiền / phương thức đổi)
+    ledger = open_ledger(PROJECT_ROOT / LEDGER_FILE, output_dir) if INCREMENTAL_PROCESSING else None
     validation_warnings = []
     alcohol_invoices_info = []  # Track invoices with alcohol for summary file
     
@@ -1336,17 +1163,23 @@ def _process_and_save_invoices(invoices, source_type, alcohol_items_found=None):
         # Phí dịch vụ = 8% của tổng bill TRƯỚC khi có phí dịch vụ (chưa có VAT)
         add_service_fee_to_invoice(invoice)
         
-        # Bước 2: Tính tổng bill sau khi đã có phí dịch vụ (chưa có VAT)
-        total = sum(item['quantity'] * item['price'] for item in invoice['items'])
+        # Bước 2: Tính tổng bill sau khi đã có phí dịch vụ (chưa có VAT, số đồng nguyên)
+        total = items_total(invoice['items'])
         
-        # Bước 3: Tính VAT 8% trên tổng bill đã có phí dịch vụ
-        final_with_tax = total * 1.08
-        total_str = f"{int(final_with_tax):,}".replace(',', '.')
+        # Bước 3: Tính VAT 8% trên tổng bill đã có phí dịch vụ (bỏ phần lẻ)
+        final_with_tax = with_vat(total)
+        totals_with_vat.append(final_with_tax)
+        total_str = format_dong(final_with_tax)
         
         invoice_source_type = invoice.get('payment_method') or source_type
         
         filename = output_dir / f"{invoice['invoice_id']} - {invoice_source_type} - {total_str}đ.xlsx"
-        create_invoice_file(invoice, str(filename))
+        fingerprint = invoice_fingerprint(invoice, SERVICE_FEE_ENABLED, SERVICE_FEE_PERCENTAGE, SERVICE_FEE_NAME, SERVICE_FEE_UNIT)
+        if ledger is not None and ledger.is_current(invoice['invoice_id'], fingerprint, filename.name):
+            unchanged_count += 1
+        else:
+            write_jobs.append((invoice, filename, total, final_with_tax, invoice_source_type))
+            fingerprints[filename.name] = fingerprint
         
         # Track if this invoice has alcohol
         if alcohol_items_found:
@@ -1360,11 +1193,12 @@ def _process_and_save_invoices(invoices, source_type, alcohol_items_found=None):
                     'payment_method': invoice_source_type
                 })
         
-        expected_final = total * 1.08
+        # Fabi làm tròn thành tiền cuối theo cách riêng, with_vat() bỏ phần lẻ → chỉ cho lệch 1đ
+        expected_final = final_with_tax
         validation_status = "✓"
         if invoice['final_total'] > 0:
             diff = abs(expected_final - invoice['final_total'])
-            if diff > 10:
+            if diff > FINAL_TOTAL_ROUNDING:
                 validation_status = f"⚠️ ±{diff:,.0f}"
                 validation_warnings.append({
                     'id': invoice['invoice_id'],
@@ -1380,7 +1214,63 @@ def _process_and_save_invoices(invoices, source_type, alcohol_items_found=None):
             discount_info = f"GG: {invoice['discount']:>7,.0f} + CK: {invoice['payment_discount']:>7,.0f}"
         
         print(f"   #{invoice['invoice_id']:<10} {len(invoice['items']):>3}  {total:>13,.0f}đ  {discount_info:<30} {validation_status}")
-        total_created += 1
+    
+    # Ghi file Excel trên nhiều process - lỗi của từng file không làm dừng cả batch
+    report_progress(stage='write', files_to_write=len(write_jobs), files_written=0, unchanged=unchanged_count)
+    write_errors = write_invoice_files(
+        [(invoice, filename) for invoice, filename, *_ in write_jobs],
+        create_invoice_file_fast,
+        workers=INVOICE_WRITER_WORKERS,
+        progress=lambda done, total: report_progress(files_written=done),
+    )
+    total_created = len(write_jobs) - len(write_errors)
+    failed_files = {err['file'] for err in write_errors}
+    
+    if ledger is not None:
+        current_files = {filename.name for _, filename, *_ in write_jobs}
+        for invoice, filename, *_ in write_jobs:
+            fingerprint = fingerprints.get(filename.name)
+            if str(filename) in failed_files or fingerprint is None:
+                continue
+            # Hóa đơn đổi tổng tiền / phương thức → tên file khác: xóa file cũ để không upload trùng
+            previous = ledger.previous_filename(invoice['invoice_id'])
+            if previous and previous != filename.name and previous not in current_files:
+                try:
+                    (output_dir / previous).unlink()
+                    replaced_files.append(previous)
+                except FileNotFoundError:
+                    pass
+            ledger.record(invoice['invoice_id'], fingerprint, filename.name, invoice.get('date', ''))
+        
+        # Hóa đơn trong sổ (cùng ngày với lần chạy này) nhưng không còn trong báo cáo:
+        # còn file → báo lại (mỗi lần chạy cho đến khi file được xóa), hết file → bỏ khỏi sổ
+        dropped = []
+        forgotten = []
+        for invoice_id, dropped_file in ledger.missing_from({invoice['invoice_id'] for invoice in invoices},
+                                                            {invoice.get('date', '') for invoice in invoices}):
+            if (output_dir / dropped_file).exists():
+                dropped.append((invoice_id, dropped_file))
+            else:
+                forgotten.append(invoice_id)
+        ledger.forget(forgotten)
+        ledger.close()
+    else:
+        dropped = []
+    
+    if WRITE_INVOICE_MANIFEST:
+        manifest_records = [
+            build_record(filename, invoice, invoice_item_rows(invoice), total, final_with_tax, invoice_source_type)
+            for invoice, filename, total, final_with_tax, invoice_source_type in write_jobs
+            if str(filename) not in failed_files
+        ]
+        write_manifest(output_dir, manifest_records)
+    if write_errors:
+        print("\n" + "❌ " + "=" * 68)
+        print(f"   LỖI: Không ghi được {len(write_errors)} file:")
+        print("   " + "-" * 68)
+        for err in write_errors:
+            print(f"   Invoice #{err['invoice_id']}: {Path(err['file']).name} → {err['error']}")
+        print("   " + "=" * 68)
     
     # Show warnings
     if validation_warnings:
@@ -1400,8 +1290,32 @@ def _process_and_save_invoices(invoices, source_type, alcohol_items_found=None):
     print(f"✅ HOÀN THÀNH!")
     print(f"📁 Thư mục: {OUTPUT_DIR}/")
     print(f"📊 Tổng số file: {total_created}")
+    if unchanged_count:
+        print(f"♻️  Giữ nguyên: {unchanged_count} hóa đơn không đổi so với lần chạy trước")
+    if replaced_files:
+        print(f"🔄 Đã xóa {len(replaced_files)} file cũ của hóa đơn đã thay đổi")
+    if dropped:
+        print(f"🗑  {len(dropped)} hóa đơn không còn trong báo cáo (file vẫn giữ, vui lòng kiểm tra):")
+        for invoice_id, dropped_file in dropped:
+            print(f"   - {invoice_id}: {dropped_file}")
+    print(f"💵 Tổng tiền (có VAT): {format_dong(sum(totals_with_vat))}đ")
+    resolution_stats = current_resolution_stats()
+    if resolution_stats:
+        print(f"🔁 Cache tên món: {resolution_stats['memory_hits']} hit (RAM) | "
+              f"{resolution_stats['disk_hits']} hit (đĩa) | {resolution_stats['misses']} miss")
     print("=" * 70)
 
+    summary = {
+        'invoices': len(invoices),
+        'files_written': total_created,
+        'unchanged': unchanged_count,
+        'write_errors': len(write_errors),
+        'validation_warnings': len(validation_warnings),
+        'dropped': len(dropped),
+    }
+    report_progress(stage='done', **summary)
+    return summary
+
 # ============================================================================
 # TẠO FILE EXCEL TỔNG HỢP BIA/RƯỢU
 # ============================================================================
@@ -1562,17 +1476,15 @@ def add_service_fee_to_invoice(invoice):
     
     # Bước 1: Tính tổng giá trị các món ăn (TRƯỚC khi thêm phí dịch vụ, chưa có VAT)
     # LƯU Ý: Tổng bill này đã bao gồm các món đã được thay thế bia/rượu (nếu có)
-    total_bill_before_service_fee = sum(item['quantity'] * item['price'] for item in invoice['items'])
+    total_bill_before_service_fee = items_total(invoice['items'])
     
     # Nếu không có món nào, không thêm phí dịch vụ
     if total_bill_before_service_fee <= 0:
         return False
     
     # Bước 2: Tính phí dịch vụ = 8% của tổng bill (chưa có VAT, chưa có phí dịch vụ)
-    service_fee_amount = total_bill_before_service_fee * SERVICE_FEE_PERCENTAGE
-    
     # Làm tròn về số nguyên (VND)
-    service_fee_amount = round(service_fee_amount)
+    service_fee_amount = rate_of(total_bill_before_service_fee, SERVICE_FEE_PERCENTAGE)
     
     # Nếu phí dịch vụ = 0, không thêm
     if service_fee_amount <= 0:
@@ -1602,6 +1514,27 @@ def add_service_fee_to_invoice(invoice):
 # TẠO FILE EXCEL
 # ============================================================================
 
+def invoice_item_rows(invoice):
+    """Giá trị các cột Ten_san_pham, Don_vi_tinh, So_luong, Don_gia cho từng món"""
+    rows = []
+    for item in invoice['items']:
+        # Đảm bảo tên món có format đúng trước khi ghi vào file
+        item_name = item['name']
+        
+        # Phí dịch vụ không cần format "Tiếng Việt / Tiếng Anh", giữ nguyên tên
+        is_service_fee = item_name == SERVICE_FEE_NAME or 'Phí dịch vụ' in item_name
+        
+        if not is_service_fee:
+            if ' / ' not in item_name:
+                item_name = fix_item_name_format(item_name)
+                if ' / ' not in item_name:
+                    item_name = f"{item_name} / {item_name}"
+        
+        # Phí dịch vụ: để trống đơn vị, nhưng vẫn có số lượng = 1
+        unit_value = item['unit'] if item['unit'] else ''
+        rows.append((item_name, unit_value, float(item['quantity']), float(item['price'])))
+    return rows
+
 def create_invoice_file(invoice, output_file):
     """Tạo file Excel"""
     workbook = xlsxwriter.Workbook(output_file)
@@ -1622,31 +1555,26 @@ def create_invoice_file(invoice, output_file):
     for col, header in enumerate(headers):
         worksheet.write(0, col, header, header_format)
     
-    for row_idx, item in enumerate(invoice['items'], 1):
-        # Đảm bảo tên món có format đúng trước khi ghi vào file
-        item_name = item['name']
-        
-        # Phí dịch vụ không cần format "Tiếng Việt / Tiếng Anh", giữ nguyên tên
-        is_service_fee = item_name == SERVICE_FEE_NAME or 'Phí dịch vụ' in item_name
-        
-        if not is_service_fee:
-            if ' / ' not in item_name:
-                item_name = fix_item_name_format(item_name)
-                if ' / ' not in item_name:
-                    item_name = f"{item_name} / {item_name}"
-        
+    for row_idx, (item_name, unit_value, quantity, price) in enumerate(invoice_item_rows(invoice), 1):
         worksheet.write(row_idx, 0, 1, cell_format)
         worksheet.write(row_idx, 1, '', cell_format)
         worksheet.write(row_idx, 2, item_name, cell_format)
-        # Phí dịch vụ: để trống đơn vị, nhưng vẫn có số lượng = 1
-        unit_value = item['unit'] if item['unit'] else ''
         worksheet.write(row_idx, 3, unit_value, cell_format)
         # Số lượng = 1 cho phí dịch vụ
-        worksheet.write(row_idx, 4, float(item['quantity']), number_format)
-        worksheet.write(row_idx, 5, float(item['price']), number_format)
+        worksheet.write(row_idx, 4, quantity, number_format)
+        worksheet.write(row_idx, 5, price, number_format)
     
     workbook.close()
 
+def create_invoice_file_fast(invoice, output_file):
+    """
+    Tạo file Excel từ template dựng sẵn (cùng nội dung với create_invoice_file, nhanh hơn nhiều).
+    Tự dùng create_invoice_file nếu template không dùng được hoặc hóa đơn có giá trị đặc biệt.
+    """
+    template = get_invoice_template(create_invoice_file, invoice_item_rows) if INVOICE_XLSX_TEMPLATE else None
+    if template is None or not template.write(invoice_item_rows(invoice), output_file):
+        create_invoice_file(invoice, output_file)
+
 # ============================================================================
 # MAIN FUNCTION
 # ============================================================================
@@ -1669,11 +1597,7 @@ def main():
         
         # Load menus
         print(f"\n📚 Đang load menu...")
-        all_menu_items, name_mapping, price_to_items = load_menus()
-        
-        # Load content
-        with open(input_path, 'r', encoding='utf-8', errors='ignore') as f:
-            content = f.read()
+        menu = load_menus()
         
         input_basename = input_path.name.lower()
         if 'atm' in input_basename:
@@ -1684,7 +1608,8 @@ def main():
             source_type = input_path.stem
         
         is_combined = 'sale_by_payment_method' in input_path.name.lower()
-        invoices, alcohol_items_found = parse_invoices_from_html(content, all_menu_items, name_mapping, price_to_items, is_combined)
+        # File được đọc streaming trong lúc parse
+        invoices, alcohol_items_found = parse_invoices_from_html(input_path, menu, is_combined)
         _process_and_save_invoices(invoices, source_type, alcohol_items_found)
         return
     
@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+"""
+ĐỌC FILE BÁO CÁO FABI (sale_by_payment_method.xls)
+==================================================
+File .xls export từ Fabi thực chất là một bảng HTML. Module này tách bảng thành
+từng row/cell theo kiểu streaming (một lượt, đọc theo từng chunk) để không phải
+giữ toàn bộ file trong bộ nhớ hay split thành các list chuỗi lớn.
+
+Mỗi row được trả về dạng (invoice_id, date, cells):
+- invoice_id: mã hóa đơn 6 số nếu row là dòng đầu của hóa đơn, ngược lại None
+- date: ngày 'dd/mm/yyyy' của hóa đơn (chỉ có ở dòng đầu), ngược lại None
+- cells: list text của các ô <td> (đã bỏ tag con và strip)
+
+Hai file export (transfer + ATM) được đọc nối tiếp qua CombinedReport: mỗi file được
+mmap và decode dần theo chunk, mỗi row được gắn nguồn ('transfer' / 'atm') của file chứa nó.
+
+File trên đĩa chỉ được tokenize một lần: trong lúc stream, các row được pickle dần
+(từng lô CACHE_BATCH_ROWS row) vào .report-cache/<sha256 nội dung file>.pickle; lần sau
+stream_report_rows đọc lại từng lô từ file pickle đó. Cả 2 chiều đều không giữ cả báo cáo
+trong bộ nhớ. Chỉ load_report (script kiểm tra / debug cần truy cập theo hóa đơn) mới gom
+các row thành ParsedReport.
+"""
+
+import codecs
+import hashlib
+import mmap
+import os
+import pickle
+import re
+import sys
+from collections import namedtuple
+from html.parser import HTMLParser
+from pathlib import Path
+
+from automation.line_items import clean_price
+
+CHUNK_SIZE = 1 << 16
+
+# Tăng số này mỗi khi tokenizer / định dạng file cache thay đổi để cache cũ tự động bị bỏ
+REPORT_FORMAT_VERSION = 2
+REPORT_CACHE_DIR = Path(__file__).resolve().parent.parent / '.report-cache'
+MAX_CACHED_REPORTS = 32
+
+# Số row trong 1 lô pickle của file cache
+CACHE_BATCH_ROWS = 512
+_CACHE_MAGIC = 'sale-report-rows'
+
+INVOICE_ID_RE = re.compile(r'\d{6}')
+DATE_RE = re.compile(r'\d{2}/\d{2}/\d{4}')
+
+# ============================================================================
+# TOKENIZER
+# ============================================================================
+
+class _RowTokenizer(HTMLParser):
+    """Gom text của các ô <td> theo từng <tr>; row hoàn chỉnh được đẩy vào self.rows"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.rows = []
+        self._cells = None
+        self._cell_parts = None
+        self._cell_has_rowspan = False
+        self._invoice_id = None
+        self._date = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'tr':
+            self._end_row()
+            self._start_row()
+        elif tag == 'td':
+            self._end_cell()
+            if self._cells is None:
+                self._start_row()
+            self._cell_parts = []
+            self._cell_has_rowspan = any(name == 'rowspan' for name, _ in attrs)
+
+    def handle_endtag(self, tag):
+        if tag == 'td':
+            self._end_cell()
+        elif tag in ('tr', 'tbody', 'table'):
+            self._end_row()
+
+    def handle_data(self, data):
+        if self._cell_parts is not None:
+            self._cell_parts.append(data)
+
+    def close(self):
+        super().close()
+        self._end_row()
+
+    def _start_row(self):
+        self._cells = []
+        self._invoice_id = None
+        self._date = None
+
+    def _end_cell(self):
+        if self._cell_parts is None:
+            return
+        raw = ''.join(self._cell_parts)
+        self._cell_parts = None
+        # Dòng đầu hóa đơn: ô có rowspan chứa đúng 6 chữ số
+        if self._invoice_id is None and self._cell_has_rowspan and INVOICE_ID_RE.fullmatch(raw):
+            self._invoice_id = raw
+        if self._date is None and DATE_RE.fullmatch(raw):
+            self._date = raw
+        self._cells.append(raw.strip())
+
+    def _end_row(self):
+        self._end_cell()
+        if self._cells is None:
+            return
+        if self._cells:
+            self.rows.append((self._invoice_id, self._date, self._cells))
+        self._cells = None
+
+# ============================================================================
+# API
+# ============================================================================
+
+def _iter_chunks(source, chunk_size):
+    if isinstance(source, str):
+        for start in range(0, len(source), chunk_size):
+            yield source[start:start + chunk_size]
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        data = bytes(source).decode('utf-8', errors='ignore')
+        yield from _iter_chunks(data, chunk_size)
+    elif hasattr(source, 'read'):
+        for chunk in iter(lambda: source.read(chunk_size), ''):
+            yield chunk
+    else:
+        yield from _iter_mapped_chunks(os.fspath(source), chunk_size)
+
+def _iter_mapped_chunks(path, chunk_size):
+    """Decode file theo từng chunk qua mmap - bộ nhớ không tăng theo kích thước file"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+            for start in range(0, len(mapped), chunk_size):
+                text = decoder.decode(mapped[start:start + chunk_size])
+                if text:
+                    yield text
+            text = decoder.decode(b'', final=True)
+            if text:
+                yield text
+
+def iter_report_rows(source, chunk_size=CHUNK_SIZE):
+    """
+    Yield (invoice_id, date, cells) cho từng <tr> trong báo cáo.
+
+    source có thể là:
+    - nội dung HTML (str)
+    - file object đã mở ở text mode (đọc theo chunk, không đọc hết file)
+    - đường dẫn (Path) - không qua cache, dùng stream_report_rows nếu muốn cache
+    """
+    tokenizer = _RowTokenizer()
+    for chunk in _iter_chunks(source, chunk_size):
+        tokenizer.feed(chunk)
+        if tokenizer.rows:
+            rows, tokenizer.rows = tokenizer.rows, []
+            yield from rows
+    tokenizer.close()
+    yield from tokenizer.rows
+
+# ============================================================================
+# CACHE ROW TRÊN ĐĨA (STREAMING)
+# ============================================================================
+
+# cells là tuple các chuỗi đã intern (các ô lặp lại như 'Phần' chỉ giữ 1 bản)
+ReportRow = namedtuple('ReportRow', ['invoice_id', 'date', 'cells'])
+
+def _compact_rows(rows):
+    intern = sys.intern
+    for invoice_id, date, cells in rows:
+        yield ReportRow(invoice_id, date, tuple(intern(cell) for cell in cells))
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Lỗi có thể gặp khi đọc file cache hỏng / của phiên bản khác
+_CACHE_ERRORS = (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError, AttributeError, ImportError)
+
+def _open_cache(cache_path, sha256):
+    """File cache đã mở, đứng sau header (cùng phiên bản + sha256); None nếu chưa có / không dùng được"""
+    try:
+        f = open(cache_path, 'rb')
+    except OSError:
+        return None
+    try:
+        header = pickle.load(f)
+    except _CACHE_ERRORS:
+        f.close()
+        return None
+    if header != (_CACHE_MAGIC, REPORT_FORMAT_VERSION, sha256):
+        f.close()
+        return None
+    # Đánh dấu vừa dùng để không bị dọn khi cache đầy
+    try:
+        os.utime(cache_path)
+    except OSError:
+        pass
+    return f
+
+def _iter_cached_rows(f, cache_path):
+    """Các row trong file cache, đọc từng lô; lô cuối là [] (thiếu → file hỏng, bị xóa)"""
+    with f:
+        while True:
+            try:
+                batch = pickle.load(f)
+            except _CACHE_ERRORS:
+                _remove_cache(cache_path)
+                raise
+            if not batch:
+                return
+            yield from batch
+
+def _remove_cache(cache_path):
+    try:
+        os.unlink(cache_path)
+    except OSError:
+        pass
+
+class _CacheWriter:
+    """Ghi dần các lô row ra file tạm; commit() mới rename thành file cache (dừng giữa chừng → bỏ file tạm)"""
+
+    def __init__(self, cache_dir, cache_path, sha256):
+        self.cache_dir = cache_dir
+        self.cache_path = cache_path
+        self.tmp_path = cache_path.with_name(cache_path.name + f'.{os.getpid()}.{id(self)}.tmp')
+        self._file = None
+        try:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.tmp_path, 'wb')
+            pickle.dump((_CACHE_MAGIC, REPORT_FORMAT_VERSION, sha256), self._file, protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError as e:
+            self._fail(e)
+
+    def _fail(self, error):
+        print(f"⚠️  Không ghi được cache báo cáo ({self.cache_path.name}): {error}")
+        self.close()
+
+    def write(self, batch):
+        if self._file is None:
+            return
+        try:
+            pickle.dump(batch, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError as e:
+            self._fail(e)
+
+    def commit(self):
+        if self._file is None:
+            return
+        try:
+            pickle.dump([], self._file, protocol=pickle.HIGHEST_PROTOCOL)
+            self._file.close()
+            self._file = None
+            self.tmp_path.replace(self.cache_path)
+        except OSError as e:
+            self._fail(e)
+            return
+        _prune_cache(self.cache_dir)
+
+    def close(self):
+        """Bỏ file tạm nếu chưa commit"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        _remove_cache(self.tmp_path)
+
+def _prune_cache(cache_dir):
+    """Chỉ giữ MAX_CACHED_REPORTS file cache dùng gần nhất"""
+    try:
+        entries = [entry for entry in os.scandir(cache_dir) if entry.name.endswith('.pickle')]
+        if len(entries) <= MAX_CACHED_REPORTS:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime_ns, reverse=True)
+        for entry in entries[MAX_CACHED_REPORTS:]:
+            os.unlink(entry.path)
+    except OSError:
+        pass
+
+def _stream_rows(path, sha256, cache_dir):
+    cache_path = None
+    if cache_dir is not None:
+        cache_dir = Path(cache_dir)
+        cache_path = cache_dir / f'{sha256}.pickle'
+        cached = _open_cache(cache_path, sha256)
+        if cached is not None:
+            yield from _iter_cached_rows(cached, cache_path)
+            return
+
+    rows = _compact_rows(iter_report_rows(path))
+    if cache_path is None:
+        yield from rows
+        return
+
+    writer = _CacheWriter(cache_dir, cache_path, sha256)
+    try:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= CACHE_BATCH_ROWS:
+                writer.write(batch)
+                batch = []
+            yield row
+        if batch:
+            writer.write(batch)
+        writer.commit()
+    finally:
+        writer.close()
+
+def stream_report_rows(path, cache_dir=REPORT_CACHE_DIR):
+    """
+    Yield ReportRow của file báo cáo trên đĩa, không giữ cả báo cáo trong bộ nhớ.
+
+    Đã có cache (cùng sha256 nội dung) → đọc từng lô từ .report-cache/; chưa có → tokenize
+    file và ghi cache trong lúc stream (cache chỉ được giữ khi duyệt hết file).
+    cache_dir=None → không dùng cache trên đĩa.
+    """
+    path = Path(path)
+    return _stream_rows(path, _file_sha256(path), cache_dir)
+
+# ============================================================================
+# BÁO CÁO ĐÃ PARSE (TRUY CẬP THEO HÓA ĐƠN)
+# ============================================================================
+
+# Vị trí 1 hóa đơn trong report: rows[start:end] (rows[start] là dòng đầu hóa đơn)
+InvoiceSpan = namedtuple('InvoiceSpan', ['invoice_id', 'date', 'start', 'end'])
+
+class ParsedReport:
+    """Báo cáo đã tokenize trong bộ nhớ: các row theo thứ tự file + vị trí từng hóa đơn"""
+
+    __slots__ = ('sha256', 'rows', 'invoices')
+
+    def __init__(self, sha256, rows):
+        self.sha256 = sha256
+        self.rows = rows
+        self.invoices = _invoice_spans(rows)
+
+    def invoice_rows(self, span):
+        return self.rows[span.start:span.end]
+
+def _invoice_spans(rows):
+    """Mỗi hóa đơn kéo dài từ dòng đầu của nó đến trước dòng đầu hóa đơn kế tiếp"""
+    spans = []
+    current = None
+    for index, row in enumerate(rows):
+        if row.invoice_id:
+            if current:
+                spans.append(InvoiceSpan(current.invoice_id, current.date, current.start, index))
+            current = InvoiceSpan(row.invoice_id, row.date, index, None)
+    if current:
+        spans.append(InvoiceSpan(current.invoice_id, current.date, current.start, len(rows)))
+    return spans
+
+def load_report(path, cache_dir=REPORT_CACHE_DIR):
+    """
+    ParsedReport của file báo cáo (đọc qua stream_report_rows, nên cũng dùng / ghi cache trên đĩa).
+    Giữ cả báo cáo trong bộ nhớ - chỉ dùng khi cần truy cập theo hóa đơn; xử lý tuần tự thì
+    dùng stream_report_rows / CombinedReport.
+    """
+    path = Path(path)
+    sha256 = _file_sha256(path)
+    return ParsedReport(sha256, list(_stream_rows(path, sha256, cache_dir)))
+
+def report_rows(source):
+    """Các row của báo cáo (stream): file trên đĩa qua cache, nội dung / file object thì tokenize trực tiếp"""
+    if isinstance(source, os.PathLike):
+        return stream_report_rows(source)
+    return iter_report_rows(source)
+
+# ============================================================================
+# ĐỌC NHIỀU FILE / DÒNG ĐẦU HÓA ĐƠN
+# ============================================================================
+
+class CombinedReport:
+    """
+    Nhiều file báo cáo đọc nối tiếp như một báo cáo (lazy - stream từng row khi duyệt).
+    Duyệt cho ra (invoice_id, date, cells, source) với source là nguồn của file chứa row.
+    """
+
+    def __init__(self, sources, cache_dir=REPORT_CACHE_DIR):
+        # sources: list (đường dẫn, nguồn) theo thứ tự đọc - str ở đây luôn là đường dẫn
+        self.sources = [(Path(path), source) for path, source in sources]
+        self.cache_dir = cache_dir
+        # Số hóa đơn của từng nguồn - có sau khi duyệt xong
+        self.invoice_counts = {}
+
+    def __iter__(self):
+        self.invoice_counts = {source: 0 for _, source in self.sources}
+        for path, source in self.sources:
+            for invoice_id, date, cells in stream_report_rows(path, self.cache_dir):
+                if invoice_id:
+                    self.invoice_counts[source] += 1
+                yield invoice_id, date, cells, source
+
+def iter_tagged_rows(content, source=None):
+    """
+    Yield (invoice_id, date, cells, source) cho mọi loại input của parser:
+    CombinedReport giữ nguồn của từng file, input khác dùng chung source truyền vào.
+    """
+    if isinstance(content, CombinedReport):
+        yield from content
+        return
+    for invoice_id, date, cells in report_rows(content):
+        yield invoice_id, date, cells, source
+
+def row_payment_method(cells):
+    """Nhận diện phương thức thanh toán ghi trong row ('ATM (' / 'TRANSFER (')"""
+    row_upper = '\n'.join(cells).upper()
+    if 'ATM (' in row_upper:
+        return 'atm'
+    if 'TRANSFER (' in row_upper:
+        return 'transfer'
+    return None
+
+def header_payment_method(cells):
+    """Phương thức thanh toán ghi trong một ô của dòng đầu hóa đơn"""
+    for cell in cells:
+        cell_upper = cell.upper()
+        if 'ATM (' in cell_upper or cell_upper.startswith('ATM'):
+            return 'atm'
+        elif 'TRANSFER (' in cell_upper or cell_upper.startswith('TRANSFER'):
+            return 'transfer'
+    return None
+
+def invoice_header_amounts(cells):
+    """
+    Các số tiền trên dòng đầu hóa đơn:
+        {'total', 'discount', 'payment_discount', 'final_total'}
+    Tổng tiền là ô đầu tiên trong cột 15-25 có giá trị >= 50,000; giảm giá nằm ngay sau nó,
+    chiết khấu thanh toán cách 5 ô; thành tiền cuối là ô cuối cùng của row.
+    """
+    total = 0
+    discount = 0
+    payment_discount = 0
+    total_amount_pos = -1
+
+    for i, cell in enumerate(cells):
+        if 15 <= i <= 25:
+            cell_clean = clean_price(cell)
+            if cell_clean.isdigit() and len(cell_clean) >= 4:
+                value = int(cell_clean)
+                if value >= 50000:
+                    total = value
+                    total_amount_pos = i
+                    break
+
+    if total_amount_pos >= 0:
+        if total_amount_pos + 1 < len(cells):
+            cell_clean = clean_price(cells[total_amount_pos + 1])
+            if cell_clean.isdigit():
+                discount = int(cell_clean)
+
+        if total_amount_pos + 5 < len(cells):
+            cell_clean = clean_price(cells[total_amount_pos + 5]).replace('-', '')
+            if cell_clean.isdigit():
+                payment_discount = int(cell_clean)
+
+    final_total = 0
+    if len(cells) > 0:
+        last_cell_clean = clean_price(cells[-1])
+        if last_cell_clean.isdigit() and len(last_cell_clean) >= 4:
+            final_total = int(last_cell_clean)
+
+    return {
+        'total': total,
+        'discount': discount,
+        'payment_discount': payment_discount,
+        'final_total': final_total,
+    }
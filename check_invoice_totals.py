@@ -4,10 +4,13 @@ Kiểm tra tổng tiền các món trong tất cả file hóa đơn
 Xem có khớp với tổng tiền trong tên file không
 """
 
-import openpyxl
+from array import array
 from pathlib import Path
 import re
 
+from automation.invoice_manifest import iter_item_lines, load_invoice_records
+from automation.money import line_amount, with_vat
+
 def extract_total_from_filename(filename):
     """Trích xuất tổng tiền từ tên file (VD: 240002 - transfer - 642.600đ.xlsx -> 642600)"""
     # Tìm số cuối cùng trước "đ" hoặc "đ.xlsx"
@@ -15,7 +18,7 @@ def extract_total_from_filename(filename):
     if match:
         total_str = match.group(1).replace('.', '').replace(',', '')
         try:
-            return float(total_str)
+            return int(total_str)
         except:
             return None
     return None
@@ -37,90 +40,80 @@ def check_invoice_totals():
     issues = []
     total_files = 0
     correct_files = 0
+    all_totals = array('q')  # Tổng có VAT (đồng) của từng file
+    all_items_counts = []
     
-    for invoice_file in sorted(tax_dir.glob("*.xlsx")):
-        if invoice_file.name.startswith('.'):
-            continue
-            
+    # Đọc từ manifest (file nào không có / đã bị sửa thì đọc lại bằng openpyxl)
+    for record in load_invoice_records(tax_dir):
         total_files += 1
-        try:
-            wb = openpyxl.load_workbook(invoice_file)
-            ws = wb.active
-            
-            # Lấy số hóa đơn từ tên file
-            invoice_number = invoice_file.stem.split(' - ')[0] if ' - ' in invoice_file.stem else invoice_file.stem
-            
-            # Trích xuất tổng tiền từ tên file (đã bao gồm VAT 8%)
-            expected_total_with_vat = extract_total_from_filename(invoice_file.name)
-            
-            # Tính tổng tiền các món từ file Excel
-            items_total = 0.0
-            items_count = 0
-            
-            for row in range(2, ws.max_row + 1):
-                product_name = ws.cell(row=row, column=3).value  # Ten_san_pham
-                quantity = ws.cell(row=row, column=5).value      # So_luong
-                price = ws.cell(row=row, column=6).value         # Don_gia
-                
-                if not product_name:
-                    continue
-                
-                # Bỏ qua header nếu có
-                if str(product_name).strip().lower() in ['ten_san_pham', 'tên sản phẩm', 'ten san pham']:
-                    continue
-                
-                try:
-                    qty = float(quantity) if quantity else 0
-                    prc = float(price) if price else 0
-                    item_total = qty * prc
-                    items_total += item_total
-                    items_count += 1
-                except (ValueError, TypeError):
-                    continue
+        if 'error' in record:
+            issues.append({
+                'file': record['file'],
+                'invoice_number': Path(record['file']).stem,
+                'error': f"Lỗi khi đọc file: {record['error']}"
+            })
+            continue
+        
+        # Lấy số hóa đơn từ tên file
+        invoice_number = record['invoice_id']
+        
+        # Trích xuất tổng tiền từ tên file (đã bao gồm VAT 8%)
+        expected_total_with_vat = extract_total_from_filename(record['file'])
+        
+        # Tính tổng tiền các món từ file Excel (thành tiền từng dòng là số đồng nguyên)
+        items_total = 0
+        items_count = 0
+        
+        for product_name, _, quantity, price in iter_item_lines(record):
+            try:
+                qty = float(quantity) if quantity else 0
+                prc = float(price) if price else 0
+                items_total += line_amount(qty, prc)
+                items_count += 1
+            except (ValueError, TypeError):
+                continue
+        
+        # Tính tổng tiền có VAT 8% (bỏ phần lẻ - cùng quy tắc với tên file)
+        calculated_total_with_vat = with_vat(items_total)
+        
+        if items_total > 0:
+            all_totals.append(calculated_total_with_vat)
+            all_items_counts.append(items_count)
+        
+        # So sánh với tổng tiền trong tên file
+        if expected_total_with_vat:
+            diff = abs(calculated_total_with_vat - expected_total_with_vat)
+            diff_percent = (diff / expected_total_with_vat * 100) if expected_total_with_vat > 0 else 0
             
-            # Tính tổng tiền có VAT (items_total * 1.08)
-            calculated_total_with_vat = items_total * 1.08
+            # Tính bằng số nguyên nên file mới phải khớp tuyệt đối;
+            # vẫn cho phép 1đ cho file tạo bởi phiên bản cũ (tính bằng float)
+            tolerance = 1  # 1 VND
             
-            # So sánh với tổng tiền trong tên file
-            if expected_total_with_vat:
-                diff = abs(calculated_total_with_vat - expected_total_with_vat)
-                diff_percent = (diff / expected_total_with_vat * 100) if expected_total_with_vat > 0 else 0
-                
-                # Cho phép sai số nhỏ (do làm tròn)
-                tolerance = 1.0  # 1 VND
-                
-                if diff > tolerance:
-                    issues.append({
-                        'file': invoice_file.name,
-                        'invoice_number': invoice_number,
-                        'expected': expected_total_with_vat,
-                        'calculated': calculated_total_with_vat,
-                        'items_total': items_total,
-                        'diff': diff,
-                        'diff_percent': diff_percent,
-                        'items_count': items_count
-                    })
-                else:
-                    correct_files += 1
-            else:
-                # Không tìm thấy tổng tiền trong tên file
+            if diff > tolerance:
                 issues.append({
-                    'file': invoice_file.name,
+                    'file': record['file'],
                     'invoice_number': invoice_number,
-                    'expected': None,
+                    'expected': expected_total_with_vat,
                     'calculated': calculated_total_with_vat,
                     'items_total': items_total,
-                    'diff': None,
-                    'diff_percent': None,
-                    'items_count': items_count,
-                    'error': 'Không tìm thấy tổng tiền trong tên file'
+                    'diff': diff,
+                    'diff_percent': diff_percent,
+                    'items_count': items_count
                 })
-        
-        except Exception as e:
+            else:
+                correct_files += 1
+        else:
+            # Không tìm thấy tổng tiền trong tên file
             issues.append({
-                'file': invoice_file.name,
-                'invoice_number': invoice_file.stem,
-                'error': f'Lỗi khi đọc file: {str(e)}'
+                'file': record['file'],
+                'invoice_number': invoice_number,
+                'expected': None,
+                'calculated': calculated_total_with_vat,
+                'items_total': items_total,
+                'diff': None,
+                'diff_percent': None,
+                'items_count': items_count,
+                'error': 'Không tìm thấy tổng tiền trong tên file'
             })
     
     # In kết quả
@@ -135,46 +128,6 @@ def check_invoice_totals():
         print("📈 THỐNG KÊ CHI TIẾT:")
         print("=" * 80)
         
-        # Tính lại để lấy thông tin chi tiết
-        all_totals = []
-        all_items_counts = []
-        
-        for invoice_file in sorted(tax_dir.glob("*.xlsx")):
-            if invoice_file.name.startswith('.'):
-                continue
-            try:
-                wb = openpyxl.load_workbook(invoice_file)
-                ws = wb.active
-                
-                items_total = 0.0
-                items_count = 0
-                
-                for row in range(2, ws.max_row + 1):
-                    product_name = ws.cell(row=row, column=3).value
-                    quantity = ws.cell(row=row, column=5).value
-                    price = ws.cell(row=row, column=6).value
-                    
-                    if not product_name:
-                        continue
-                    
-                    if str(product_name).strip().lower() in ['ten_san_pham', 'tên sản phẩm', 'ten san pham']:
-                        continue
-                    
-                    try:
-                        qty = float(quantity) if quantity else 0
-                        prc = float(price) if price else 0
-                        item_total = qty * prc
-                        items_total += item_total
-                        items_count += 1
-                    except (ValueError, TypeError):
-                        continue
-                
-                if items_total > 0:
-                    all_totals.append(items_total * 1.08)
-                    all_items_counts.append(items_count)
-            except:
-                pass
-        
         if all_totals:
             print(f"   💰 Tổng tiền nhỏ nhất (có VAT): {min(all_totals):,.0f} VND")
             print(f"   💰 Tổng tiền lớn nhất (có VAT): {max(all_totals):,.0f} VND")
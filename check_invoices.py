@@ -6,10 +6,8 @@ Script kiểm tra và lọc hóa đơn:
 2. Hóa đơn có bia/rượu đã được thay thế (bằng cách so sánh với menu gốc)
 """
 
-import openpyxl
 from pathlib import Path
 import json
-import re
 import sys
 
 # Import parse_menu để load menu
@@ -18,18 +16,8 @@ PROJECT_ROOT = PACKAGE_DIR
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
-from Menu.parse_menu import parse_excel_menu
-
-def normalize_menu_key(s):
-    """Chuẩn hóa chuỗi để so sánh tên món"""
-    if not s:
-        return ''
-    s = s.lower().strip()
-    # Bỏ ký tự không phải chữ/số/khoảng trắng
-    s = re.sub(r'[^\w\s]', ' ', s)
-    # Gom nhiều khoảng trắng liên tiếp thành 1
-    s = re.sub(r'\s+', ' ', s)
-    return s
+from automation.invoice_manifest import load_invoice_records
+from automation.menu_index import MENU_FILES, load_menu_index
 
 def is_beverage_with_10_percent_tax(item_name):
     """Kiểm tra xem món có phải là bia, rượu, hoặc Coke 10% đường (không phải Coke Zero/Light) không
@@ -61,29 +49,24 @@ def is_beverage_with_10_percent_tax(item_name):
     return False
 
 def load_menu_items():
-    """Load tất cả menu items với giá gốc"""
-    menu_dir = PROJECT_ROOT / "Menu"
-    menu_files = [
-        menu_dir / "simple-place-menu.xlsx",
-        menu_dir / "taco-place-menu.xlsx"
-    ]
+    """Load tất cả menu items với giá gốc (dùng index menu đã biên dịch)
     
-    all_menu_items = []
-    menu_by_price = {}  # price -> list of items (để tìm món bia/rượu theo giá)
+    Returns: (all_menu_items, menu_by_price)
+    """
+    try:
+        index = load_menu_index(MENU_FILES, PROJECT_ROOT)
+    except Exception as e:
+        print(f"⚠️  Lỗi khi load menu: {e}")
+        return [], {}
     
-    for menu_file in menu_files:
-        if menu_file.exists():
-            try:
-                items = parse_excel_menu(str(menu_file))
-                for item in items:
-                    all_menu_items.append(item)
-                    price = item.get('price', 0)
-                    if price > 0:
-                        if price not in menu_by_price:
-                            menu_by_price[price] = []
-                        menu_by_price[price].append(item)
-            except Exception as e:
-                print(f"⚠️  Lỗi khi load menu {menu_file.name}: {e}")
+    all_menu_items = index['all_items']
+    menu_by_price = {}  # price -> list of items (để tìm món bia/rượu theo giá)
+    for item in all_menu_items:
+        price = item.get('price', 0)
+        if price > 0:
+            if price not in menu_by_price:
+                menu_by_price[price] = []
+            menu_by_price[price].append(item)
     
     return all_menu_items, menu_by_price
 
@@ -136,41 +119,26 @@ def check_invoices():
     all_menu_items, menu_by_price = load_menu_items()
     print(f"   ✓ Đã load {len(all_menu_items)} món từ menu")
     
-    # Tạo mapping tên món -> giá gốc từ menu
-    menu_name_to_price = {}
-    for item in all_menu_items:
-        name = item.get('name', '')
-        price = item.get('price', 0)
-        if name and price > 0:
-            # Map cả tên đầy đủ và phần tiếng Anh
-            menu_name_to_price[normalize_menu_key(name)] = price
-            if ' / ' in name:
-                parts = name.split(' / ', 1)
-                if len(parts) == 2:
-                    english_part = parts[1].strip()
-                    menu_name_to_price[normalize_menu_key(english_part)] = price
-    
     # Kết quả
     invoices_without_format = []  # Hóa đơn có món chưa format
     invoices_with_beverages = []  # Hóa đơn có bia/rượu đã thay thế
     
     # Kiểm tra từng file hóa đơn
     print(f"\n🔍 Đang kiểm tra các file hóa đơn...")
-    for invoice_file in sorted(tax_dir.glob("*.xlsx")):
+    # Đọc từ manifest (file nào không có / đã bị sửa thì đọc lại bằng openpyxl)
+    for record in load_invoice_records(tax_dir):
         try:
-            wb = openpyxl.load_workbook(invoice_file)
-            ws = wb.active
+            if 'error' in record:
+                raise ValueError(record['error'])
             
             # Lấy số hóa đơn từ tên file (format: SỐ_HÓA_ĐƠN - ...)
-            invoice_number = invoice_file.stem.split(' - ')[0] if ' - ' in invoice_file.stem else invoice_file.stem
+            invoice_number = record['invoice_id']
             
             has_unformatted = False
             beverages_replaced = []
             
             # Kiểm tra từng món trong hóa đơn
-            for row in range(2, ws.max_row + 1):
-                product_name = ws.cell(row=row, column=3).value
-                invoice_price = ws.cell(row=row, column=6).value
+            for product_name, _, _, invoice_price in record['lines']:
                 
                 if not product_name:
                     continue
@@ -195,10 +163,6 @@ def check_invoices():
                     if is_beverage_with_10_percent_tax(product_name_str):
                         continue
                     
-                    # Tìm giá gốc của món này trong menu
-                    product_key = normalize_menu_key(product_name_str)
-                    menu_price = menu_name_to_price.get(product_key)
-                    
                     # Nếu giá trong file khác với giá trong menu
                     # VÀ giá có biến số ở 3 chữ số cuối (không phải số tròn)
                     last_3_digits = price_int % 1000
@@ -265,12 +229,12 @@ def check_invoices():
             if beverages_replaced:
                 invoices_with_beverages.append({
                     'invoice_number': invoice_number,
-                    'file': invoice_file.name,
+                    'file': record['file'],
                     'replacements': beverages_replaced
                 })
         
         except Exception as e:
-            print(f"⚠️  Lỗi khi kiểm tra file {invoice_file.name}: {e}")
+            print(f"⚠️  Lỗi khi kiểm tra file {record['file']}: {e}")
             continue
     
     # Trả về kết quả
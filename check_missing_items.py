@@ -5,14 +5,15 @@ Script kiểm tra thiếu món và sai số lượng giữa file input và outpu
 
 import re
 from pathlib import Path
-import openpyxl
 import sys
 
-def count_items_in_html_row(row, invoice_id):
-    """Đếm số món trong 1 row HTML"""
+from automation.invoice_manifest import iter_item_lines, load_invoice_records
+from automation.line_items import NON_ITEM_NAMES, cell_unit, clean_price, is_item_price, is_skipped_name, parse_quantity
+from automation.sale_report import load_report
+
+def count_items_in_cells(cells):
+    """Đếm số món trong 1 row (các ô đã tách sẵn)"""
     items = []
-    cells = re.findall(r'<td[^>]*>(.*?)</td>', row)
-    cells = [re.sub(r'<[^>]+>', '', cell).strip() for cell in cells]
     
     for i in range(len(cells) - 3):
         name = cells[i]
@@ -21,32 +22,24 @@ def count_items_in_html_row(row, invoice_id):
         price_candidate = cells[i + 3]
         
         # Kiểm tra điều kiện parse (giống logic trong process_invoices.py)
-        if not (qty_candidate.isdigit() and 1 <= int(qty_candidate) <= 200):
+        qty = parse_quantity(qty_candidate)
+        if qty is None:
             continue
         
-        qty = int(qty_candidate)
-        price_clean = price_candidate.replace(' ', '').replace(',', '').replace('.', '')
+        price_clean = clean_price(price_candidate)
         if not price_clean.isdigit():
             continue
         
         price_value = float(price_clean)
-        unit = unit_candidate if unit_candidate and not unit_candidate.isdigit() else 'Phần'
+        unit = cell_unit(unit_candidate)
         
-        if (len(name) < 2 or name.isdigit() or 
-            name in ['', 'STT', 'Mã hoá đơn', 'Simple Place']):
+        if len(name) < 2 or name.isdigit() or name in NON_ITEM_NAMES:
             continue
         
-        skip_patterns = [
-            r'\bcrispy\b', r'\bsoft\b', r'cut in 4', r'- edit\s*$',
-            r'đổi phương thức', r'\bpayment\b', r'\btransfer\b',
-            r'\bcod\b', r'\batm\b', 'background-color', 'vertical-align',
-            'ghi chú', 'giảm sốt'
-        ]
-        if any(re.search(pattern, name.lower()) for pattern in skip_patterns):
+        if is_skipped_name(name):
             continue
         
-        if (price_value >= 500 and price_value <= 2000000 and 
-            qty >= 1 and qty <= 200 and len(name) > 2):
+        if is_item_price(price_value) and len(name) > 2:
             items.append({
                 'name': name,
                 'quantity': qty,
@@ -56,122 +49,43 @@ def count_items_in_html_row(row, invoice_id):
     
     return items
 
-def count_items_in_html(content, invoice_id):
-    """Đếm số món trong HTML cho 1 hóa đơn"""
-    rows = content.split('<tr>')
-    invoice_start_idx = None
-    
-    # Tìm row có số hóa đơn
-    for i, row in enumerate(rows):
-        if re.search(r'rowspan="\d+">' + invoice_id + r'</td>', row):
-            invoice_start_idx = i
-            break
-    
-    if invoice_start_idx is None:
-        return []
-    
+def count_items_in_rows(rows):
+    """Đếm số món trong các row của 1 hóa đơn"""
     all_items = []
-    parsed_positions = set()  # Track vị trí đã parse trong mỗi row
-    
-    # Parse các row thuộc hóa đơn này
-    for i in range(invoice_start_idx, len(rows)):
-        row = rows[i]
-        
-        # Kiểm tra xem có phải hóa đơn mới không
-        if i > invoice_start_idx:
-            if re.search(r'rowspan="\d+">(\d{6})</td>', row):
-                break
-        
-        # Parse items trong row này
-        cells = re.findall(r'<td[^>]*>(.*?)</td>', row)
-        cells = [re.sub(r'<[^>]+>', '', cell).strip() for cell in cells]
-        
-        parsed_in_row = set()
-        
-        for j in range(len(cells) - 3):
-            name = cells[j]
-            qty_candidate = cells[j + 1]
-            unit_candidate = cells[j + 2]
-            price_candidate = cells[j + 3]
-            
-            # Kiểm tra điều kiện parse
-            if not (qty_candidate.isdigit() and 1 <= int(qty_candidate) <= 200):
-                continue
-            
-            qty = int(qty_candidate)
-            price_clean = price_candidate.replace(' ', '').replace(',', '').replace('.', '')
-            if not price_clean.isdigit():
-                continue
-            
-            price_value = float(price_clean)
-            unit = unit_candidate if unit_candidate and not unit_candidate.isdigit() else 'Phần'
-            
-            if (len(name) < 2 or name.isdigit() or 
-                name in ['', 'STT', 'Mã hoá đơn', 'Simple Place']):
-                continue
-            
-            skip_patterns = [
-                r'\bcrispy\b', r'\bsoft\b', r'cut in 4', r'- edit\s*$',
-                r'đổi phương thức', r'\bpayment\b', r'\btransfer\b',
-                r'\bcod\b', r'\batm\b', 'background-color', 'vertical-align',
-                'ghi chú', 'giảm sốt'
-            ]
-            if any(re.search(pattern, name.lower()) for pattern in skip_patterns):
-                continue
-            
-            if (price_value >= 500 and price_value <= 2000000 and 
-                qty >= 1 and qty <= 200 and len(name) > 2):
-                
-                # Check duplicate dựa trên vị trí cell (giống logic mới)
-                if j in parsed_in_row:
-                    continue
-                parsed_in_row.add(j)
-                
-                all_items.append({
-                    'name': name,
-                    'quantity': qty,
-                    'price': price_value,
-                    'unit': unit
-                })
-    
+    for _, _, cells in rows:
+        all_items.extend(count_items_in_cells(cells))
     return all_items
 
-def count_items_in_excel(excel_file):
-    """Đếm số món trong file Excel"""
-    try:
-        wb = openpyxl.load_workbook(excel_file)
-        ws = wb.active
-        items = []
-        
-        for row in range(2, ws.max_row + 1):
-            name = ws.cell(row=row, column=3).value  # Ten_san_pham
-            quantity = ws.cell(row=row, column=5).value  # So_luong
-            price = ws.cell(row=row, column=6).value  # Don_gia
-            
-            if not name:
-                continue
-            
-            # Bỏ qua header
-            if str(name).strip().lower() in ['ten_san_pham', 'tên sản phẩm', 'ten san pham']:
-                continue
+def index_invoices(reports):
+    """
+    invoice_id -> các row của hóa đơn, lập trong 1 lượt qua các file input
+    (trùng số hóa đơn thì giữ lần xuất hiện đầu tiên)
+    """
+    index = {}
+    for report in reports:
+        for span in report.invoices:
+            if span.invoice_id not in index:
+                index[span.invoice_id] = report.invoice_rows(span)
+    return index
+
+def count_items_in_lines(lines):
+    """Đếm số món từ các dòng (tên, đơn vị, số lượng, đơn giá) của file Excel"""
+    items = []
+    for name, _, quantity, price in lines:
+        try:
+            qty = float(quantity) if quantity else 0
+            prc = float(price) if price else 0
             
-            try:
-                qty = float(quantity) if quantity else 0
-                prc = float(price) if price else 0
-                
-                if qty > 0 and prc > 0:
-                    items.append({
-                        'name': str(name).strip(),
-                        'quantity': int(qty),
-                        'price': prc
-                    })
-            except (ValueError, TypeError):
-                continue
-        
-        return items
-    except Exception as e:
-        print(f"   ❌ Lỗi đọc Excel: {e}")
-        return []
+            if qty > 0 and prc > 0:
+                items.append({
+                    'name': str(name).strip(),
+                    'quantity': int(qty),
+                    'price': prc
+                })
+        except (ValueError, TypeError):
+            continue
+    
+    return items
 
 def normalize_name_for_comparison(name):
     """Normalize tên món để so sánh (lấy phần tiếng Anh, bỏ qua format)"""
@@ -331,45 +245,46 @@ def check_all_invoices():
     print("=" * 80)
     print()
     
-    # Đọc tất cả file input
-    all_html_content = ""
+    # Đọc tất cả file input (tokenize 1 lần, các lần sau đọc từ cache)
+    reports = []
     for input_file in input_files:
         print(f"📂 Đang đọc file: {input_file.name}")
         try:
-            with open(input_file, 'r', encoding='utf-8', errors='ignore') as f:
-                all_html_content += f.read() + "\n"
+            reports.append(load_report(input_file))
         except Exception as e:
             print(f"   ❌ Lỗi: {e}")
     
-    # Tìm tất cả số hóa đơn trong HTML
-    rows = all_html_content.split('<tr>')
-    invoice_ids = set()
-    for row in rows:
-        match = re.search(r'rowspan="\d+">(\d{6})</td>', row)
-        if match:
-            invoice_ids.add(match.group(1))
+    # Số hóa đơn -> các row của hóa đơn trong file input
+    input_invoices = index_invoices(reports)
     
-    print(f"📊 Tìm thấy {len(invoice_ids)} hóa đơn trong file input")
+    print(f"📊 Tìm thấy {len(input_invoices)} hóa đơn trong file input")
     print()
     
+    # File Excel của từng hóa đơn (đọc từ manifest, không mở lại từng file)
+    output_records = {}
+    for record in load_invoice_records(tax_dir):
+        if ' - ' in Path(record['file']).stem:
+            output_records.setdefault(record['invoice_id'], record)
+    
     # Kiểm tra từng hóa đơn
     issues_found = []
     invoices_checked = 0
     
-    for invoice_id in sorted(invoice_ids):
+    for invoice_id in sorted(input_invoices):
         # Tìm file Excel tương ứng
-        matching_files = list(tax_dir.glob(f"{invoice_id} - *"))
-        if not matching_files:
+        record = output_records.get(invoice_id)
+        if record is None:
             continue
         
-        excel_file = matching_files[0]
         invoices_checked += 1
         
-        # Đếm món trong HTML
-        input_items = count_items_in_html(all_html_content, invoice_id)
+        # Đếm món trong file input
+        input_items = count_items_in_rows(input_invoices[invoice_id])
         
         # Đếm món trong Excel
-        output_items = count_items_in_excel(excel_file)
+        if 'error' in record:
+            print(f"   ❌ Lỗi đọc Excel: {record['error']}")
+        output_items = count_items_in_lines(iter_item_lines(record))
         
         # So sánh
         issues = compare_items(input_items, output_items)
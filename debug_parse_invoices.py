@@ -4,49 +4,27 @@ Script debug để kiểm tra các hóa đơn bị bỏ sót
 Tìm các hóa đơn có tổng tiền 81k, 205k, 1.659k trong file gốc
 """
 
-import re
 from pathlib import Path
 
-def extract_invoices_from_html(content):
-    """Trích xuất tất cả hóa đơn từ HTML content"""
+from automation.sale_report import header_payment_method, invoice_header_amounts, load_report
+
+def extract_invoices_from_report(report):
+    """Trích xuất tất cả hóa đơn từ báo cáo đã parse (cùng cách tính tổng tiền với process_invoices)"""
     invoices_found = []
-    rows = content.split('<tr>')
     
-    for row in rows:
-        # Tìm số hóa đơn
-        invoice_match = re.search(r'rowspan="\d+">(\d{6})</td>', row)
-        if invoice_match:
-            invoice_num = invoice_match.group(1)
-            
-            # Tìm tổng tiền trong row
-            cells = re.findall(r'<td[^>]*>(.*?)</td>', row)
-            cells = [re.sub(r'<[^>]+>', '', cell).strip() for cell in cells]
-            
-            # Tìm tổng tiền (thường ở cuối row)
-            total_amount = None
-            for cell in cells:
-                cell_clean = cell.replace(' ', '').replace(',', '').replace('.', '')
-                if cell_clean.isdigit() and len(cell_clean) >= 4:
-                    value = float(cell_clean)
-                    if value >= 50000:  # Tổng tiền thường >= 50k
-                        total_amount = value
-                        break
-            
-            # Tìm payment method
-            payment_method = None
-            row_upper = row.upper()
-            if 'ATM (' in row_upper or row_upper.startswith('ATM'):
-                payment_method = 'atm'
-            elif 'TRANSFER (' in row_upper or row_upper.startswith('TRANSFER'):
-                payment_method = 'transfer'
-            
-            if total_amount:
-                invoices_found.append({
-                    'invoice_id': invoice_num,
-                    'total': total_amount,
-                    'payment_method': payment_method,
-                    'row': row[:200]  # Lưu 200 ký tự đầu để debug
-                })
+    for span in report.invoices:
+        cells = report.rows[span.start].cells
+        amounts = invoice_header_amounts(cells)
+        # Hóa đơn nhỏ (< 50k) không có ô tổng tiền → dùng thành tiền cuối
+        total_amount = amounts['total'] or amounts['final_total']
+        payment_method = header_payment_method(cells)
+        
+        invoices_found.append({
+            'invoice_id': span.invoice_id,
+            'total': total_amount,
+            'payment_method': payment_method,
+            'row': ' | '.join(cells)[:200]  # Lưu 200 ký tự đầu để debug
+        })
     
     return invoices_found
 
@@ -78,10 +56,7 @@ def find_missing_invoices():
     for input_file in input_files:
         print(f"📂 Đang đọc file: {input_file.name}")
         try:
-            with open(input_file, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-            
-            invoices = extract_invoices_from_html(content)
+            invoices = extract_invoices_from_report(load_report(input_file))
             all_invoices_from_input.extend(invoices)
             print(f"   ✓ Tìm thấy {len(invoices)} hóa đơn")
         except Exception as e:
@@ -92,12 +67,13 @@ def find_missing_invoices():
     print()
     
     # Lấy danh sách hóa đơn đã được tạo
-    created_invoices = set()
+    # Số hóa đơn -> tên file đã tạo (1 lần liệt kê thư mục)
+    created_invoices = {}
     if tax_dir.exists():
-        for tax_file in tax_dir.glob("*.xlsx"):
+        for tax_file in sorted(tax_dir.glob("*.xlsx")):
             # Trích xuất số hóa đơn từ tên file
             invoice_num = tax_file.stem.split(' - ')[0] if ' - ' in tax_file.stem else tax_file.stem
-            created_invoices.add(invoice_num)
+            created_invoices.setdefault(invoice_num, tax_file.name)
     
     print(f"📊 Tổng số hóa đơn đã tạo: {len(created_invoices)}")
     print()
@@ -119,10 +95,7 @@ def find_missing_invoices():
                     print(f"   ⚠️  HÓA ĐƠN NÀY CHƯA ĐƯỢC TẠO FILE!")
                 else:
                     # Kiểm tra file đã tạo
-                    tax_file = tax_dir / f"{inv['invoice_id']} - {inv['payment_method'] or 'unknown'} - *.xlsx"
-                    matching_files = list(tax_dir.glob(f"{inv['invoice_id']} - *"))
-                    if matching_files:
-                        print(f"   ✓ Đã tạo file: {matching_files[0].name}")
+                    print(f"   ✓ Đã tạo file: {created_invoices[inv['invoice_id']]}")
                 break
     
     if not found_targets:
@@ -157,27 +130,15 @@ def find_missing_invoices():
     print("=" * 80)
     print()
     
-    # Đọc lại file input để tìm bia 333
+    # Duyệt lại các row (đã có trong cache) để tìm bia 333
     for input_file in input_files:
         try:
-            with open(input_file, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-            
-            rows = content.split('<tr>')
-            current_invoice = None
+            report = load_report(input_file)
             
-            for row in rows:
-                # Tìm số hóa đơn
-                invoice_match = re.search(r'rowspan="\d+">(\d{6})</td>', row)
-                if invoice_match:
-                    current_invoice = invoice_match.group(1)
-                
-                # Tìm bia 333
-                if current_invoice and ('333' in row.upper() or 'saigon' in row.lower()):
-                    # Kiểm tra xem có phải là món bia không
-                    cells = re.findall(r'<td[^>]*>(.*?)</td>', row)
-                    cells = [re.sub(r'<[^>]+>', '', cell).strip() for cell in cells]
-                    
+            for span in report.invoices:
+                current_invoice = span.invoice_id
+                for _, _, cells in report.invoice_rows(span):
+                    # Tìm bia 333
                     for i, cell in enumerate(cells):
                         if '333' in cell.upper() or 'saigon' in cell.lower():
                             print(f"   HĐ {current_invoice}: Tìm thấy '{cell}' trong row")
@@ -5,21 +5,113 @@ const API_BASE = '';
 let statusInterval = null;
 let logInterval = null;
 let fetchInterval = null;
+let beverageInterval = null;
+
+// Server-Sent Events (/api/stream); polling chỉ dùng khi trình duyệt / server không hỗ trợ
+let eventSource = null;
+let streamConnected = false;
+let lastTaxFiles = null;
+const jobWatchers = {};
 
 // Initialize
 document.addEventListener('DOMContentLoaded', function() {
     refreshStatus();
-    startPolling();
+    if (!startEventStream()) {
+        startPolling();
+    }
     // Tự động load và hiển thị kết quả kiểm tra hóa đơn
     loadCheckResults();
     // Tự động load và hiển thị hóa đơn bia/rượu
     loadBeverageInvoices();
-    // Tự động refresh hóa đơn bia/rượu mỗi 10 giây
-    setInterval(loadBeverageInvoices, 10000);
 });
 
-// Start polling for status and logs
+// Nhận log / trạng thái qua EventSource: mỗi dòng log chỉ được gửi 1 lần
+function startEventStream() {
+    if (!window.EventSource) {
+        return false;
+    }
+    eventSource = new EventSource(`${API_BASE}/api/stream`);
+    
+    eventSource.addEventListener('open', () => {
+        streamConnected = true;
+        stopPolling();
+        stopFetchPolling();
+    });
+    eventSource.addEventListener('error', () => {
+        // EventSource tự kết nối lại; CLOSED = không kết nối được nữa → quay về polling
+        if (eventSource.readyState === EventSource.CLOSED) {
+            streamConnected = false;
+            eventSource = null;
+            startPolling();
+        }
+    });
+    eventSource.addEventListener('snapshot', (e) => {
+        const data = JSON.parse(e.data);
+        renderStatus(data.status);
+        const fetchRunning = data.fetch && data.fetch.running;
+        renderLogLines(fetchRunning ? data.fetch.logs : data.logs);
+        if (fetchRunning) {
+            setFetchButtonRunning();
+        }
+    });
+    eventSource.addEventListener('reset', () => {
+        // Bị lỡ quá nhiều sự kiện → tải lại trạng thái đầy đủ 1 lần
+        refreshStatus();
+        updateLogs();
+    });
+    eventSource.addEventListener('log', (e) => {
+        appendLogLine(JSON.parse(e.data).line);
+    });
+    eventSource.addEventListener('clear-logs', () => {
+        document.getElementById('log-panel').innerHTML = '';
+    });
+    eventSource.addEventListener('status', (e) => {
+        renderStatus(JSON.parse(e.data));
+    });
+    eventSource.addEventListener('fetch', (e) => {
+        const data = JSON.parse(e.data);
+        if (data.running) {
+            setFetchButtonRunning();
+        } else {
+            finishFetch(data);
+        }
+    });
+    eventSource.addEventListener('job', (e) => {
+        const job = JSON.parse(e.data);
+        if (jobWatchers[job.id]) {
+            jobWatchers[job.id].onUpdate(job);
+        }
+    });
+    eventSource.addEventListener('job-log', (e) => {
+        const entry = JSON.parse(e.data);
+        if (jobWatchers[entry.job_id]) {
+            jobWatchers[entry.job_id].onLog(entry);
+        }
+    });
+    return true;
+}
+
+function renderLogLines(lines) {
+    const logPanel = document.getElementById('log-panel');
+    if (lines && lines.length > 0) {
+        logPanel.innerHTML = lines.map(line => 
+            `<div class="log-entry">${escapeHtml(line)}</div>`
+        ).join('');
+        logPanel.scrollTop = logPanel.scrollHeight;
+    }
+}
+
+function appendLogLine(line) {
+    const logPanel = document.getElementById('log-panel');
+    logPanel.insertAdjacentHTML('beforeend', `<div class="log-entry">${escapeHtml(line)}</div>`);
+    logPanel.scrollTop = logPanel.scrollHeight;
+}
+
+// Start polling for status and logs (fallback khi không có /api/stream)
 function startPolling() {
+    if (streamConnected) {
+        return;
+    }
     if (!statusInterval) {
         statusInterval = setInterval(() => {
             refreshStatus();
@@ -30,6 +122,10 @@ function startPolling() {
             updateLogs();
         }, 1000);
     }
+    if (!beverageInterval) {
+        // Tự động refresh hóa đơn bia/rượu mỗi 10 giây
+        beverageInterval = setInterval(loadBeverageInvoices, 10000);
+    }
     // Update immediately
     refreshStatus();
     updateLogs();
@@ -45,58 +141,62 @@ function stopPolling() {
         clearInterval(logInterval);
         logInterval = null;
     }
+    if (beverageInterval) {
+        clearInterval(beverageInterval);
+        beverageInterval = null;
+    }
 }
 
 // Refresh status
 async function refreshStatus() {
     try {
         const response = await fetch(`${API_BASE}/api/status`);
-        const data = await response.json();
-        
-        document.getElementById('data-files-count').textContent = data.data_files || 0;
-        document.getElementById('tax-files-count').textContent = data.tax_files || 0;
-        
-        // Update script status
-        const statusEl = document.getElementById('script-status');
-        const btnStart = document.getElementById('btn-start');
-        
-        if (data.running) {
-            statusEl.textContent = 'Đang chạy';
-            statusEl.style.color = '#10b981';
-            statusEl.style.fontSize = '1.2rem';
-            btnStart.disabled = true;
-            const activityEl = document.getElementById('activity');
-            if (activityEl && data.current) {
-                activityEl.textContent = '📌 ' + data.current;
-            }
-        } else {
-            statusEl.textContent = 'Đang dừng';
-            statusEl.style.color = '#ef4444';
-            statusEl.style.fontSize = '1.2rem';
-            btnStart.disabled = false;
-            const activityEl = document.getElementById('activity');
-            if (activityEl) {
-                activityEl.textContent = '';
-            }
-        }
+        renderStatus(await response.json());
     } catch (error) {
         console.error('Error refreshing status:', error);
     }
 }
 
+function renderStatus(data) {
+    // Stream: tax_files thay đổi (job xong, xóa file, ...) → cập nhật hóa đơn bia/rượu
+    if (streamConnected && lastTaxFiles !== null && data.tax_files !== lastTaxFiles) {
+        loadBeverageInvoices();
+    }
+    lastTaxFiles = data.tax_files;
+    
+    document.getElementById('data-files-count').textContent = data.data_files || 0;
+    document.getElementById('tax-files-count').textContent = data.tax_files || 0;
+    
+    // Update script status
+    const statusEl = document.getElementById('script-status');
+    const btnStart = document.getElementById('btn-start');
+    
+    if (data.running) {
+        statusEl.textContent = 'Đang chạy';
+        statusEl.style.color = '#10b981';
+        statusEl.style.fontSize = '1.2rem';
+        btnStart.disabled = true;
+        const activityEl = document.getElementById('activity');
+        if (activityEl && data.current) {
+            activityEl.textContent = '📌 ' + data.current;
+        }
+    } else {
+        statusEl.textContent = 'Đang dừng';
+        statusEl.style.color = '#ef4444';
+        statusEl.style.fontSize = '1.2rem';
+        btnStart.disabled = false;
+        const activityEl = document.getElementById('activity');
+        if (activityEl) {
+            activityEl.textContent = '';
+        }
+    }
+}
+
 // Update logs
 function updateLogs() {
     fetch(`${API_BASE}/api/logs`)
         .then(res => res.json())
-        .then(data => {
-            const logPanel = document.getElementById('log-panel');
-            if (data.logs && data.logs.length > 0) {
-                logPanel.innerHTML = data.logs.map(log => 
-                    `<div class="log-entry">${escapeHtml(log)}</div>`
-                ).join('');
-                logPanel.scrollTop = logPanel.scrollHeight;
-            }
-        })
+        .then(data => renderLogLines(data.logs))
         .catch(err => console.error('Error updating logs:', err));
 }
 
@@ -164,7 +264,7 @@ async function resetSoftware() {
     }
 }
 
-// Process default
+// Process default (chạy nền: POST trả job id, sau đó hỏi /api/jobs/<id>)
 async function processDefault() {
     const btn = document.getElementById('btn-process');
     const originalText = btn.innerHTML;
@@ -174,15 +274,21 @@ async function processDefault() {
     try {
         const response = await fetch(`${API_BASE}/api/process-default`, { method: 'POST' });
         const data = await response.json();
+        if (!data.success) {
+            throw new Error(data.error || 'Unknown');
+        }
         
         const logPanel = document.getElementById('log-panel');
-        if (data.success) {
-            const files = (data.files || []).map(f => `- ${f}`).join('\n');
-            const msg = `✅ Đã tạo ${data.created} file trong tax_files\n${files}`;
-            const logs = (data.logs || []).join('\n');
-            logPanel.innerHTML = `<div class="log-entry">${escapeHtml(msg)}</div>` +
-                (logs ? `<div class="log-entry">${escapeHtml(logs)}</div>` : '');
-            logPanel.scrollTop = logPanel.scrollHeight;
+        logPanel.innerHTML = '';
+        const job = await watchJob(data.job_id, (progress) => {
+            btn.innerHTML = `<span class="btn-icon">⏳</span><span class="btn-text">${escapeHtml(formatJobProgress(progress))}</span>`;
+        }, logPanel);
+        
+        if (job.state === 'succeeded') {
+            const result = job.result || {};
+            const files = (result.files || []).map(f => `- ${f}`).join('\n');
+            const msg = `✅ Đã tạo ${result.created || 0} file trong tax_files\n${files}`;
+            logPanel.insertAdjacentHTML('afterbegin', `<div class="log-entry">${escapeHtml(msg)}</div>`);
             refreshStatus();
             
             // Hiển thị loading trong phần hóa đơn bia/rượu
@@ -196,7 +302,7 @@ async function processDefault() {
                 loadBeverageInvoices();
             }, 1500);
         } else {
-            logPanel.innerHTML = `<div class="log-entry">❌ Lỗi: ${escapeHtml(data.error || 'Unknown')}</div>`;
+            logPanel.insertAdjacentHTML('afterbegin', `<div class="log-entry">❌ Lỗi: ${escapeHtml(job.error || 'Unknown')}</div>`);
         }
     } catch (error) {
         alert('❌ Lỗi xử lý: ' + error.message);
@@ -206,6 +312,104 @@ async function processDefault() {
     }
 }
 
+function appendJobLogs(logPanel, entries) {
+    if (!entries.length) {
+        return;
+    }
+    const html = entries
+        .map(entry => `<div class="log-entry log-${entry.level}">${escapeHtml(entry.message)}</div>`)
+        .join('');
+    logPanel.insertAdjacentHTML('beforeend', html);
+    logPanel.scrollTop = logPanel.scrollHeight;
+}
+
+function isJobFinished(job) {
+    return job.state === 'succeeded' || job.state === 'failed';
+}
+
+// Chờ job xong: qua /api/stream nếu đang kết nối, không thì hỏi /api/jobs/<id> mỗi giây
+function watchJob(jobId, onProgress, logPanel) {
+    if (!streamConnected) {
+        return pollJob(jobId, onProgress, logPanel);
+    }
+    return new Promise((resolve, reject) => {
+        // Sự kiện đến trước khi tải xong trạng thái ban đầu được giữ lại rồi nối theo seq
+        let since = 0;
+        let ready = false;
+        let lastUpdate = null;
+        const pending = [];
+        const append = (entries) => {
+            const fresh = entries.filter(entry => entry.seq > since);
+            if (fresh.length) {
+                since = fresh[fresh.length - 1].seq;
+                appendJobLogs(logPanel, fresh);
+            }
+        };
+        const finish = (job) => {
+            delete jobWatchers[jobId];
+            resolve(job);
+        };
+        jobWatchers[jobId] = {
+            onLog: (entry) => ready ? append([entry]) : pending.push(entry),
+            onUpdate: (job) => {
+                lastUpdate = job;
+                onProgress(job.progress || {});
+                if (ready && isJobFinished(job)) {
+                    finish(job);
+                }
+            },
+        };
+        fetch(`${API_BASE}/api/jobs/${jobId}`)
+            .then(res => res.json())
+            .then(job => {
+                append(job.logs || []);
+                append(pending);
+                ready = true;
+                onProgress(job.progress || {});
+                if (isJobFinished(job)) {
+                    finish(job);
+                } else if (lastUpdate && isJobFinished(lastUpdate)) {
+                    finish(lastUpdate);
+                }
+            })
+            .catch(err => {
+                delete jobWatchers[jobId];
+                reject(err);
+            });
+    });
+}
+
+// Hỏi trạng thái job mỗi giây cho tới khi xong; log mới được nối vào logPanel
+async function pollJob(jobId, onProgress, logPanel) {
+    let since = 0;
+    while (true) {
+        const response = await fetch(`${API_BASE}/api/jobs/${jobId}?since=${since}`);
+        const job = await response.json();
+        if (!response.ok) {
+            throw new Error(job.error || `HTTP ${response.status}`);
+        }
+        if (job.logs.length) {
+            since = job.logs[job.logs.length - 1].seq;
+            appendJobLogs(logPanel, job.logs);
+        }
+        onProgress(job.progress || {});
+        if (isJobFinished(job)) {
+            return job;
+        }
+        await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+}
+
+function formatJobProgress(progress) {
+    if (progress.stage === 'write' && progress.files_to_write) {
+        return `Đang ghi file ${progress.files_written || 0}/${progress.files_to_write}...`;
+    }
+    if (progress.stage === 'calculate') {
+        return `Đang tính ${progress.invoices} hóa đơn...`;
+    }
+    return 'Đang xử lý...';
+}
+
 // Fetch data
 async function fetchData() {
     if (fetchInterval) {
@@ -242,16 +446,35 @@ async function fetchData() {
 }
 
 function startFetchPolling() {
-    if (fetchInterval) {
+    setFetchButtonRunning();
+    if (fetchInterval || streamConnected) {
         return;
     }
     updateFetchStatus();
     fetchInterval = setInterval(updateFetchStatus, 1000);
+}
+
+function setFetchButtonRunning() {
     const btn = document.getElementById('btn-fetch');
     btn.disabled = true;
     btn.innerHTML = '<span class="btn-icon">⏳</span><span class="btn-text">Đang lấy dữ liệu...</span>';
 }
 
+// Fetch script đã kết thúc: trả nút về ban đầu và báo kết quả
+function finishFetch(data) {
+    stopFetchPolling();
+    const btn = document.getElementById('btn-fetch');
+    btn.disabled = false;
+    btn.innerHTML = '<span class="btn-icon">📥</span><span class="btn-text">Lấy dữ liệu Fabi</span>';
+    if (typeof data.exit_code !== 'undefined' && data.exit_code !== null) {
+        if (data.exit_code === 0) {
+            alert('✅ Đã tải dữ liệu Fabi xong!');
+        } else {
+            alert('⚠️ Fetch kết thúc với mã lỗi ' + data.exit_code);
+        }
+    }
+}
+
 function stopFetchPolling() {
     if (fetchInterval) {
         clearInterval(fetchInterval);
@@ -263,26 +486,9 @@ function updateFetchStatus() {
     fetch(`${API_BASE}/api/fetch-status`)
         .then(res => res.json())
         .then(data => {
-            const logPanel = document.getElementById('log-panel');
-            if (data.logs && data.logs.length) {
-                logPanel.innerHTML = data.logs.map(line => 
-                    `<div class="log-entry">${escapeHtml(line)}</div>`
-                ).join('');
-                logPanel.scrollTop = logPanel.scrollHeight;
-            }
-
+            renderLogLines(data.logs);
             if (!data.running) {
-                stopFetchPolling();
-                const btn = document.getElementById('btn-fetch');
-                btn.disabled = false;
-                btn.innerHTML = '<span class="btn-icon">📥</span><span class="btn-text">Lấy dữ liệu Fabi</span>';
-                if (typeof data.exit_code !== 'undefined' && data.exit_code !== null) {
-                    if (data.exit_code === 0) {
-                        alert('✅ Đã tải dữ liệu Fabi xong!');
-                    } else {
-                        alert('⚠️ Fetch kết thúc với mã lỗi ' + data.exit_code);
-                    }
-                }
+                finishFetch(data);
             }
         })
         .catch(err => {
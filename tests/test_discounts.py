@@ -0,0 +1,88 @@
+"""
+The numpy discount engine must give exactly the same result as the Python loop.
+
+    python3 -m pytest tests/
+"""
+
+import copy
+import sys
+import unittest
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from automation import discounts
+
+
+def item(name, quantity, price):
+    return {'name': name, 'quantity': quantity, 'unit': 'Phần', 'price': price}
+
+
+def invoice(invoice_id, items, discount=0, payment_discount=0):
+    return {'invoice_id': invoice_id, 'items': items, 'discount': discount, 'payment_discount': payment_discount}
+
+
+def sample_invoices():
+    return [
+        # Nhiều món, món thành tiền cao nhất nhận giảm giá
+        invoice('multi', [item('Taco', 2, 55000), item('Burrito', 1, 145000), item('Nachos', 3, 45000)], 20000, 5000),
+        # 2 món bằng thành tiền: món đứng trước nhận giảm giá
+        invoice('tie', [item('A', 1, 120000), item('B', 2, 60000), item('C', 1, 30000)], 15000),
+        # Trần 90% của món: phần còn lại là remainder
+        invoice('cap', [item('Big', 1, 100000), item('Small', 10, 9500)], 95000),
+        # Giảm giá > 50% tổng bill
+        invoice('over_half', [item('Beer', 2, 40000)], 45000),
+        # Giảm giá < 1.000đ
+        invoice('too_small', [item('Soda', 1, 25000)], 500),
+        # Không có giảm giá / không có món
+        invoice('none', [item('Soda', 1, 25000)]),
+        invoice('empty', [], 10000),
+        # Đơn giá lẻ (món đã giảm giá ở lần trước) và thành tiền làm tròn nửa lên
+        invoice('fraction', [item('Half', 3, 33333.5), item('Odd', 1, 99999.5)], 12345),
+        # Dòng hoàn tiền âm: làm tròn nửa lên phải giống money.to_dong (-12,5 → -13)
+        invoice('negative', [item('Main', 1, 80000), item('Refund', 1, -12.5), item('Refund 2', 5, -2.5)], 10000),
+        invoice('negative_over_half', [item('Main', 1, 30000), item('Refund', 1, -12.5)], 20000),
+        # Số lượng > 1 trên món mục tiêu, giá mới chia đều theo số lượng
+        invoice('quantity', [item('Wings', 7, 31000), item('Dip', 1, 15000)], 33333, 1000),
+    ]
+
+
+@unittest.skipIf(discounts.np is None, "numpy is not installed")
+class EngineParityTest(unittest.TestCase):
+
+    def run_both(self, invoices):
+        python_invoices = copy.deepcopy(invoices)
+        numpy_invoices = copy.deepcopy(invoices)
+        python_report = discounts.allocate_discounts(python_invoices, use_numpy=False)
+        numpy_report = discounts.allocate_discounts(numpy_invoices, use_numpy=True)
+        self.assertEqual(python_report.pop('engine'), 'python')
+        self.assertEqual(numpy_report.pop('engine'), 'numpy')
+        return python_invoices, python_report, numpy_invoices, numpy_report
+
+    def test_same_report_and_prices(self):
+        python_invoices, python_report, numpy_invoices, numpy_report = self.run_both(sample_invoices())
+        self.assertEqual(numpy_report, python_report)
+        for expected, actual in zip(python_invoices, numpy_invoices):
+            self.assertEqual([line['price'] for line in actual['items']],
+                             [line['price'] for line in expected['items']], expected['invoice_id'])
+
+    def test_cases_are_exercised(self):
+        _, report, _, _ = self.run_both(sample_invoices())
+        applied = {entry['invoice_id']: entry for entry in report['applied']}
+        self.assertEqual(applied['multi']['item'], 'Burrito')
+        self.assertEqual(applied['tie']['item'], 'A')
+        self.assertEqual([entry['invoice_id'] for entry in report['remainders']], ['cap'])
+        self.assertEqual({entry['invoice_id']: entry['reason'] for entry in report['skipped']},
+                         {'over_half': 'over_half', 'too_small': 'too_small', 'negative_over_half': 'over_half'})
+        self.assertIn('negative', applied)
+
+    def test_only_skipped_invoices(self):
+        invoices = [invoice('too_small', [item('Soda', 1, 25000)], 500)]
+        _, python_report, _, numpy_report = self.run_both(invoices)
+        self.assertEqual(numpy_report, python_report)
+
+
+if __name__ == "__main__":
+    unittest.main()
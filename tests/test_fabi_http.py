@@ -0,0 +1,135 @@
+"""
+fabi_http.py against the local stub server (fabi_stub_server.py) - no real Fabi account.
+
+    python3 -m pytest tests/
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import date
+from pathlib import Path
+from unittest import mock
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from automation import fabi_http
+from automation.fabi_stub_server import start_server
+from automation.fetch_planner import date_ranges, plan_jobs, report_filename
+
+EXPORT_PATH = "/api/export"
+
+ENDPOINTS = {
+    "base_url": "http://unused.invalid",
+    "date_format": "%Y-%m-%d",
+    "login": {
+        "method": "POST",
+        "path": "/api/login",
+        "json": {"email": "{username}", "password": "{password}"},
+        "token_field": "data.token",
+    },
+    "export": {
+        "method": "GET",
+        "path": EXPORT_PATH,
+        "params": {"payment_method": "{payment_method}", "from_date": "{from_date}", "to_date": "{to_date}"},
+    },
+}
+
+REPORTS = {
+    "TRANSFER": b"\xd0\xcf\x11\xe0 transfer export",
+    "ATM": b"\xd0\xcf\x11\xe0 atm export",
+}
+
+
+def write_recordings(directory: Path):
+    """Login + one export per payment method (any date), in the fabi_http --record format."""
+    (directory / "001.body").write_text(json.dumps({"data": {"token": "stub-token"}}), encoding="utf-8")
+    entries = [{
+        "method": "POST",
+        "path": "/api/login",
+        "status": 200,
+        "headers": {"Content-Type": "application/json"},
+        "body_file": "001.body",
+    }]
+    for number, (method, body) in enumerate(REPORTS.items(), start=2):
+        body_file = f"{number:03d}.xls"
+        (directory / body_file).write_bytes(body)
+        entries.append({
+            "method": "GET",
+            "path": EXPORT_PATH,
+            "query": {"payment_method": method},
+            "status": 200,
+            "headers": {"Content-Type": "application/vnd.ms-excel"},
+            "body_file": body_file,
+        })
+    (directory / fabi_http.RECORDINGS_INDEX).write_text(json.dumps(entries), encoding="utf-8")
+
+
+@unittest.skipIf(fabi_http.requests is None, "requests is not installed")
+class FetchAgainstStubTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        recordings = self.tmp / "recordings"
+        recordings.mkdir()
+        write_recordings(recordings)
+        self.server = start_server(recordings, port=0)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.client = fabi_http.FabiClient(ENDPOINTS, base_url=f"http://127.0.0.1:{self.server.server_port}")
+
+    def test_login_and_fetch_plan(self):
+        self.client.login("user@example.com", "secret")
+        self.assertEqual(self.client.headers["Authorization"], "Bearer stub-token")
+
+        renames = []
+        real_replace = os.replace
+
+        def recording_replace(src, dst):
+            renames.append((Path(src).name, Path(dst).name, Path(src).read_bytes()))
+            real_replace(src, dst)
+
+        jobs = plan_jobs(list(REPORTS), date_ranges(date(2025, 12, 5)))
+        with mock.patch.object(fabi_http.os, "replace", recording_replace):
+            results = fabi_http.fetch_plan(self.client, jobs, workers=2, root=self.tmp / "downloads")
+
+        for job in jobs:
+            name = report_filename(job.method)
+            self.assertEqual(len(results[job]), 1)
+            path = results[job][0]
+            self.assertEqual(path, self.tmp / "downloads" / "2025-12-05" / job.method / name)
+            self.assertEqual(path.read_bytes(), REPORTS[job.method])
+            self.assertFalse(path.with_name(name + ".part").exists())
+            self.assertIn((name + ".part", name, REPORTS[job.method]), renames)
+
+    def test_unknown_method_fails_only_its_job(self):
+        self.client.login("user@example.com", "secret")
+        jobs = plan_jobs(["TRANSFER", "GRAB"], date_ranges(date(2025, 12, 5)))
+        results = fabi_http.fetch_plan(self.client, jobs, root=self.tmp / "downloads")
+        self.assertEqual([len(results[job]) for job in jobs], [1, 0])
+
+
+class LoadEndpointsTest(unittest.TestCase):
+
+    def test_example_config_is_refused(self):
+        with self.assertRaises(fabi_http.FabiHttpError) as raised:
+            fabi_http.load_endpoints(fabi_http.EXAMPLE_ENDPOINTS_FILE)
+        self.assertIn("base_url", str(raised.exception))
+        self.assertIn("login.path", str(raised.exception))
+
+    def test_filled_config_loads(self):
+        directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, directory, True)
+        path = directory / "fabi-endpoints.json"
+        path.write_text(json.dumps(ENDPOINTS), encoding="utf-8")
+        self.assertEqual(fabi_http.load_endpoints(path), ENDPOINTS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+"""
+DevTools Performance log readers (fabi_waits.py) with a fake driver - no Chrome needed.
+
+    python3 -m pytest tests/
+"""
+
+import json
+import sys
+import unittest
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+try:
+    from automation import fabi_waits
+except ImportError:  # selenium is not installed
+    fabi_waits = None
+
+
+class FakeDriver:
+    """get_log('performance') returns (and drains) the queued entries."""
+
+    def __init__(self):
+        self.entries = []
+
+    def emit(self, method, **params):
+        self.entries.append({"message": json.dumps({"message": {"method": method, "params": params}})})
+
+    def emit_raw(self, entry):
+        self.entries.append(entry)
+
+    def get_log(self, kind):
+        entries, self.entries = self.entries, []
+        return entries
+
+
+@unittest.skipIf(fabi_waits is None, "selenium is not installed")
+class DevToolsLogTest(unittest.TestCase):
+
+    def test_download_tracked_through_other_reader(self):
+        driver = FakeDriver()
+        driver.emit("Page.downloadWillBegin", guid="old", suggestedFilename="old.xls")
+        tracker = fabi_waits.DownloadTracker(driver)
+
+        driver.emit("Browser.downloadWillBegin", guid="g1", suggestedFilename="sale.xls")
+        fabi_waits.NetworkIdle()(driver)  # drains the log before the tracker looks
+        self.assertTrue(tracker.started)
+        self.assertFalse(tracker(driver))
+
+        driver.emit("Browser.downloadProgress", guid="g1", state="completed", receivedBytes=7, totalBytes=7)
+        driver.emit("Page.downloadProgress", guid="g1", state="inProgress", receivedBytes=7, totalBytes=7)
+        finished = tracker(driver)
+        self.assertEqual([(d["filename"], d["state"]) for d in finished], [("sale.xls", "completed")])
+
+    def test_malformed_entries_are_skipped(self):
+        driver = FakeDriver()
+        tracker = fabi_waits.DownloadTracker(driver)
+        network_idle = fabi_waits.NetworkIdle(quiet=0)
+        for raw in (
+            {},
+            {"message": "not json"},
+            {"message": json.dumps({"no_message": 1})},
+            {"message": json.dumps({"message": "text"})},
+            {"message": json.dumps({"message": {"method": "Page.downloadProgress", "params": None}})},
+            {"message": json.dumps({"message": {"method": "Page.downloadProgress", "params": []}})},
+        ):
+            driver.emit_raw(raw)
+        driver.emit("Page.downloadWillBegin")                  # no guid
+        driver.emit("Network.requestWillBeSent", type="XHR")   # no requestId
+        driver.emit("Network.loadingFinished")
+        driver.emit("Page.downloadWillBegin", guid="g1", suggestedFilename="sale.xls")
+        driver.emit("Page.downloadProgress", guid="g1", state="completed")
+
+        self.assertTrue(network_idle(driver))
+        self.assertEqual([d["filename"] for d in tracker(driver)], ["sale.xls"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+"""
+Streaming report rows with the on-disk cache (sale_report.py).
+
+    python3 -m pytest tests/
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from automation import sale_report
+
+
+def invoice_rows(invoice_id, items):
+    header = f'<tr><td rowspan="{len(items) + 1}">{invoice_id}</td><td>05/12/2025</td><td>TRANSFER (1)</td></tr>'
+    lines = ''.join(f'<tr><td>{name}</td><td>{qty}</td><td>Phần</td><td>{price}</td></tr>' for name, qty, price in items)
+    return header + lines
+
+
+REPORT = '<table>' + ''.join(
+    invoice_rows(f'{60000 + number:06d}', [('Taco', 2, '55,000'), ('Burrito', 1, '145,000')])
+    for number in range(1, 1200)
+) + '</table>'
+
+
+class StreamReportRowsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        self.report = self.tmp / 'sale_by_payment_method.xls'
+        self.report.write_text(REPORT, encoding='utf-8')
+        self.cache_dir = self.tmp / 'cache'
+
+    def expected_rows(self):
+        return [(invoice_id, date, tuple(cells)) for invoice_id, date, cells in sale_report.iter_report_rows(REPORT)]
+
+    def test_cold_and_warm_cache_give_the_same_rows(self):
+        cold = list(sale_report.stream_report_rows(self.report, self.cache_dir))
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        warm = list(sale_report.stream_report_rows(self.report, self.cache_dir))
+        self.assertEqual([tuple(row) for row in cold], self.expected_rows())
+        self.assertEqual(warm, cold)
+        self.assertGreater(len(cold), sale_report.CACHE_BATCH_ROWS)
+
+    def test_abandoned_stream_writes_no_cache(self):
+        rows = sale_report.stream_report_rows(self.report, self.cache_dir)
+        next(rows)
+        rows.close()
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_combined_report_counts_invoices(self):
+        combined = sale_report.CombinedReport([(self.report, 'transfer'), (self.report, 'atm')], self.cache_dir)
+        sources = {source for _, _, _, source in combined}
+        self.assertEqual(sources, {'transfer', 'atm'})
+        self.assertEqual(combined.invoice_counts, {'transfer': 1199, 'atm': 1199})
+
+
+if __name__ == '__main__':
+    unittest.main()